@@ -0,0 +1,76 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from cave_core.utils.cache import Cache
+from cave_core.utils.blobs import (
+    get_blob_hash,
+    get_blob_id,
+    acquire_blobs,
+    release_blobs,
+    promote_to_blobs,
+)
+
+cache = Cache()
+
+
+def test_blob_hash():
+    assert get_blob_hash({"a": 1, "b": 2}) == get_blob_hash(
+        {"b": 2, "a": 1}
+    ), "The hash should not depend on key order."
+    assert get_blob_hash({"a": 1}) != get_blob_hash(
+        {"a": 2}
+    ), "Different data should have different hashes."
+
+
+def test_acquire_and_release():
+    blob = get_blob_hash({"test": "blobs"})
+    cache.delete_many([get_blob_id(blob), f"{get_blob_id(blob)}:refs"], memory=True)
+    assert acquire_blobs(cache, [blob]) == {blob}, "A new blob should need to be stored."
+    cache.set(get_blob_id(blob), {"test": "blobs"})
+    assert acquire_blobs(cache, [blob]) == set(), "A referenced blob should not be stored again."
+    release_blobs(cache, [blob])
+    assert cache.get(get_blob_id(blob)) == {"test": "blobs"}, "A referenced blob should be kept."
+    release_blobs(cache, [blob])
+    assert cache.get(get_blob_id(blob)) is None, "An unreferenced blob should be deleted."
+
+
+def test_promote_to_blobs():
+    cache.set("test:blobs:source", {"test": "promote"})
+    cache.delete_many(["test:blobs:missing"], memory=True, persistent=True)
+
+    def get_updates(promoted):
+        return {"test:blobs:refs": dict(promoted)}
+
+    promoted = promote_to_blobs(cache, ["test:blobs:source", "test:blobs:missing"], get_updates)
+    assert list(promoted.keys()) == [
+        "test:blobs:source"
+    ], f"Only existing data should be moved: {promoted}"
+    blob_id = get_blob_id(promoted["test:blobs:source"])
+    assert cache.get(blob_id) == {"test": "promote"}, "The data should be moved into the blob."
+    assert (
+        cache.get_client().get(cache.make_key("test:blobs:source")) is None
+    ), "The data should not be copied."
+    assert cache.get("test:blobs:refs") == promoted, "The updates should be set with the move."
+    release_blobs(cache, list(promoted.values()))
+    assert cache.get(blob_id) is None, "The promoted blob should have one reference."
+    cache.delete_many(["test:blobs:refs"], memory=True)
+
+
+if __name__ == "__main__":
+    try:
+        test_blob_hash()
+        test_acquire_and_release()
+        test_promote_to_blobs()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
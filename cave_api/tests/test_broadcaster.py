@@ -0,0 +1,183 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.conf import settings
+from cave_core.websockets import cave_ws_broadcaster
+from cave_core.websockets.cave_ws_broadcaster import CaveWSBroadcaster, batch, broadcast_many
+import asyncio, time
+
+settings.BROADCAST_LOADING_WINDOW = settings.BROADCAST_LOADING_WINDOW or 50
+
+
+class UserObject:
+    """
+    A model object without a channel so messages are published to the channel of each user
+    """
+
+    id = "test_broadcaster"
+
+    def get_user_ids(self):
+        return [1, 2]
+
+
+published = []
+
+
+async def record_broadcast(channel, data):
+    # Simulate the round trip of each publish
+    await asyncio.sleep(0.2)
+    published.append((channel, data["event"]))
+
+
+async def fail_broadcast(channel, data):
+    raise Exception("Oops! Unable to publish.")
+
+
+def test_broadcast_many_publishes_channels_at_once():
+    published.clear()
+    cave_ws_broadcaster.broadcaster.async_broadcast = record_broadcast
+    started = time.time()
+    future = broadcast_many(
+        [
+            ("a", {"event": "first"}),
+            ("b", {"event": "first"}),
+            ("a", {"event": "second"}),
+            ("b", {"event": "second"}),
+        ]
+    )
+    future.result(timeout=5)
+    assert (
+        time.time() - started < 0.7
+    ), "Different channels should be published concurrently instead of one round trip at a time."
+    for channel in ["a", "b"]:
+        assert [event for name, event in published if name == channel] == [
+            "first",
+            "second",
+        ], f"Messages to the same channel should be published in order: {published}"
+    assert broadcast_many([]) is None, "No task should be scheduled without messages."
+
+
+def test_broadcast_errors_are_reported():
+    cave_ws_broadcaster.broadcaster.async_broadcast = fail_broadcast
+    future = broadcast_many([("a", {"event": "first"})])
+    error = None
+    try:
+        future.result(timeout=5)
+    except Exception as e:
+        error = e
+    assert error is not None, "A failed publish should raise from its future."
+    assert "Unable to publish" in str(error), f"The publish error should be kept: {error}"
+
+
+def test_batch_collects_nested_broadcasts():
+    batches = []
+    broadcast_many_original = cave_ws_broadcaster.broadcast_many
+    cave_ws_broadcaster.broadcast_many = lambda messages: batches.append(messages)
+    try:
+        socket = CaveWSBroadcaster(UserObject())
+        with batch():
+            socket.broadcast(event="message", data={})
+            with batch():
+                socket.broadcast(event="export", data={})
+            assert (
+                batches == []
+            ), "Nested batches should not publish before the outermost batch exits."
+        assert len(batches) == 1, "A batch should publish its messages once on exit."
+        assert [(channel, data["event"]) for channel, data in batches[0]] == [
+            ("1", "message"),
+            ("2", "message"),
+            ("1", "export"),
+            ("2", "export"),
+        ], f"A batch should publish each message to each user in order: {batches[0]}"
+
+        try:
+            with batch():
+                socket.broadcast(event="message", data={})
+                raise ValueError()
+        except ValueError:
+            pass
+        assert (
+            len(batches) == 2
+        ), "A batch should publish its messages even if an exception is raised."
+        socket.broadcast(event="message", data={})
+        assert len(batches) == 3, "Broadcasts outside of a batch should be published immediately."
+    finally:
+        cave_ws_broadcaster.broadcast_many = broadcast_many_original
+
+
+def test_loading_is_only_suppressed_within_a_window():
+    batches = []
+    broadcast_many_original = cave_ws_broadcaster.broadcast_many
+    cave_ws_broadcaster.broadcast_many = lambda messages: batches.append(messages)
+    wait = settings.BROADCAST_LOADING_WINDOW / 1000 * 3
+
+    def get_loading_events():
+        return [
+            messages[0][1]["data"]["data"]
+            for messages in batches
+            if messages[0][1]["event"] == "updateLoading"
+        ]
+
+    try:
+        socket = CaveWSBroadcaster(UserObject())
+        socket.loading(True)
+        socket.broadcast(event="overwrite", data={}, **socket.fold_loading(False))
+        time.sleep(wait)
+        assert (
+            get_loading_events() == []
+        ), "A loading state sent during the window should not be sent again."
+
+        socket.loading(True)
+        socket.loading(False)
+        socket.loading(True)
+        time.sleep(wait)
+        assert get_loading_events() == [
+            True
+        ], "Only the latest loading state in a window should be sent."
+
+        # Another process may have sent `loading=False` since so the same state is sent again
+        socket.loading(True)
+        time.sleep(wait)
+        assert get_loading_events() == [
+            True,
+            True,
+        ], "States should not be suppressed across windows."
+        assert (
+            "UserObject",
+            UserObject.id,
+        ) not in cave_ws_broadcaster.loading_state, (
+            "Loading state should be removed once its window ends."
+        )
+        socket.fold_loading(False)
+        assert (
+            "UserObject",
+            UserObject.id,
+        ) not in cave_ws_broadcaster.loading_state, (
+            "Folding a loading state should not open a window."
+        )
+    finally:
+        cave_ws_broadcaster.broadcast_many = broadcast_many_original
+
+
+if __name__ == "__main__":
+    async_broadcast = cave_ws_broadcaster.broadcaster.async_broadcast
+    try:
+        test_broadcast_many_publishes_channels_at_once()
+        test_broadcast_errors_are_reported()
+        test_batch_collects_nested_broadcasts()
+        test_loading_is_only_suppressed_within_a_window()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
+    finally:
+        cave_ws_broadcaster.broadcaster.async_broadcast = async_broadcast
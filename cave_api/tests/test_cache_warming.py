@@ -0,0 +1,71 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.conf import settings
+from cave_core.models import Sessions, Teams, cache
+from cave_core.utils.cache_warming import warm_cache
+from cave_core.utils.session_persistence import get_activity_set
+
+# Hibernation requires backups to be enabled
+settings.CACHE_BACKUP_INTERVAL = settings.CACHE_BACKUP_INTERVAL or 60
+settings.CACHE_HIBERNATE_AFTER = settings.CACHE_HIBERNATE_AFTER or 60
+
+messages = []
+
+
+def log(message):
+    # Like the `OutputWrapper.write` used by management commands, only strings are accepted
+    assert isinstance(message, str), f"Only strings should be logged: {message}"
+    messages.append(message)
+
+
+def test_failures_are_logged_and_hibernated_sessions_are_skipped():
+    team = Teams.objects.first()
+    hibernated = Sessions.objects.create(name="test_cache_warming_hibernated", team=team)
+    failing = Sessions.objects.create(name="test_cache_warming_failing", team=team)
+    warm_cache_data = Sessions.warm_cache_data
+
+    def fail_to_warm(self):
+        if self.id == failing.id:
+            raise Exception("Oops! Unable to warm.")
+        return warm_cache_data(self)
+
+    try:
+        hibernated.replace_data({"settings": {"data": {"test": "warming"}}}, wipeExisting=True)
+        cache.set(f"session:{hibernated.id}:user_ids", [])
+        cache.get_client().zadd(cache.make_key(get_activity_set(hibernated.id)), {hibernated.id: 0})
+        assert hibernated.hibernate(), "An idle session should be hibernated."
+        Sessions.warm_cache_data = fail_to_warm
+        stats = warm_cache(Sessions, cache, threads=2, log=log)
+        assert stats["failed"] == 1, f"One session should fail to warm: {stats}"
+        assert any(
+            str(failing.id) in message and "Unable to warm" in message for message in messages
+        ), "The failed session should be logged."
+        assert not cache.get_client().exists(
+            cache.make_key(f"session:{hibernated.id}:data:settings")
+        ), "Warming the cache should not load hibernated sessions."
+        assert Sessions.objects.get(
+            id=hibernated.id
+        ).is_hibernated(), "A hibernated session should stay hibernated."
+    finally:
+        Sessions.warm_cache_data = warm_cache_data
+        hibernated.delete()
+        failing.delete()
+
+
+if __name__ == "__main__":
+    try:
+        test_failures_are_logged_and_hibernated_sessions_are_skipped()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
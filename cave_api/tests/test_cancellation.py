@@ -0,0 +1,70 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.conf import settings
+from cave_core import models
+from cave_core.models import Sessions, Teams, cache
+from cave_core.utils.command_queue import enqueue_command, get_queue_length
+
+# Run commands in this thread so the results can be checked right away
+settings.API_WORKER_MODE = "inline"
+
+
+def execute_command(session_data, socket, command, **kwargs):
+    """
+    A test API that cancels itself when sent the `cancel` command
+    """
+    if command == "cancel":
+        Sessions.objects.get(id=socket.model_object.id).cancel_api_command()
+        return {"test_cancel": {"data": {"discarded": True}}}
+    return {"test_cancel": {"data": {"command": command}}}
+
+
+models.execute_command = execute_command
+
+
+def test_cancel_discards_output_and_queue_continues():
+    session = Sessions.objects.create(name="test_cancellation", team=Teams.objects.first())
+    try:
+        enqueue_command(
+            cache, session.id, {"command": "queued", "command_keys": [], "mutate_dict": {}}
+        )
+        session.execute_api_command(command="cancel", command_keys=[])
+        assert (
+            "test_cancel" not in session.get_versions()
+        ), "The output of a cancelled command should be discarded."
+        assert (
+            session.get_execution_holder() is None
+        ), "A cancelled command should release the execution lease."
+        assert not session.is_cancelled(), "The cancelled state should be cleared."
+        assert (
+            get_queue_length(cache, session.id) == 0
+        ), "Cancelling should clear the queued commands."
+        session.queue_api_command(command="after_cancel", command_keys=[])
+        data = session.get_data(keys=["test_cancel"], client_only=False)
+        assert data["test_cancel"] == {
+            "data": {"command": "after_cancel"}
+        }, f"Commands queued after a cancel should run: {data}"
+        assert (
+            session.get_execution_holder() is None
+        ), "The execution lease should be released after the queue runs."
+    finally:
+        session.delete()
+
+
+if __name__ == "__main__":
+    try:
+        test_cancel_discards_output_and_queue_continues()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
@@ -0,0 +1,120 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.conf import settings
+from cave_core.models import Sessions, Teams
+from cave_core.utils.chunking import split, join
+import threading
+
+settings.CACHE_CHUNKED_PATHS = {**settings.CACHE_CHUNKED_PATHS, "test_chunked": ["data"]}
+
+
+def test_split_and_join():
+    value = {"data": {"a": {"x": 1}, "b": {"x": 2}}, "order": ["a", "b"]}
+    skeleton, chunks = split(value, ["data"])
+    assert skeleton == {
+        "data": {},
+        "order": ["a", "b"],
+    }, "The skeleton should not include the chunks."
+    assert chunks == value["data"], "The chunks should be the dict at the path."
+    assert join(skeleton, ["data"], chunks) == value, "Joining should restore the value."
+    assert split({"order": []}, ["data"]) is None, "Values without the path should not be split."
+
+
+def test_only_changed_chunks_are_written():
+    session = Sessions.objects.create(name="test_chunking", team=Teams.objects.first())
+    try:
+        value = {"data": {"a": {"x": 1}, "b": {"x": 2}}, "order": ["a", "b"]}
+        session.replace_data({"test_chunked": value}, wipeExisting=False)
+        version = session.get_versions()["test_chunked"]
+        chunks = session.get_chunk_versions()["test_chunked"]["chunks"]
+        assert chunks == {"a": 1, "b": 1}, f"Each new chunk should have a chunk version: {chunks}"
+
+        session.replace_data({"test_chunked": value}, wipeExisting=False)
+        assert (
+            session.get_versions()["test_chunked"] == version
+        ), "Writing unchanged data should not change the version."
+
+        changed = {"data": {"a": {"x": 1}, "b": {"x": 3}}, "order": ["a", "b"]}
+        session.replace_data({"test_chunked": changed}, wipeExisting=False)
+        chunks = session.get_chunk_versions()["test_chunked"]["chunks"]
+        assert chunks == {"a": 1, "b": 2}, f"Only the changed chunk should be bumped: {chunks}"
+        assert (
+            session.get_versions()["test_chunked"] > version
+        ), "Writing changed data should increment the version."
+
+        session = Sessions.objects.get(id=session.id)
+        data = session.get_data(keys=["test_chunked"], client_only=False)
+        assert data["test_chunked"] == changed, "Chunked data should be read back joined."
+    finally:
+        session.delete()
+
+
+def test_concurrent_chunk_mutations_are_kept():
+    session = Sessions.objects.create(name="test_chunking", team=Teams.objects.first())
+    mutations = 20
+    try:
+        value = {"data": {"a": {"x": 0}, "b": {"x": 0}}, "order": ["a", "b"]}
+        session.replace_data({"test_chunked": value}, wipeExisting=False)
+        version = session.get_versions()["test_chunked"]
+
+        def mutate(chunk_name):
+            thread_session = Sessions.objects.get(id=session.id)
+            for idx in range(1, mutations + 1):
+                output = thread_session.mutate(
+                    data_version=None,
+                    data_name="test_chunked",
+                    data_path=["data", chunk_name, "x"],
+                    data_value=idx,
+                    ignore_version=True,
+                )
+                assert output is None, f"A mutation ignoring the version should not fail: {output}"
+
+        threads = [threading.Thread(target=mutate, args=(name,)) for name in ["a", "b"]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        chunks = session.get_chunk_versions()["test_chunked"]["chunks"]
+        assert chunks == {
+            "a": 1 + mutations,
+            "b": 1 + mutations,
+        }, f"No chunk version bump should be lost: {chunks}"
+        assert (
+            session.get_versions()["test_chunked"] == version + 2 * mutations
+        ), "Each mutation should increment the version once."
+        data = Sessions.objects.get(id=session.id).get_data(
+            keys=["test_chunked"], client_only=False
+        )
+        assert data["test_chunked"]["data"] == {
+            "a": {"x": mutations},
+            "b": {"x": mutations},
+        }, "The latest mutation to each chunk should be kept."
+        assert session.mutate(
+            data_version=version,
+            data_name="test_chunked",
+            data_path=["data", "a", "x"],
+            data_value=0,
+        ) == {"synch_error": True}, "A mutation to an old version should be rejected."
+    finally:
+        session.delete()
+
+
+if __name__ == "__main__":
+    try:
+        test_split_and_join()
+        test_only_changed_chunks_are_written()
+        test_concurrent_chunk_mutations_are_kept()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
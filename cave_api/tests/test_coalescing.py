@@ -0,0 +1,80 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from cave_core.utils.cache import Cache
+from cave_core.utils.coalescing import coalesce, take_coalesced
+from cave_core.websockets.api_endpoints import __rebase_versions__
+
+cache = Cache()
+data_id = "test:coalescing"
+
+
+def test_latest_value_per_path():
+    take_coalesced(cache, data_id)
+    assert coalesce(
+        cache, data_id, ["a", "x"], 1, window=1000
+    ), "The first value should open a window."
+    assert not coalesce(
+        cache, data_id, ["b"], 2, window=1000
+    ), "Later values should not open a window."
+    assert not coalesce(
+        cache, data_id, ["a", "x"], 3, window=1000
+    ), "Later values should not open a window."
+    values = take_coalesced(cache, data_id)
+    assert values == [
+        3,
+        2,
+    ], f"The latest value for each path should be kept in arrival order: {values}"
+    assert take_coalesced(cache, data_id) == [], "Taking the values should empty the buffer."
+    assert coalesce(
+        cache, data_id, ["a"], 1, window=1000
+    ), "Taking the values should close the window."
+    take_coalesced(cache, data_id)
+
+
+def test_overlapping_paths_keep_order():
+    take_coalesced(cache, data_id)
+    coalesce(cache, data_id, ["a", "x"], 1, window=1000)
+    coalesce(cache, data_id, ["a"], 2, window=1000)
+    coalesce(cache, data_id, ["a", "x"], 3, window=1000)
+    coalesce(cache, data_id, ["b"], 4, window=1000)
+    coalesce(cache, data_id, ["a", "x"], 5, window=1000)
+    values = take_coalesced(cache, data_id)
+    assert values == [
+        1,
+        2,
+        5,
+        4,
+    ], f"Values should not move past a value at an overlapping path: {values}"
+
+
+def test_rebase_versions():
+    data = {"data_name": "a", "data_versions": {"a": 1, "b": 1}}
+    assert __rebase_versions__(data, {"a": 1}, {"a": 2}) == {
+        "data_name": "a",
+        "data_versions": {"a": 2, "b": 1},
+    }, "A mutation sent at the base version should be moved to the current version."
+    assert (
+        __rebase_versions__(data, {"a": 0}, {"a": 2}) == data
+    ), "Out of sync mutations should not be changed."
+    assert data["data_versions"]["a"] == 1, "The original mutation should not be modified."
+
+
+if __name__ == "__main__":
+    try:
+        test_latest_value_per_path()
+        test_overlapping_paths_keep_order()
+        test_rebase_versions()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
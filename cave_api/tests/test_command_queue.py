@@ -0,0 +1,113 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.conf import settings
+from cave_core.models import Sessions, Teams, cache
+from cave_core.utils.command_queue import (
+    enqueue_command,
+    dequeue_command,
+    get_queue_length,
+    get_queue_ids,
+)
+
+# Run queued commands in this thread so the results can be checked right away
+settings.API_WORKER_MODE = "inline"
+session_id = "test"
+
+
+def cleanup():
+    cache.delete_many(list(get_queue_ids(session_id)), memory=True)
+
+
+def test_queue_order():
+    cleanup()
+    for command in ["a", "b", "c"]:
+        enqueue_command(cache, session_id, {"command": command})
+    assert get_queue_length(cache, session_id) == 3, "Each queued command should be kept."
+    commands = [dequeue_command(cache, session_id)["command"] for _ in range(3)]
+    assert commands == ["a", "b", "c"], f"Commands should be dequeued in order: {commands}"
+    assert dequeue_command(cache, session_id) is None, "An empty queue should return None."
+    cleanup()
+
+
+def test_queue_coalescing():
+    cleanup()
+    enqueue_command(cache, session_id, {"command": "a", "n": 1}, coalescing="latest")
+    enqueue_command(cache, session_id, {"command": "b"}, coalescing="latest")
+    enqueue_command(cache, session_id, {"command": "a", "n": 2}, coalescing="latest")
+    assert (
+        get_queue_length(cache, session_id) == 2
+    ), "Commands with the same name should be coalesced."
+    commands = [dequeue_command(cache, session_id) for _ in range(2)]
+    assert commands == [
+        {"command": "b"},
+        {"command": "a", "n": 2},
+    ], f"The latest command should run after the commands queued before it: {commands}"
+    cleanup()
+
+
+def test_run_queued_api_commands():
+    session = Sessions.objects.create(name="test_command_queue", team=Teams.objects.first())
+    try:
+        session.execute_api_command(command="init", command_keys=[])
+        session.__dict__["data"] = {"stale": {}}
+        session.__dict__["versions"] = {"stale": 1}
+        for _ in range(2):
+            enqueue_command(
+                cache, session.id, {"command": "init", "command_keys": [], "mutate_dict": {}}
+            )
+        session.run_queued_api_commands()
+        assert get_queue_length(cache, session.id) == 0, "All queued commands should run."
+        assert session.get_execution_holder() is None, "The execution lease should be released."
+        assert (
+            "stale" not in session.get_versions()
+        ), "Queued commands should not use stale local data."
+        assert not session.resume_queued_api_commands(), "An empty queue should not be resumed."
+    finally:
+        session.delete()
+
+
+def test_queue_runs_after_other_commands_release():
+    session = Sessions.objects.create(name="test_command_queue", team=Teams.objects.first())
+    try:
+        # Hold the execution lease as a command that was not queued (EG: `init` from `get_data`)
+        session.set_loading(True)
+        Sessions.objects.get(id=session.id).queue_api_command(command="init", command_keys=[])
+        assert (
+            get_queue_length(cache, session.id) == 1
+        ), "Commands should stay queued while another command is executing."
+        session.set_loading(False, override_block=True)
+        assert (
+            get_queue_length(cache, session.id) == 0
+        ), "Queued commands should run once the execution lease is released."
+        assert session.get_execution_holder() is None, "The execution lease should be released."
+    finally:
+        session.delete()
+
+
+def test_commands_are_not_coalesced_by_default():
+    assert (
+        settings.SESSION_COMMAND_COALESCING == "none"
+    ), "Queued commands should not be coalesced unless configured."
+
+
+if __name__ == "__main__":
+    try:
+        test_queue_order()
+        test_queue_coalescing()
+        test_run_queued_api_commands()
+        test_queue_runs_after_other_commands_release()
+        test_commands_are_not_coalesced_by_default()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
@@ -0,0 +1,59 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.test import override_settings
+from cave_core.utils.compression import compress, decompress, compressors, uncompressed_header
+
+data = b'{"test": "compression"}' * 1000
+
+
+@override_settings(CACHE_COMPRESSION="zlib", CACHE_COMPRESSION_THRESHOLD=len(data) + 1)
+def test_small_data_is_not_compressed():
+    compressed = compress(data)
+    assert (
+        compressed[:1] == uncompressed_header
+    ), "Data under the threshold should not be compressed."
+    assert decompress(compressed) == data, "Uncompressed data should be read back unchanged."
+
+
+def test_compression_round_trip():
+    for name, compressor in compressors.items():
+        with override_settings(CACHE_COMPRESSION=name, CACHE_COMPRESSION_THRESHOLD=0):
+            compressed = compress(data)
+        assert (
+            compressed[:1] == compressor["header"]
+        ), f"Data compressed with {name} should have its header."
+        assert len(compressed) < len(
+            data
+        ), f"Repetitive data should be smaller when compressed with {name}."
+        assert (
+            decompress(compressed) == data
+        ), f"Data compressed with {name} should be read back unchanged."
+
+
+def test_unknown_header_raises():
+    try:
+        decompress(b"\xff" + data)
+    except ValueError:
+        return
+    assert False, "Data with an unknown compression header should raise an error."
+
+
+if __name__ == "__main__":
+    try:
+        test_small_data_is_not_compressed()
+        test_compression_round_trip()
+        test_unknown_header_raises()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
@@ -0,0 +1,81 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from cave_core.utils.diffing import diff
+
+
+def apply(value, ops):
+    for op in ops:
+        if len(op["path"]) == 0:
+            value = op["value"]
+            continue
+        target = value
+        for key in op["path"][:-1]:
+            target = target[key]
+        if op["op"] == "remove":
+            del target[op["path"][-1]]
+        else:
+            target[op["path"][-1]] = op["value"]
+    return value
+
+
+def test_diff_creates_minimal_ops():
+    old = {"a": {"x": 1, "y": [1, 2]}, "b": 1, "c": "keep"}
+    new = {"a": {"x": 2, "y": [1, 3]}, "c": "keep", "d": True}
+    ops = diff(old, new)
+    assert {
+        "op": "replace",
+        "path": ["a", "x"],
+        "value": 2,
+    } in ops, f"Changed values should be replaced: {ops}"
+    assert {
+        "op": "replace",
+        "path": ["a", "y", 1],
+        "value": 3,
+    } in ops, f"Changed list items should be replaced: {ops}"
+    assert {"op": "remove", "path": ["b"]} in ops, f"Removed keys should be removed: {ops}"
+    assert {"op": "add", "path": ["d"], "value": True} in ops, f"New keys should be added: {ops}"
+    assert len(ops) == 4, f"Unchanged values should not create operations: {ops}"
+    assert (
+        apply({"a": {"x": 1, "y": [1, 2]}, "b": 1, "c": "keep"}, ops) == new
+    ), "Applying the ops should create the new value."
+
+
+def test_diff_edge_cases():
+    assert diff({"a": 1}, {"a": 1}) == [], "Equal values should have no operations."
+    assert diff([1, 2], [1, 2, 3]) == [
+        {"op": "replace", "path": [], "value": [1, 2, 3]}
+    ], "Lists that change length should be replaced in full."
+    assert diff(1, True) == [
+        {"op": "replace", "path": [], "value": True}
+    ], "Values that change type should be replaced."
+
+
+def test_diff_limits():
+    old = {str(i): i for i in range(100)}
+    new = {str(i): i + 1 for i in range(100)}
+    assert (
+        diff(old, new, max_ops=10) is None
+    ), "Diffs with too many operations should not be created."
+    assert diff(old, old, max_size=50) is None, "Values that are too large should not be diffed."
+    assert diff(old, old, max_size=101) == [], "Values within the size limit should be diffed."
+
+
+if __name__ == "__main__":
+    try:
+        test_diff_creates_minimal_ops()
+        test_diff_edge_cases()
+        test_diff_limits()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
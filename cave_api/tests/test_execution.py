@@ -0,0 +1,101 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.conf import settings
+from cave_core import models
+from cave_core.models import Sessions, Teams
+from cave_core.websockets import cave_ws_broadcaster
+import time
+
+# Run background commands in this thread (the default worker mode)
+settings.API_WORKER_MODE = "inline"
+settings.SESSION_COMMAND_QUEUE = False
+settings.BROADCAST_LOADING_WINDOW = settings.BROADCAST_LOADING_WINDOW or 50
+
+
+def execute_command(session_data, socket, command, **kwargs):
+    """
+    A test API that raises an exception when sent the `fail` command
+    """
+    if command == "fail":
+        raise Exception("Oops! The test API failed.")
+    if command == "slow":
+        # Run longer than a loading window so `updateLoading(True)` is sent
+        time.sleep(settings.BROADCAST_LOADING_WINDOW / 1000 * 3)
+    return {"test_execution": {"data": {"command": command}}}
+
+
+models.execute_command = execute_command
+
+
+def test_failed_background_command_releases_execution():
+    session = Sessions.objects.create(name="test_execution", team=Teams.objects.first())
+    try:
+        error = None
+        try:
+            session.execute_api_command(command="fail", command_keys=[], background=True)
+        except Exception as e:
+            error = e
+        assert error is not None, "An inline background command should raise its exception."
+        assert (
+            session.get_execution_holder() is None
+        ), "A failed background command should release the execution lease."
+        session.execute_api_command(command="after_fail", command_keys=[], background=True)
+        data = session.get_data(keys=["test_execution"], client_only=False)
+        assert data["test_execution"] == {
+            "data": {"command": "after_fail"}
+        }, f"Commands after a failed command should run: {data}"
+        assert (
+            session.get_execution_holder() is None
+        ), "The execution lease should be released after a command finishes."
+    finally:
+        session.delete()
+
+
+def test_loading_is_not_sent_twice():
+    session = Sessions.objects.create(name="test_execution_loading", team=Teams.objects.first())
+    events = []
+
+    def record_loading(messages):
+        # Record each event with the loading state it sends (if any)
+        for channel, data in messages:
+            if data["event"] == "updateLoading":
+                events.append((data["event"], data["data"]["data"]))
+            else:
+                events.append((data["event"], data.get("loading")))
+
+    broadcast_many_original = cave_ws_broadcaster.broadcast_many
+    cave_ws_broadcaster.broadcast_many = record_loading
+    try:
+        session.execute_api_command(command="slow", command_keys=[], background=True)
+        time.sleep(settings.BROADCAST_LOADING_WINDOW / 1000 * 3)
+        assert events[0] == (
+            "updateLoading",
+            True,
+        ), f"The loading state should be sent for commands longer than a window: {events}"
+        assert events[-1] == (
+            "overwrite",
+            False,
+        ), f"The loading state should only be released with the changed data: {events}"
+    finally:
+        cave_ws_broadcaster.broadcast_many = broadcast_many_original
+        session.delete()
+
+
+if __name__ == "__main__":
+    try:
+        test_failed_background_command_releases_execution()
+        test_loading_is_not_sent_twice()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
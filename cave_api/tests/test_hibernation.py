@@ -0,0 +1,82 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.conf import settings
+from cave_core.models import Sessions, Teams, cache
+from cave_core.utils.session_persistence import get_activity_set
+
+# Hibernation requires backups to be enabled
+settings.CACHE_BACKUP_INTERVAL = settings.CACHE_BACKUP_INTERVAL or 60
+settings.CACHE_HIBERNATE_AFTER = settings.CACHE_HIBERNATE_AFTER or 60
+
+data = {"settings": {"data": {"test": "hibernation"}}}
+
+
+def create_idle_session():
+    session = Sessions.objects.create(name="test_hibernation", team=Teams.objects.first())
+    session.replace_data(data, wipeExisting=True)
+    cache.set(f"session:{session.id}:user_ids", [])
+    cache.get_client().zadd(cache.make_key(get_activity_set(session.id)), {session.id: 0})
+    return session
+
+
+def test_hibernate_and_wake():
+    session = create_idle_session()
+    try:
+        versions = session.get_versions()
+        assert session.hibernate(), "An idle session should be hibernated."
+        assert session.is_hibernated(), "A hibernated session should be marked as hibernated."
+        assert (
+            cache.get(f"session:{session.id}:user_ids") == []
+        ), "Hibernation should keep the user ids in the cache."
+        assert not cache.get_client().exists(
+            cache.make_key(f"session:{session.id}:data:settings")
+        ), "Hibernation should remove the session data from the cache."
+        session = Sessions.objects.get(id=session.id)
+        session.wake()
+        assert not session.is_hibernated(), "A woken session should not be marked as hibernated."
+        assert session.get_versions() == versions, "Waking should restore the versions."
+        assert (
+            session.get_data(keys=["settings"], client_only=False)["settings"] == data["settings"]
+        ), "Waking should restore the data."
+        assert not session.hibernate(), "A session that was just woken should not be hibernated."
+    finally:
+        session.delete()
+
+
+def test_hibernate_skips_sessions_in_use():
+    session = create_idle_session()
+    try:
+        cache.set(f"session:{session.id}:user_ids", [1])
+        assert not session.hibernate(), "A session with users should not be hibernated."
+        cache.set(f"session:{session.id}:user_ids", [])
+        lease = session.get_hibernation_lease()
+        assert lease.acquire(), "The hibernation lease should be acquired."
+        assert (
+            not session.hibernate()
+        ), "A session should not be hibernated while its lease is held."
+        lease.release()
+        assert (
+            not session.is_hibernated()
+        ), "A session that was not hibernated should not be marked."
+    finally:
+        session.delete()
+
+
+if __name__ == "__main__":
+    try:
+        test_hibernate_and_wake()
+        test_hibernate_skips_sessions_in_use()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
@@ -0,0 +1,92 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from cave_core.utils.cache import Cache
+from cave_core.utils.leases import Lease
+import time
+
+cache = Cache()
+lease_name = "test:lease"
+
+
+def cleanup():
+    cache.delete_many([lease_name, f"{lease_name}:fence"], memory=True)
+
+
+def test_acquire_is_exclusive():
+    cleanup()
+    lease_a = Lease(cache, lease_name, "a", ttl=5)
+    lease_b = Lease(cache, lease_name, "b", ttl=5)
+    assert lease_a.acquire(), "The first lease should be acquired."
+    assert not lease_b.acquire(), "A held lease should not be acquired by another owner."
+    assert (
+        lease_a.get_holder() == f"a:{lease_a.token}"
+    ), "The holder should include the owner and token."
+    lease_a.release()
+    assert lease_a.get_holder() is None, "A released lease should not have a holder."
+    assert lease_b.acquire(), "A released lease should be acquired by another owner."
+    lease_b.release()
+    cleanup()
+
+
+def test_fencing_tokens_increase():
+    cleanup()
+    lease = Lease(cache, lease_name, "a", ttl=5)
+    tokens = []
+    for _ in range(3):
+        assert lease.acquire(), "The lease should be acquired."
+        tokens.append(lease.token)
+        lease.release()
+    assert tokens == sorted(set(tokens)), f"Fencing tokens should strictly increase: {tokens}"
+    cleanup()
+
+
+def test_stale_holder_is_fenced():
+    cleanup()
+    lease_a = Lease(cache, lease_name, "a", ttl=0.5)
+    lease_b = Lease(cache, lease_name, "b", ttl=5)
+    assert lease_a.acquire(), "The first lease should be acquired."
+    time.sleep(1)
+    assert lease_b.acquire(), "An expired lease should be acquired by another owner."
+    assert lease_b.token > lease_a.token, "A new holder should have a greater fencing token."
+    assert not lease_a.renew(), "A stale holder should not renew the lease."
+    lease_a.release()
+    assert lease_b.get_holder() == lease_b.value, "A stale holder should not release the lease."
+    assert lease_b.renew(), "The current holder should still renew the lease."
+    lease_b.release()
+    cleanup()
+
+
+def test_heartbeat_keeps_lease():
+    cleanup()
+    lease_a = Lease(cache, lease_name, "a", ttl=0.6)
+    lease_b = Lease(cache, lease_name, "b", ttl=5)
+    assert lease_a.acquire(), "The first lease should be acquired."
+    lease_a.start_heartbeat()
+    time.sleep(1.5)
+    assert not lease_b.acquire(), "A lease with a heartbeat should not expire."
+    lease_a.release()
+    assert lease_b.acquire(), "A released lease should be acquired by another owner."
+    lease_b.release()
+    cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        test_acquire_is_exclusive()
+        test_fencing_tokens_increase()
+        test_stale_holder_is_fenced()
+        test_heartbeat_keeps_lease()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
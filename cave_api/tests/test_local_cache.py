@@ -0,0 +1,67 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from cave_core.utils.cache import Cache
+from cave_core.utils.local_cache import LocalCache
+
+cache = Cache()
+
+
+def test_values_are_copied():
+    local_cache = LocalCache(cache, max_size=1024 * 1024)
+    data = {"data": {"a": [1, 2]}}
+    local_cache.set("session:1:data:test", 1, data)
+    data["data"]["a"].append(3)
+    value = local_cache.get("session:1:data:test", 1)
+    assert value == {"data": {"a": [1, 2]}}, "Changes to stored data should not change the entry."
+    value["data"]["a"].append(3)
+    assert local_cache.get("session:1:data:test", 1) == {
+        "data": {"a": [1, 2]}
+    }, "Changes to read data should not change the entry."
+
+
+def test_versions_and_invalidation():
+    local_cache = LocalCache(cache, max_size=1024 * 1024)
+    local_cache.set("session:1:data:a", 1, {"a": 1})
+    local_cache.set("session:1:data:b", 1, {"b": 1})
+    assert local_cache.get("session:1:data:a", 2) is None, "Stale entries should not be served."
+    local_cache.invalidate(1, {"a": 1})
+    assert local_cache.get("session:1:data:a", 1) == {"a": 1}, "Current entries should be kept."
+    assert local_cache.get("session:1:data:b", 1) is None, "Missing versions should be invalidated."
+
+
+def test_size_is_bounded():
+    local_cache = LocalCache(cache, max_size=1024)
+    local_cache.set("session:1:data:a", 1, {"a": "a" * 600})
+    local_cache.set("session:1:data:b", 1, {"b": "b" * 600})
+    assert (
+        local_cache.size <= 1024
+    ), f"The local cache should not exceed its max size: {local_cache.size}"
+    assert (
+        local_cache.get("session:1:data:a", 1) is None
+    ), "The least recently used entry should be evicted."
+    assert local_cache.get("session:1:data:b", 1) is not None, "The latest entry should be kept."
+    local_cache.set("session:1:data:c", 1, {"c": "c" * 2048})
+    assert (
+        local_cache.get("session:1:data:c", 1) is None
+    ), "Entries larger than the max size are not stored."
+
+
+if __name__ == "__main__":
+    try:
+        test_values_are_copied()
+        test_versions_and_invalidation()
+        test_size_is_bounded()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
@@ -0,0 +1,88 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.conf import settings
+from cave_core.utils.serialization import (
+    FORMAT_VERSION,
+    MAGIC,
+    dumps,
+    dumps_memory,
+    get_serializer_name,
+    is_current_format,
+    loads,
+    loads_memory,
+    loads_persistent,
+    msgpack,
+)
+import json, pickle
+
+data = {"settings": {"data": {"test": "serialization"}}, "order": [1, 2, 3]}
+
+
+def test_round_trip_for_each_serializer():
+    for serializer in ["json", "pickle"] + (["msgpack"] if msgpack is not None else []):
+        serialized = dumps(data, serializer)
+        assert (
+            serialized[: len(MAGIC)] == MAGIC
+        ), f"Data serialized with {serializer} should be versioned."
+        assert (
+            get_serializer_name(serialized) == serializer
+        ), f"The serializer should be {serializer}."
+        assert is_current_format(
+            serialized, serializer
+        ), f"Data from {serializer} should be current."
+        assert (
+            loads(serialized) == data
+        ), f"Data serialized with {serializer} should be read back unchanged."
+
+
+def test_invalid_serialized_data_raises():
+    for serialized in [
+        MAGIC + bytes([FORMAT_VERSION + 1]) + b"j" + b"\x00{}",
+        MAGIC + bytes([FORMAT_VERSION]) + b"?" + b"\x00{}",
+    ]:
+        try:
+            loads(serialized)
+        except ValueError:
+            continue
+        assert False, f"Unreadable serialized data should raise an error: {serialized}"
+    try:
+        dumps(data, "unknown")
+    except ValueError:
+        return
+    assert False, "An unknown serializer should raise an error."
+
+
+def test_memory_values():
+    assert loads_memory(dumps_memory(data)) == data, "Memory values should be read back unchanged."
+    assert is_current_format(
+        dumps_memory(data), settings.CACHE_SERIALIZER
+    ), "Memory values should use the cache serializer."
+    # Legacy values written by the django redis cache
+    assert loads_memory(b"12") == 12, "Legacy integer memory values should be read."
+    assert loads_memory(pickle.dumps(data)) == data, "Legacy pickled memory values should be read."
+
+
+def test_legacy_persistent_values():
+    assert loads_persistent(json.dumps(data).encode()) == data, "Legacy JSON files should be read."
+
+
+if __name__ == "__main__":
+    try:
+        test_round_trip_for_each_serializer()
+        test_invalid_serialized_data_raises()
+        test_memory_values()
+        test_legacy_persistent_values()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
@@ -0,0 +1,59 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from cave_core.utils.cache import Cache
+from cave_core.utils.leases import Lease
+from cave_core.utils.session_persistence import __start_worker_heartbeat__
+import time
+
+cache = Cache()
+worker_id = "test:worker"
+lease_names = ["test:shard:0", "test:shard:1"]
+
+
+def cleanup():
+    cache.delete_many(lease_names + [f"{name}:fence" for name in lease_names], memory=True)
+    cache.get_client().zrem(cache.make_key("persistence:workers"), worker_id)
+
+
+def test_heartbeat_keeps_all_shards():
+    cleanup()
+    leases = {
+        shard: Lease(cache, name, worker_id, ttl=0.6) for shard, name in enumerate(lease_names)
+    }
+    other = Lease(cache, lease_names[1], "test:other", ttl=5)
+    for lease in leases.values():
+        assert lease.acquire(), "Each shard lease should be acquired."
+    heartbeat = __start_worker_heartbeat__(cache, worker_id, leases, 0.2)
+    try:
+        # Only shard 0 is being processed but shard 1 should not expire
+        time.sleep(1.5)
+        assert (
+            not other.acquire()
+        ), "Held shards should be renewed while another shard is processed."
+        assert (
+            cache.get_client().zscore(cache.make_key("persistence:workers"), worker_id) is not None
+        ), "The worker should stay registered while it processes shards."
+    finally:
+        heartbeat.set()
+        for lease in leases.values():
+            lease.release()
+        cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        test_heartbeat_keeps_all_shards()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
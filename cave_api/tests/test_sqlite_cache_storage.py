@@ -0,0 +1,67 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.core.files.base import ContentFile
+from cave_app.storage_backends import SQLiteCacheStorage
+import tempfile
+
+
+def test_save_open_and_overwrite():
+    with tempfile.TemporaryDirectory() as location:
+        storage = SQLiteCacheStorage(location=location)
+        storage.save("session:1:data:a", ContentFile(b"first"))
+        storage.save("session:1:data:a", ContentFile(b"second"))
+        with storage.open("session:1:data:a", "rb") as f:
+            assert f.read() == b"second", "A save should overwrite the existing entry."
+        assert storage.exists("session:1:data:a"), "A saved entry should exist."
+        assert storage.size("session:1:data:a") == len(
+            b"second"
+        ), "The size should match the saved data."
+        assert storage.listdir("")[1] == [
+            "session:1:data:a"
+        ], "Only one entry should be listed per key."
+
+
+def test_delete_and_clear():
+    with tempfile.TemporaryDirectory() as location:
+        storage = SQLiteCacheStorage(location=location)
+        storage.save("a", ContentFile(b"a"))
+        storage.save("b", ContentFile(b"b"))
+        storage.delete("a")
+        assert not storage.exists("a"), "A deleted entry should not exist."
+        try:
+            storage.open("a", "rb")
+            assert False, "Opening a deleted entry should raise an error."
+        except FileNotFoundError:
+            pass
+        storage.clear()
+        assert storage.listdir("")[1] == [], "A cleared storage should have no entries."
+
+
+def test_compaction_keeps_data():
+    with tempfile.TemporaryDirectory() as location:
+        storage = SQLiteCacheStorage(location=location)
+        storage.save("a", ContentFile(b"a" * 1024 * 1024))
+        storage.compact()
+        with storage.open("a", "rb") as f:
+            assert len(f.read()) == 1024 * 1024, "Compaction should not change stored data."
+
+
+if __name__ == "__main__":
+    try:
+        test_save_open_and_overwrite()
+        test_delete_and_clear()
+        test_compaction_keeps_data()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
@@ -0,0 +1,87 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from cave_core.utils.cache import Cache
+from cave_core.utils.versions import (
+    get_hash_versions,
+    add_hash_versions,
+    set_hash_versions,
+    update_hash_versions,
+    get_counters_id,
+)
+
+cache = Cache()
+data_id = "test:versions"
+
+
+def cleanup():
+    cache.delete_many([data_id, get_counters_id(data_id)], memory=True, persistent=True)
+
+
+def test_set_add_and_get():
+    cleanup()
+    set_hash_versions(cache, data_id, {"a": 1, "b": "hash"})
+    assert get_hash_versions(cache, data_id) == {
+        "a": 1,
+        "b": "hash",
+    }, "Versions should be read back."
+    assert get_hash_versions(cache, data_id, keys=["b", "c"]) == {
+        "b": "hash"
+    }, "Only existing keys should be read."
+    assert not add_hash_versions(
+        cache, data_id, {"a": 5}
+    ), "Existing versions should not be replaced."
+    cleanup()
+    assert add_hash_versions(cache, data_id, {"a": 5}), "Missing versions should be added."
+    assert get_hash_versions(cache, data_id) == {"a": 5}, "Added versions should be read back."
+    cleanup()
+
+
+def test_update():
+    cleanup()
+    set_hash_versions(cache, data_id, {"a": 1, "b": 1, "c": 1})
+    versions = update_hash_versions(
+        cache, data_id, increment=["a", "d"], assign={"b": "hash"}, remove=["c"]
+    )
+    assert versions == {
+        "a": 2,
+        "b": "hash",
+        "d": 1,
+    }, f"Versions should be updated together: {versions}"
+    cleanup()
+
+
+def test_versions_never_repeat():
+    cleanup()
+    set_hash_versions(cache, data_id, {"a": 3})
+    update_hash_versions(cache, data_id, assign={"a": "hash"})
+    versions = update_hash_versions(cache, data_id, increment=["a"])
+    assert (
+        versions["a"] == 4
+    ), f"A string version should continue from the last integer version: {versions}"
+    update_hash_versions(cache, data_id, remove=["a"])
+    versions = update_hash_versions(cache, data_id, increment=["a"])
+    assert (
+        versions["a"] == 5
+    ), f"A removed version should continue from the last integer version: {versions}"
+    cleanup()
+
+
+if __name__ == "__main__":
+    try:
+        test_set_add_and_get()
+        test_update()
+        test_versions_never_repeat()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
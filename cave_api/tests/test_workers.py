@@ -0,0 +1,125 @@
+import os
+import django
+
+# Note: We must first setup django - then we can import and use models or other django features
+os.environ.setdefault(
+    "DJANGO_SETTINGS_MODULE",
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "cave_app.settings.development"),
+)
+django.setup()
+
+from django.conf import settings
+from cave_core.utils.workers import dispatch, stream_in_worker, CommandCancelled
+import tempfile, threading, time
+
+settings.API_WORKER_MODE = "process"
+settings.API_CANCEL_GRACE_PERIOD = 0
+
+
+def add(a, b):
+    return a + b
+
+
+def count(n):
+    for i in range(n):
+        yield i
+
+
+def count_slowly():
+    i = 0
+    while True:
+        time.sleep(0.1)
+        yield i
+        i += 1
+
+
+def sleep_forever(path):
+    # A command that never checks if it was cancelled
+    with open(path, "w") as f:
+        f.write(str(os.getpid()))
+    time.sleep(3600)
+
+
+def is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def test_stream_in_process():
+    outputs = list(stream_in_worker(add, 1, 2))
+    assert outputs == [("output", 3)], f"A function should return its output: {outputs}"
+    outputs = list(stream_in_worker(count, 3))
+    assert outputs == [
+        ("partial", i) for i in range(3)
+    ], f"A generator should stream its outputs: {outputs}"
+    try:
+        list(stream_in_worker(add, 1, "a"))
+        assert False, "Exceptions should be raised in the caller."
+    except TypeError:
+        pass
+
+
+def test_cancel_in_process():
+    started = time.time()
+    outputs = []
+    try:
+        for output in stream_in_worker(count_slowly, cancelled=lambda: len(outputs) > 0):
+            outputs.append(output)
+        assert False, "A cancelled command should raise CommandCancelled."
+    except CommandCancelled:
+        pass
+    assert time.time() - started < 10, "A cancelled command should stop within its grace period."
+    # The shared worker processes should still run the next command
+    assert list(stream_in_worker(add, 2, 2)) == [
+        ("output", 4)
+    ], "Workers should run after a cancel."
+
+
+def test_stuck_process_is_stopped():
+    with tempfile.NamedTemporaryFile() as f:
+        try:
+            list(
+                stream_in_worker(
+                    sleep_forever, f.name, cancelled=lambda: os.path.getsize(f.name) > 0
+                )
+            )
+            assert False, "A cancelled command should raise CommandCancelled."
+        except CommandCancelled:
+            pass
+        pid = int(open(f.name).read())
+    for _ in range(50):
+        if not is_running(pid):
+            break
+        time.sleep(0.1)
+    assert not is_running(
+        pid
+    ), "A command that ignores a cancel should have its worker process stopped."
+    assert list(stream_in_worker(add, 3, 3)) == [("output", 6)], "Workers should run after a stop."
+
+
+def test_dispatch():
+    done = threading.Event()
+    errors = []
+    dispatch(done.set, on_error=errors.append)
+    assert done.wait(5), "A dispatched function should run in the worker pool."
+    failed = threading.Event()
+    dispatch(lambda: 1 / 0, on_error=lambda e: (errors.append(e), failed.set()))
+    assert failed.wait(5), "Exceptions in the worker pool should be passed to on_error."
+    assert isinstance(errors[0], ZeroDivisionError), f"The exception should be passed on: {errors}"
+
+
+if __name__ == "__main__":
+    try:
+        test_stream_in_process()
+        test_cancel_in_process()
+        test_stuck_process_is_stopped()
+        test_dispatch()
+        print("Test passed successfully!")
+    except AssertionError as e:
+        print(f"Test failed: {e}")
+        exit(1)
+    except Exception as e:
+        print(f"An error occurred: {e}")
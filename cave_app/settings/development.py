@@ -171,6 +171,20 @@ INSTALLED_APPS = ["daphne"] + INSTALLED_APPS
 DJANGO_SOCKET_HOSTS = [
     {"address": f"redis://{os.environ.get('REDIS_HOST')}:{os.environ.get('REDIS_PORT')}"}
 ]
+## Broadcast structural diffs (`patch` events) instead of full data keys to clients at the previous versions
+BROADCAST_PATCHES = config("BROADCAST_PATCHES", default=False, cast=bool)
+### The max number of patch operations for a data key before the full data key is broadcast instead
+BROADCAST_PATCH_MAX_OPS = config("BROADCAST_PATCH_MAX_OPS", default=1000, cast=int)
+assert BROADCAST_PATCH_MAX_OPS >= 1, "BROADCAST_PATCH_MAX_OPS must be greater than or equal to 1"
+### The max number of values (including nested values) compared per data key before the full data key is broadcast instead
+BROADCAST_PATCH_MAX_SIZE = config("BROADCAST_PATCH_MAX_SIZE", default=100000, cast=int)
+assert BROADCAST_PATCH_MAX_SIZE >= 1, "BROADCAST_PATCH_MAX_SIZE must be greater than or equal to 1"
+## The max number of `progress` events broadcast per second for each session (intermediate updates are coalesced)
+BROADCAST_PROGRESS_RATE = config("BROADCAST_PROGRESS_RATE", default=4, cast=float)
+assert BROADCAST_PROGRESS_RATE > 0, "BROADCAST_PROGRESS_RATE must be greater than 0"
+## Milliseconds in which `updateLoading` events for each session are coalesced so only net changes are broadcast (0 to disable)
+BROADCAST_LOADING_WINDOW = config("BROADCAST_LOADING_WINDOW", default=50, cast=int)
+assert BROADCAST_LOADING_WINDOW >= 0, "BROADCAST_LOADING_WINDOW must be greater than or equal to 0"
 ################################################################
 
 
@@ -189,6 +203,118 @@ if CACHE_TIMEOUT > 0:
     ), "CACHE_BACKUP_INTERVAL must be greater than 0 if CACHE_TIMEOUT is greater than 0"
 CACHE_TIMEOUT = None if CACHE_TIMEOUT == 0 else CACHE_TIMEOUT
 CACHE_BACKUP_INTERVAL = None if CACHE_BACKUP_INTERVAL == 0 else CACHE_BACKUP_INTERVAL
+## Cache backup coordination across server processes
+### Sessions are split into shards that are each backed up by one process (holding a lease) at a time
+CACHE_BACKUP_SHARDS = config("CACHE_BACKUP_SHARDS", default=1, cast=int)
+### Seconds until a process's shard leases expire if it stops renewing them (EG: the process died)
+CACHE_BACKUP_LEASE = config("CACHE_BACKUP_LEASE", default=30, cast=int)
+assert CACHE_BACKUP_SHARDS >= 1, "CACHE_BACKUP_SHARDS must be greater than or equal to 1"
+assert CACHE_BACKUP_LEASE >= 5, "CACHE_BACKUP_LEASE must be greater than or equal to 5"
+### Threads used by each process to write backups and the max serialized bytes waiting to be written at once
+CACHE_BACKUP_THREADS = config("CACHE_BACKUP_THREADS", default=4, cast=int)
+CACHE_BACKUP_MAX_IN_FLIGHT = config("CACHE_BACKUP_MAX_IN_FLIGHT", default=268435456, cast=int)
+assert CACHE_BACKUP_THREADS >= 1, "CACHE_BACKUP_THREADS must be greater than or equal to 1"
+assert (
+    CACHE_BACKUP_MAX_IN_FLIGHT >= 1
+), "CACHE_BACKUP_MAX_IN_FLIGHT must be greater than or equal to 1"
+### Load the cache backups into the cache before the server starts (EG: after a cache restart)
+#### Run by `python manage.py warm_cache --on-start` (see `utils/run_server.sh`)
+CACHE_WARM_ON_START = config("CACHE_WARM_ON_START", default=False, cast=bool)
+### Seconds without activity after which sessions with no users are persisted and removed from the cache (0 to disable)
+CACHE_HIBERNATE_AFTER = config("CACHE_HIBERNATE_AFTER", default=0, cast=int)
+assert CACHE_HIBERNATE_AFTER >= 0, "CACHE_HIBERNATE_AFTER must be greater than or equal to 0"
+assert (
+    CACHE_HIBERNATE_AFTER == 0 or CACHE_BACKUP_INTERVAL is not None
+), "CACHE_BACKUP_INTERVAL must be greater than 0 if CACHE_HIBERNATE_AFTER is greater than 0"
+CACHE_HIBERNATE_AFTER = None if CACHE_HIBERNATE_AFTER == 0 else CACHE_HIBERNATE_AFTER
+## Session execution lock
+### Seconds until a session's execution lock expires if its process stops renewing it (EG: the process died)
+SESSION_EXECUTION_LEASE = config("SESSION_EXECUTION_LEASE", default=30, cast=int)
+assert SESSION_EXECUTION_LEASE >= 5, "SESSION_EXECUTION_LEASE must be greater than or equal to 5"
+### Queue API commands sent while a session is executing (instead of rejecting them) and run them in order
+SESSION_COMMAND_QUEUE = config("SESSION_COMMAND_QUEUE", default=True, cast=bool)
+#### "none": Run every queued command (default)
+#### "latest": Only run the latest queued command with each command name (EG: while dragging a slider)
+#### Note: "latest" drops earlier queued commands even if their `mutate_dict` differs so only use it for APIs that allow this
+SESSION_COMMAND_COALESCING = config("SESSION_COMMAND_COALESCING", default="none")
+assert SESSION_COMMAND_COALESCING in [
+    "none",
+    "latest",
+], "SESSION_COMMAND_COALESCING must be one of: none, latest"
+### Milliseconds in which mutations to the same data path are coalesced into one write and broadcast (0 to disable)
+SESSION_MUTATION_WINDOW = config("SESSION_MUTATION_WINDOW", default=0, cast=int)
+assert SESSION_MUTATION_WINDOW >= 0, "SESSION_MUTATION_WINDOW must be greater than or equal to 0"
+SESSION_MUTATION_WINDOW = None if SESSION_MUTATION_WINDOW == 0 else SESSION_MUTATION_WINDOW
+## API command workers
+### Where API commands from websocket requests run
+#### "inline": In the websocket consumer thread that received the request
+#### "thread": In a pool of API_WORKERS threads
+#### "process": In a pool of API_WORKERS threads that run `execute_command` in a shared pool of API_WORKERS processes
+API_WORKER_MODE = config("API_WORKER_MODE", default="inline")
+assert API_WORKER_MODE in [
+    "inline",
+    "thread",
+    "process",
+], "API_WORKER_MODE must be one of: inline, thread, process"
+API_WORKERS = config("API_WORKERS", default=4, cast=int)
+assert API_WORKERS >= 1, "API_WORKERS must be greater than or equal to 1"
+### The max number of API commands waiting for a worker before new commands are rejected
+API_WORKER_QUEUE_SIZE = config("API_WORKER_QUEUE_SIZE", default=16, cast=int)
+assert API_WORKER_QUEUE_SIZE >= 0, "API_WORKER_QUEUE_SIZE must be greater than or equal to 0"
+### Seconds a cancelled API command can keep running before its worker process is stopped (only if API_WORKER_MODE is "process")
+#### Note: Commands should check `socket.is_cancelled()` to stop cleanly before their worker process is stopped
+API_CANCEL_GRACE_PERIOD = config("API_CANCEL_GRACE_PERIOD", default=10, cast=int)
+assert API_CANCEL_GRACE_PERIOD >= 0, "API_CANCEL_GRACE_PERIOD must be greater than or equal to 0"
+### Data paths (dot separated and comma delimited) whose values are stored as one chunk per key
+#### EG: "mapFeatures.data" stores each map feature in `mapFeatures.data` separately so a mutation only rewrites one feature
+CACHE_CHUNKED_PATHS = {
+    path.split(".")[0]: path.split(".")[1:]
+    for path in config("CACHE_CHUNKED_PATHS", default="").replace(" ", "").split(",")
+    if path != ""
+}
+### Store data by content hash (shared across sessions with reference counts) and use the hash as the data version
+CACHE_CONTENT_ADDRESSED = config("CACHE_CONTENT_ADDRESSED", default=False, cast=bool)
+### Storage backend used for cache backups
+#### "cave_app.storage_backends.CacheStorage": One file per cache key in `__cache__`
+#### "cave_app.storage_backends.SQLiteCacheStorage": A single append only (WAL) SQLite database in `__cache__/sqlite`
+##### Note: WAL is not safe on network volumes shared by more than one host (EG: multi pod deployments)
+CACHE_STORAGE_BACKEND = config(
+    "CACHE_STORAGE_BACKEND", default="cave_app.storage_backends.CacheStorage"
+)
+CACHE_STORAGE_COMPACTION_INTERVAL = config(
+    "CACHE_STORAGE_COMPACTION_INTERVAL", default=300, cast=int
+)
+assert (
+    CACHE_STORAGE_COMPACTION_INTERVAL >= 1
+), "CACHE_STORAGE_COMPACTION_INTERVAL must be greater than or equal to 1"
+## Compression for large cached values (in memory and persistent)
+CACHE_COMPRESSION = config("CACHE_COMPRESSION", default="zlib")
+CACHE_COMPRESSION_THRESHOLD = config("CACHE_COMPRESSION_THRESHOLD", default=1048576, cast=int)
+assert CACHE_COMPRESSION in [
+    "none",
+    "zlib",
+    "bz2",
+    "lzma",
+], "CACHE_COMPRESSION must be one of: none, zlib, bz2, lzma"
+assert (
+    CACHE_COMPRESSION_THRESHOLD >= 0
+), "CACHE_COMPRESSION_THRESHOLD must be greater than or equal to 0"
+## Serializers for cached values (in memory and persistent)
+CACHE_SERIALIZER = config("CACHE_SERIALIZER", default="pickle")
+CACHE_PERSISTENT_SERIALIZER = config("CACHE_PERSISTENT_SERIALIZER", default="json")
+assert CACHE_SERIALIZER in [
+    "json",
+    "pickle",
+    "msgpack",
+], "CACHE_SERIALIZER must be one of: json, pickle, msgpack"
+assert CACHE_PERSISTENT_SERIALIZER in [
+    "json",
+    "pickle",
+    "msgpack",
+], "CACHE_PERSISTENT_SERIALIZER must be one of: json, pickle, msgpack"
+## In process (per worker) LRU cache for session data in front of the cache
+CACHE_LOCAL_MAX_SIZE = config("CACHE_LOCAL_MAX_SIZE", default=0, cast=int)
+assert CACHE_LOCAL_MAX_SIZE >= 0, "CACHE_LOCAL_MAX_SIZE must be greater than or equal to 0"
 CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.redis.RedisCache",
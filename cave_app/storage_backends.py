@@ -1,5 +1,9 @@
-from django.core.files.storage import FileSystemStorage
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
 from django.contrib.staticfiles.storage import StaticFilesStorage
+from datetime import datetime, timezone
+import os, sqlite3, threading, time
 
 
 class PrivateMediaStorage(FileSystemStorage):
@@ -22,3 +26,164 @@ class CacheStorage(FileSystemStorage):
         if self.exists(name):
             self.delete(name, persistent=True)
         return name
+
+    def clear(self):
+        """
+        Deletes all files in the cache storage
+        """
+        for name in self.listdir("")[1]:
+            super().delete(name)
+
+
+class SQLiteCacheStorage(Storage):
+    """
+    Cache storage that keeps all cache keys in a single SQLite database in write-ahead log (WAL) mode
+
+    - Writes are sequential appends to the write-ahead log
+    - Reads are a single indexed lookup by cache key
+    - The write-ahead log is compacted into the database (and free pages are reclaimed) in a background thread
+    - Avoids creating and deleting one file (inode) per cache key
+
+    Notes:
+        - The database is stored in a subdirectory of `__cache__` so it is never listed as a cache key by `CacheStorage`
+        - WAL mode relies on shared memory between processes so it is not safe on network volumes shared by more than one host
+        - Backups stored by another backend are not read (see `python manage.py migrate_cache --from-backend`)
+    """
+
+    location = os.path.join("__cache__", "sqlite")
+    database_name = "cache.sqlite3"
+
+    def __init__(self, location: str | None = None):
+        self.location = location or self.location
+        self.path = os.path.join(self.location, self.database_name)
+        self.local = threading.local()
+        self.compaction_thread = None
+
+    def __get_connection__(self):
+        """
+        Gets the SQLite connection for the current thread (creating the database if needed)
+        """
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            os.makedirs(self.location, exist_ok=True)
+            if not os.path.exists(self.path):
+                self.__warn_unmigrated__()
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            # Note: This must be set before the table is created to take effect
+            connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache (name TEXT PRIMARY KEY, data BLOB NOT NULL, modified REAL NOT NULL)"
+            )
+            self.local.connection = connection
+            self.__ensure_compaction__()
+        return connection
+
+    def __warn_unmigrated__(self):
+        """
+        Warns if backups from the file backend exist while this database is being created
+        """
+        parent = os.path.dirname(self.location)
+        if os.path.isdir(parent) and any(
+            os.path.isfile(os.path.join(parent, name)) for name in os.listdir(parent)
+        ):
+            print(
+                "Warning: Cache backups from `cave_app.storage_backends.CacheStorage` were found but are not read by `SQLiteCacheStorage`."
+            )
+            print(
+                "Run `python manage.py migrate_cache --from-backend cave_app.storage_backends.CacheStorage` to copy them."
+            )
+
+    def _open(self, name: str, mode: str = "rb"):
+        row = (
+            self.__get_connection__()
+            .execute("SELECT data FROM cache WHERE name = ?", (name,))
+            .fetchone()
+        )
+        if row is None:
+            raise FileNotFoundError(f"No cache storage entry found for `{name}`")
+        return ContentFile(row[0], name=name)
+
+    def _save(self, name: str, content) -> str:
+        data = content.read()
+        if isinstance(data, str):
+            data = data.encode()
+        self.__get_connection__().execute(
+            "INSERT OR REPLACE INTO cache (name, data, modified) VALUES (?, ?, ?)",
+            (name, data, time.time()),
+        )
+        return name
+
+    # Always overwrite the entry on a save
+    def get_available_name(self, name: str, max_length: int | None = None) -> str:
+        return name
+
+    def delete(self, name: str):
+        self.__get_connection__().execute("DELETE FROM cache WHERE name = ?", (name,))
+
+    def exists(self, name: str) -> bool:
+        return (
+            self.__get_connection__()
+            .execute("SELECT 1 FROM cache WHERE name = ?", (name,))
+            .fetchone()
+            is not None
+        )
+
+    def listdir(self, path: str):
+        names = self.__get_connection__().execute("SELECT name FROM cache").fetchall()
+        return [], [row[0] for row in names]
+
+    def size(self, name: str) -> int:
+        row = (
+            self.__get_connection__()
+            .execute("SELECT length(data) FROM cache WHERE name = ?", (name,))
+            .fetchone()
+        )
+        if row is None:
+            raise FileNotFoundError(f"No cache storage entry found for `{name}`")
+        return row[0]
+
+    def get_modified_time(self, name: str) -> datetime:
+        row = (
+            self.__get_connection__()
+            .execute("SELECT modified FROM cache WHERE name = ?", (name,))
+            .fetchone()
+        )
+        if row is None:
+            raise FileNotFoundError(f"No cache storage entry found for `{name}`")
+        return datetime.fromtimestamp(row[0], tz=timezone.utc)
+
+    def clear(self):
+        """
+        Deletes all entries in the cache storage
+        """
+        self.__get_connection__().execute("DELETE FROM cache")
+        self.compact()
+
+    def compact(self):
+        """
+        Moves the write-ahead log into the database and reclaims free pages
+        """
+        connection = self.__get_connection__()
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        connection.execute("PRAGMA incremental_vacuum")
+
+    def __ensure_compaction__(self):
+        if self.compaction_thread is None:
+            self.compaction_thread = threading.Thread(target=self.__compaction_task__, daemon=True)
+            self.compaction_thread.start()
+
+    def __compaction_task__(self):
+        """
+        Periodically compacts the database
+
+        Note: This function is designed to be run in a separate thread
+        """
+        while True:
+            time.sleep(settings.CACHE_STORAGE_COMPACTION_INTERVAL)
+            try:
+                self.compact()
+            except Exception as e:
+                print("Error: The cache storage compaction failed with the following error:")
+                print(e)
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+from cave_core.utils.cache import Cache
+from cave_core.utils.serialization import is_current_format, loads_persistent
+
+
+class Command(BaseCommand):
+    help = "Migrating the Persistent Cache to the Current Serialization Format and Storage Backend"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from-backend",
+            type=str,
+            default=None,
+            help="The storage backend to copy the persistent cache from (EG: cave_app.storage_backends.CacheStorage after changing CACHE_STORAGE_BACKEND)",
+        )
+
+    def handle(self, *args, **options):
+        from_backend = options["from_backend"]
+        if from_backend == settings.CACHE_STORAGE_BACKEND:
+            from_backend = None
+        self.stdout.write(
+            f"Migrating the persistent cache{f' from `{from_backend}`' if from_backend else ''} to the current serialization format and storage backend..."
+        )
+        try:
+            cache = Cache()
+            source = import_string(from_backend)() if from_backend else cache
+            files = source.listdir("")[1]
+        except Exception as e:
+            raise CommandError(f"Failed to list the persistent cache with the following error: {e}")
+        migrated, failed = 0, 0
+        for file in files:
+            try:
+                with source.open(file, "rb") as f:
+                    data = f.read()
+                # Files from another backend are always copied
+                if source is cache and is_current_format(
+                    data, settings.CACHE_PERSISTENT_SERIALIZER
+                ):
+                    continue
+                cache.set(file, loads_persistent(data), memory=False, persistent=True)
+                migrated += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Failed to migrate `{file}` with the following error: {e}")
+        self.stdout.write(
+            f"Migrated {migrated} of {len(files)} files ({len(files) - migrated - failed} already current, {failed} failed)."
+        )
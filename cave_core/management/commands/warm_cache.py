@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from cave_core.models import Sessions, cache
+from cave_core.utils.cache_warming import warm_cache
+
+
+class Command(BaseCommand):
+    help = "Warming the Cache from the Persistent Cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=settings.CACHE_BACKUP_THREADS,
+            help="The number of sessions to load in parallel",
+        )
+        parser.add_argument(
+            "--on-start",
+            action="store_true",
+            help="Only warm the cache if CACHE_WARM_ON_START is set (used before the server starts)",
+        )
+
+    def handle(self, *args, **options):
+        if options["on_start"] and (
+            not settings.CACHE_WARM_ON_START or settings.CACHE_BACKUP_INTERVAL is None
+        ):
+            return
+        if settings.CACHE_BACKUP_INTERVAL is None:
+            raise CommandError(
+                "The persistent cache is disabled (CACHE_BACKUP_INTERVAL is not set)."
+            )
+        try:
+            stats = warm_cache(Sessions, cache, threads=options["threads"], log=self.stdout.write)
+        except Exception as e:
+            raise CommandError(f"Failed to warm the cache with the following error: {e}")
+        if stats["failed"] > 0:
+            raise CommandError(f"Failed to warm {stats['failed']} sessions.")
@@ -11,13 +11,52 @@ from solo.models import SingletonModel
 from pamda import pamda
 import type_enforced
 from datetime import datetime, timedelta, timezone
+import time
+from redis.exceptions import WatchError
 
 # Internal Imports
-from cave_core.websockets.cave_ws_broadcaster import CaveWSBroadcaster
+from cave_core.websockets.cave_ws_broadcaster import (
+    CaveWSBroadcaster,
+    batch,
+    run_and_end_progress,
+)
 from cave_core.utils.cache import Cache
+from cave_core.utils.local_cache import LocalCache
 from cave_core.utils.constants import api_keys, background_api_keys
 from cave_core.utils.validators import limit_upload_size
-from cave_core.utils.session_persistence import session_persistence_service
+from cave_core.utils.session_persistence import (
+    session_persistence_service,
+    get_dirty_set,
+    get_activity_set,
+)
+from cave_core.utils.chunking import get_chunk_path, get_chunk_id, split, join
+from cave_core.utils.diffing import diff
+from cave_core.utils.blobs import (
+    get_blob_hash,
+    get_blob_id,
+    acquire_blobs,
+    release_blobs,
+    promote_to_blobs,
+)
+from cave_core.utils.versions import (
+    get_hash_versions,
+    add_hash_versions,
+    set_hash_versions,
+    update_hash_versions,
+    queue_hash_versions_update,
+    decode_hash_versions,
+)
+from cave_core.utils.serialization import dumps_memory, dumps_persistent
+from cave_core.utils.leases import Lease, get_worker_id
+from cave_core.utils.command_queue import (
+    enqueue_command,
+    dequeue_command,
+    get_queue_length,
+    get_queue_ids,
+)
+from cave_core.utils.coalescing import coalesce, take_coalesced
+from cave_core.utils.workers import dispatch, stream_in_worker, CommandCancelled
+from cave_core.utils.wrapping import notify_exception
 from cave_api.api import execute_command
 from cave_app.storage_backends import PrivateMediaStorage, PublicMediaStorage
 
@@ -25,6 +64,7 @@ from cave_app.storage_backends import PrivateMediaStorage, PublicMediaStorage
 from cave_utils import Validator
 
 cache = Cache()
+local_cache = LocalCache(cache, max_size=settings.CACHE_LOCAL_MAX_SIZE)
 
 
 class CustomUser(AbstractUser):
@@ -149,6 +189,8 @@ class CustomUser(AbstractUser):
         prev_session = self.session
         if self.session == session:
             return
+        # Load the session data back into the cache if the session is hibernated
+        session.wake()
         # Query CustomUsers -> Update session
         self.session = session
         self.save(update_fields=["session"])
@@ -156,10 +198,16 @@ class CustomUser(AbstractUser):
         session.update_user_ids()
         if prev_session is not None:
             prev_session.update_user_ids()
+        # Move the sockets of this user to the new session channel
+        CaveWSBroadcaster(self).update_channels(
+            subscribe=[session.get_channel()],
+            unsubscribe=[prev_session.get_channel()] if prev_session is not None else [],
+        )
         # Query all session data:
         # Broadcast the new session data
         self.broadcast_current_session_info()
-        session.broadcast_changed_data(previous_versions={}, force_overwrite=True)
+        # Send the session data to this user directly as their sockets may not be subscribed to the session channel yet
+        session.broadcast_changed_data(previous_versions={}, force_overwrite=True, target=self)
 
     @type_enforced.Enforcer
     def create_session(self, session_name: str, team_id: int | str, session_description: str = ""):
@@ -235,7 +283,9 @@ class CustomUser(AbstractUser):
 
     def refresh_session_lists(self):
         self.error_on_no_access()
-        [team.update_sessions_list() for team in self.get_teams()]
+        # Publish the session lists for all teams in one pipeline
+        with batch():
+            [team.update_sessions_list() for team in self.get_teams()]
 
     #############################################
     # Session, Team And Broadcasting Utils
@@ -279,6 +329,25 @@ class CustomUser(AbstractUser):
         """
         return [self.id]
 
+    def get_channel(self):
+        """
+        Gets the websocket channel for this user
+
+        Used by CaveWSBroadcaster to broadcast to this user
+        """
+        return str(self.id)
+
+    def get_group_channels(self):
+        """
+        Gets the websocket channels for the current session and the teams of this user
+
+        Used by the socket server to subscribe to broadcasts for each session and team of this user
+        """
+        channels = [f"team:{team_id}" for team_id in self.team_ids]
+        if self.session_id is not None:
+            channels.append(f"session:{self.session_id}")
+        return channels
+
     def create_personal_team(self):
         team, team_created = Teams.objects.get_or_create(
             name=f"{self.username} - Personal", is_personal_team=True
@@ -312,7 +381,7 @@ class CustomUser(AbstractUser):
             event="updateLoading",
             data={
                 "data_path": ["session_loading"],
-                "data": cache.get(f"session:{self.session.id}:executing", False),
+                "data": self.session.get_execution_holder() is not None,
             },
         )
 
@@ -878,6 +947,14 @@ class Teams(models.Model):
     def get_user_ids(self):
         return list(TeamUsers.objects.filter(team=self).values_list("user__id", flat=True))
 
+    def get_channel(self):
+        """
+        Gets the websocket channel for this team
+
+        Used by CaveWSBroadcaster to broadcast to all users in this team at once
+        """
+        return f"team:{self.id}"
+
     def get_sessions(self):
         return Sessions.objects.filter(team=self)
 
@@ -975,14 +1052,10 @@ class Sessions(models.Model):
         - `loading`:
             - Type: bool
             - What: The loading status to broadcast
+
+        Note: Loading changes are coalesced for `settings.BROADCAST_LOADING_WINDOW` milliseconds so only net changes are broadcast
         """
-        CaveWSBroadcaster(self).broadcast(
-            event="updateLoading",
-            data={
-                "data_path": ["session_loading"],
-                "data": loading,
-            },
-        )
+        CaveWSBroadcaster(self).loading(loading)
 
     def set_loading(self, value: bool, override_block: bool = False) -> None:
         """
@@ -1000,19 +1073,23 @@ class Sessions(models.Model):
             - Type: bool
             - What: If True, the session will be unblocked from execution status when set to False even if it was blocked due to execution status
             - Default: False
+
+        Notes:
+            - The executing status is a lease (see `get_execution_lease`) that is acquired atomically so only one process can execute at a time
+            - The lease is renewed by a heartbeat while executing and expires `settings.SESSION_EXECUTION_LEASE` seconds after its process dies
+            - The lease is held by the session object that acquired it so setting the loading status to False on any other object (EG: in another request) does not release it
+            - Releasing the lease resumes any queued API Commands (see `resume_queued_api_commands`)
+            - Releasing the lease only broadcasts `loading=False` if it was not already sent with the changed data (see `broadcast_changed_data`)
         """
-        self.__dict__["is_executing"] = cache.get(f"session:{self.id}:executing", False)
         if value:
-            if self.__dict__["is_executing"]:
+            if not self.acquire_execution():
+                self.__dict__["is_executing"] = True
                 self.broadcast_loading(True)
                 # Create a block for the loading state to prevent this error from killing the execution block
                 self.__dict__["__blocked_due_to_execution__"] = True
                 raise Exception(
                     "Oops! This session is already executing a task. Please wait for it to finish."
                 )
-            cache.set(f"session:{self.id}:executing", True)
-            self.__dict__["is_executing"] = True
-            self.broadcast_loading(True)
         else:
             if override_block:
                 self.__dict__["__blocked_due_to_execution__"] = False
@@ -1020,9 +1097,124 @@ class Sessions(models.Model):
                 # Release the block to allow other errors to be thrown and stop the loading state
                 self.__dict__["__blocked_due_to_execution__"] = False
             else:
-                cache.set(f"session:{self.id}:executing", False)
                 self.__dict__["is_executing"] = False
-                self.broadcast_loading(False)
+                lease = self.__dict__.pop("execution_lease", None)
+                if lease is not None:
+                    lease.release()
+                    cache.delete(f"session:{self.id}:cancelled", memory=True)
+                    # Skip the `updateLoading` event if `loading=False` was already sent with the changed data
+                    if not self.__dict__.pop("loading_folded", False):
+                        self.broadcast_loading(False)
+                    # Run any commands queued while this session was executing something else (EG: an `init` command)
+                    if settings.SESSION_COMMAND_QUEUE and not self.__dict__.get("running_queue"):
+                        try:
+                            self.resume_queued_api_commands()
+                        except Exception as e:
+                            print(
+                                f"Error: Unable to resume the command queue of session {self.id}: {e}"
+                            )
+
+    def acquire_execution(self) -> bool:
+        """
+        Attempts to set the loading (executing) status for this session and broadcast it to all users
+
+        Returns:
+            - Type: bool
+            - What: True if the execution lease was acquired or False if this session is already executing
+
+        Note: Use `set_loading(False)` on this object to release the execution lease
+        """
+        lease = self.get_execution_lease()
+        if not lease.acquire():
+            return False
+        lease.start_heartbeat()
+        self.__dict__["execution_lease"] = lease
+        self.__dict__.pop("loading_folded", None)
+        self.__dict__["is_executing"] = True
+        self.broadcast_loading(True)
+        return True
+
+    def get_detached(self, take_execution: bool = False):
+        """
+        Gets a new object for this session without any of the state stored locally on this object (EG: data and versions)
+
+        Optional:
+
+        - `take_execution`:
+            - Type: bool
+            - What: If True, the execution lease held by this object is moved to the new object
+            - Default: False
+
+        Returns:
+            - Type: Sessions
+
+        Note: Used to hand work off to the API worker pool so the request that dispatched it can not release its execution lease
+        """
+        session = Sessions(
+            id=self.id, name=self.name, team_id=self.team_id, description=self.description
+        )
+        if take_execution and "execution_lease" in self.__dict__:
+            session.__dict__["execution_lease"] = self.__dict__.pop("execution_lease")
+            session.__dict__["is_executing"] = True
+            self.__dict__["is_executing"] = False
+        return session
+
+    def get_execution_lease(self) -> Lease:
+        """
+        Gets a new (unacquired) execution lease for this session owned by the current process
+
+        Returns:
+            - Type: Lease
+            - What: The lease stored at `session:{id}:executing`
+        """
+        return Lease(
+            cache, f"session:{self.id}:executing", get_worker_id(), settings.SESSION_EXECUTION_LEASE
+        )
+
+    def cancel_api_command(self) -> bool:
+        """
+        Requests that the API command running for this session is cancelled and clears any queued API commands
+
+        Returns:
+            - Type: bool
+            - What: True if an API command was running
+
+        Notes:
+            - API commands can check `socket.is_cancelled()` to stop early (their output is discarded either way)
+            - If `settings.API_WORKER_MODE` is "process", the worker processes of commands still running `settings.API_CANCEL_GRACE_PERIOD` seconds after being cancelled are stopped
+            - Only the current execution is cancelled as each execution lease has a new fencing token
+        """
+        cache.delete_many(list(get_queue_ids(self.id)), memory=True)
+        holder = self.get_execution_holder()
+        if holder is None:
+            return False
+        cache.get_client().set(cache.make_key(f"session:{self.id}:cancelled"), holder)
+        return True
+
+    def is_cancelled(self) -> bool:
+        """
+        Checks if the API command running for this session has been cancelled
+
+        Returns:
+            - Type: bool
+        """
+        executing, cancelled = cache.get_client().mget(
+            [
+                cache.make_key(f"session:{self.id}:executing"),
+                cache.make_key(f"session:{self.id}:cancelled"),
+            ]
+        )
+        return cancelled is not None and cancelled == executing
+
+    def get_execution_holder(self) -> str | None:
+        """
+        Gets the holder of the execution lease for this session (by any process)
+
+        Returns:
+            - Type: str | None
+            - What: The holder in the format `{hostname}:{pid}:{random}:{token}` or None if this session is not executing
+        """
+        return self.get_execution_lease().get_holder()
 
     def get_user_ids(self) -> list:
         """
@@ -1044,6 +1236,19 @@ class Sessions(models.Model):
             user_ids = cache.get(f"session:{self.id}:user_ids", [])
         return user_ids
 
+    def get_channel(self) -> str:
+        """
+        Gets the websocket channel for this session
+
+        Returns:
+            type: str
+            what: The channel that the sockets of all users in this session are subscribed to
+
+        Notes:
+            - Used by CaveWSBroadcaster to serialize and publish each broadcast to this session once
+        """
+        return f"session:{self.id}"
+
     def update_user_ids(self) -> None:
         """
         Gets all user ids for users currently in this session and stores it as a json object in the cache
@@ -1052,11 +1257,20 @@ class Sessions(models.Model):
             f"session:{self.id}:user_ids",
             list(CustomUser.objects.filter(session=self).values_list("id", flat=True)),
         )
+        self.touch()
 
-    def get_versions(self) -> dict:
+    def get_versions(self, keys: list | None = None) -> dict:
         """
         Gets the current versions object for this session. This object is not dynamic and is only the version state when this function is called
 
+        Optional:
+
+        - `keys`:
+            - Type: list
+            - What: The data keys to get the versions of
+            - Default: None
+            - Note: If None, the versions of all data keys are returned
+
         Returns:
             type: dict
             what: The data keys and their current versions for this session
@@ -1067,13 +1281,70 @@ class Sessions(models.Model):
         # Used a local object cached versions object to prevent multiple calls to the cache
         versions = self.__dict__.get("versions")
         if self.__dict__.get("is_executing") and versions:
-            return versions
-        self.__dict__["versions"] = cache.get(f"session:{self.id}:versions", {})
+            return (
+                versions
+                if keys is None
+                else {key: versions[key] for key in keys if key in versions}
+            )
+        # Partial reads only fetch the requested fields of the versions hash
+        if keys is not None:
+            return get_hash_versions(cache, f"session:{self.id}:versions", keys=keys)
+        self.__dict__["versions"] = get_hash_versions(cache, f"session:{self.id}:versions")
         return dict(self.__dict__["versions"])
 
     def set_versions(self, versions: dict) -> None:
         """
-        Sets the versions object for this session
+        Sets (replaces) the versions object for this session
+
+        Requires:
+
+        - `versions`:
+            - Type: dict
+            - What: The data keys and their current versions for this session
+
+        Note: Use `update_versions` to change the versions of specific data keys
+        """
+        set_hash_versions(cache, f"session:{self.id}:versions", versions)
+        self.__versions_changed__(versions)
+
+    def update_versions(
+        self, increment: list = list(), assign: dict = dict(), remove: list = list()
+    ) -> dict:
+        """
+        Atomically updates the versions of specific data keys for this session in a single transaction
+
+        Optional:
+
+        - `increment`:
+            - Type: list
+            - What: The data keys whose versions should be incremented
+            - Default: []
+        - `assign`:
+            - Type: dict
+            - What: The data keys and the versions to assign to them (EG: content hashes)
+            - Default: {}
+        - `remove`:
+            - Type: list
+            - What: The data keys whose versions should be removed
+            - Default: []
+
+        Returns:
+            - Type: dict
+            - What: The data keys and their current versions for this session after the update
+        """
+        versions = update_hash_versions(
+            cache,
+            f"session:{self.id}:versions",
+            increment=increment,
+            assign=assign,
+            remove=remove,
+        )
+        self.__versions_changed__(versions)
+        return dict(versions)
+
+    def __versions_changed__(self, versions: dict) -> None:
+        """
+        Records that the versions for this session changed
 
         Requires:
 
@@ -1081,8 +1352,519 @@ class Sessions(models.Model):
             - Type: dict
             - What: The data keys and their current versions for this session
         """
-        cache.set(f"session:{self.id}:versions", versions)
         self.__dict__["versions"] = versions
+        # Mark this session as needing to be persisted by the session persistence service
+        if settings.CACHE_BACKUP_INTERVAL is not None:
+            cache.add_to_set(get_dirty_set(self.id), [self.id])
+        self.touch()
+        # Invalidate any stale data for this session in the local cache of every process
+        local_cache.publish_versions(self.id, versions)
+
+    def get_chunk_versions(self) -> dict:
+        """
+        Gets the current chunk versions object for this session
+
+        Returns:
+            type: dict
+            what: The chunked data keys and their chunk path and chunk versions for this session
+
+        Example:
+        ```
+        {
+            'mapFeatures': {
+                'path': ['data'],
+                'chunks': {'feature_1': 3, 'feature_2': 1}
+            }
+        }
+        ```
+
+        Note: See `settings.CACHE_CHUNKED_PATHS` for which data keys are chunked
+        """
+        return cache.get(f"session:{self.id}:chunk_versions", {})
+
+    def set_chunk_versions(self, chunk_versions: dict) -> None:
+        """
+        Sets the chunk versions object for this session
+
+        Requires:
+
+        - `chunk_versions`:
+            - Type: dict
+            - What: The chunked data keys and their chunk path and chunk versions for this session
+
+        Note: This should be called before `set_versions` so the chunk versions are in place when the new versions are published
+        """
+        cache.set(f"session:{self.id}:chunk_versions", chunk_versions)
+
+    def get_refs(self) -> dict:
+        """
+        Gets the data keys of this session that are stored in (possibly shared) blobs and their blob names
+
+        Returns:
+            type: dict
+            what: The data keys and their blob names
+
+        Note: Data keys that are not in this dict are stored only for this session
+        """
+        return cache.get(f"session:{self.id}:refs", {})
+
+    def set_refs(self, refs: dict) -> None:
+        """
+        Sets the data keys of this session that are stored in blobs and their blob names
+
+        Requires:
+
+        - `refs`:
+            - Type: dict
+            - What: The data keys and their blob names
+
+        Note: This should be called before `set_versions` so the refs are in place when the new versions are published
+        """
+        cache.set(f"session:{self.id}:refs", refs)
+
+    def __get_data_id__(self, key: str, refs: dict) -> str:
+        """
+        Gets the data_id where the data for a data key is stored
+
+        Requires:
+
+        - `key`:
+            - Type: str
+            - What: The data key
+        - `refs`:
+            - Type: dict
+            - What: The data keys and their blob names for this session
+
+        Returns:
+            - Type: str
+        """
+        if key in refs:
+            return get_blob_id(refs[key])
+        return f"session:{self.id}:data:{key}"
+
+    def __get_chunk_data_id__(self, key: str, name: str, chunk_versions: dict) -> str:
+        """
+        Gets the data_id where a chunk of a chunked data key is stored
+
+        Requires:
+
+        - `key`:
+            - Type: str
+            - What: The chunked data key
+        - `name`:
+            - Type: str
+            - What: The name of the chunk
+        - `chunk_versions`:
+            - Type: dict
+            - What: The current chunk versions for this session
+
+        Returns:
+            - Type: str
+        """
+        chunk_refs = chunk_versions.get(key, {}).get("refs", {})
+        if name in chunk_refs:
+            return get_blob_id(chunk_refs[name])
+        return get_chunk_id(self.id, key, name)
+
+    def get_blobs(self, refs: dict | None = None, chunk_versions: dict | None = None) -> list:
+        """
+        Gets all of the blobs referenced by this session
+
+        Optional:
+
+        - `refs`:
+            - Type: dict
+            - What: The refs for this session
+            - Default: None
+            - Note: If None, the refs are read from the cache
+        - `chunk_versions`:
+            - Type: dict
+            - What: The chunk versions for this session
+            - Default: None
+            - Note: If None, the chunk versions are read from the cache
+
+        Returns:
+            type: list
+            what: The blob names referenced by data keys and chunks of this session
+        """
+        refs = self.get_refs() if refs is None else refs
+        chunk_versions = self.get_chunk_versions() if chunk_versions is None else chunk_versions
+        blobs = list(refs.values())
+        for value in chunk_versions.values():
+            blobs += list(value.get("refs", {}).values())
+        return blobs
+
+    def __read_data__(self, keys: list) -> dict:
+        """
+        Gets the data for a set of data keys from the cache joining any chunked data keys back together
+
+        Requires:
+
+        - `keys`:
+            - Type: list of strings
+            - What: The data keys to get
+
+        Returns:
+            - Type: dict
+            - What: The data for each data key found in the cache
+            - Note: Chunked data keys with any missing chunks are not returned
+        """
+        if len(keys) == 0:
+            return {}
+        metadata = cache.get_many([f"session:{self.id}:chunk_versions", f"session:{self.id}:refs"])
+        chunk_versions = metadata.get(f"session:{self.id}:chunk_versions") or {}
+        refs = metadata.get(f"session:{self.id}:refs") or {}
+        data_ids = {key: self.__get_data_id__(key, refs) for key in keys}
+        cache_data = cache.get_many(list(data_ids.values()))
+        data = {key: value for key in keys if (value := cache_data.get(data_ids[key])) != None}
+        chunked_keys = [key for key in data.keys() if key in chunk_versions]
+        if len(chunked_keys) == 0:
+            return data
+        chunk_ids = {
+            (key, name): self.__get_chunk_data_id__(key, name, chunk_versions)
+            for key in chunked_keys
+            for name in chunk_versions[key]["chunks"].keys()
+        }
+        chunk_data = cache.get_many(list(chunk_ids.values()))
+        for key in chunked_keys:
+            chunks = {
+                name: chunk_data.get(chunk_ids[(key, name)])
+                for name in chunk_versions[key]["chunks"].keys()
+            }
+            if any(value == None for value in chunks.values()):
+                data.pop(key)
+                continue
+            data[key] = join(data[key], chunk_versions[key]["path"], chunks)
+        return data
+
+    def __write_data__(self, data: dict, chunk_versions: dict, refs: dict) -> tuple:
+        """
+        Stores data in the cache splitting any chunked data keys into chunks and gets the related version changes
+
+        Requires:
+
+        - `data`:
+            - Type: dict
+            - What: The data keys and their values to store
+        - `chunk_versions`:
+            - Type: dict
+            - What: The current chunk versions for this session
+            - Note: This is updated in place and should be set with `set_chunk_versions` afterwards
+        - `refs`:
+            - Type: dict
+            - What: The current data keys and their blob names for this session
+            - Note: This is updated in place and should be set with `set_refs` afterwards
+
+        Returns:
+            - Type: tuple(list, list, dict)
+            - What: The blob names that are no longer referenced by this session, the data keys whose versions should be incremented and the data keys and their new (hash) versions
+            - Note: The blobs should be released with `release_blobs` after the new versions are set with `update_versions`
+
+        Notes:
+            - Chunked data keys only write the chunks (and skeleton) whose content hash changed
+                - Unchanged chunks keep their chunk version (and are not persisted again)
+                - The version of a chunked data key is only incremented if any part of it changed
+                - Content hashes are stored under `hashes` in the chunk versions with the skeleton hash under `""`
+            - If `settings.CACHE_CONTENT_ADDRESSED` is True, data keys that are not chunked are stored in blobs by content hash
+                - The content hash is used as the version so unchanged data keys keep their version (and are not broadcast)
+                - Identical data is stored once across all sessions
+        """
+        cache_data = {}
+        stale_ids = []
+        released_blobs = []
+        increment = []
+        assign = {}
+        acquired_blobs = []
+        blob_data = {}
+        for key, value in data.items():
+            previous_chunk_versions = chunk_versions.pop(key, {})
+            previous_chunks = previous_chunk_versions.get("chunks", {})
+            previous_blob = refs.pop(key, None)
+            path = get_chunk_path(key)
+            parts = split(value, path) if path is not None else None
+            chunks = {}
+            if parts is not None:
+                skeleton, chunks = parts
+                hashes = {name: get_blob_hash(chunk) for name, chunk in chunks.items()}
+                skeleton_hash = get_blob_hash(skeleton)
+                previous_hashes = previous_chunk_versions.get("hashes", {})
+                # Only chunks whose content changed are written (and have their chunk versions bumped)
+                changed = [
+                    name
+                    for name in chunks.keys()
+                    if name not in previous_chunks or previous_hashes.get(name) != hashes[name]
+                ]
+                # Unchanged chunks that are shared with other sessions stay shared
+                chunk_refs = {
+                    name: blob
+                    for name, blob in previous_chunk_versions.get("refs", {}).items()
+                    if name in chunks and name not in changed
+                }
+                released_blobs += [
+                    blob
+                    for name, blob in previous_chunk_versions.get("refs", {}).items()
+                    if name not in chunk_refs
+                ]
+                chunk_versions[key] = {
+                    "path": path,
+                    "chunks": {
+                        name: previous_chunks.get(name, 0) + (1 if name in changed else 0)
+                        for name in chunks.keys()
+                    },
+                    "hashes": {**hashes, "": skeleton_hash},
+                }
+                if len(chunk_refs) > 0:
+                    chunk_versions[key]["refs"] = chunk_refs
+                for name in changed:
+                    cache_data[get_chunk_id(self.id, key, name)] = chunks[name]
+                skeleton_changed = (
+                    previous_blob is not None or previous_hashes.get("") != skeleton_hash
+                )
+                if skeleton_changed:
+                    cache_data[f"session:{self.id}:data:{key}"] = skeleton
+                removed = [name for name in previous_chunks if name not in chunks]
+                stale_ids += [get_chunk_id(self.id, key, name) for name in removed]
+                if previous_blob is not None:
+                    released_blobs.append(previous_blob)
+                # The version is only bumped if the data key changed
+                if skeleton_changed or len(changed) > 0 or len(removed) > 0:
+                    increment.append(key)
+                continue
+            # Data keys that are not chunked no longer reference any shared chunks
+            released_blobs += list(previous_chunk_versions.get("refs", {}).values())
+            if parts is None and settings.CACHE_CONTENT_ADDRESSED:
+                blob = get_blob_hash(value)
+                refs[key] = blob
+                if blob == previous_blob:
+                    continue
+                acquired_blobs.append(blob)
+                blob_data[blob] = value
+                if previous_blob is None:
+                    # This data key is moving from session storage to a blob
+                    stale_ids.append(f"session:{self.id}:data:{key}")
+            else:
+                cache_data[f"session:{self.id}:data:{key}"] = value
+            stale_ids += [get_chunk_id(self.id, key, name) for name in previous_chunks]
+            if previous_blob is not None:
+                released_blobs.append(previous_blob)
+            if key in refs:
+                assign[key] = refs[key]
+            else:
+                increment.append(key)
+        # Only store blobs that were not already referenced (and stored) by any session
+        for blob in acquire_blobs(cache, acquired_blobs):
+            cache_data[get_blob_id(blob)] = blob_data[blob]
+        cache.set_many(cache_data)
+        cache.delete_many(stale_ids, memory=True, persistent=True)
+        return released_blobs, increment, assign
+
+    def __mutate_chunk__(
+        self, data_name: str, data_path: list, data_value, data_version=None
+    ) -> dict | None:
+        """
+        Mutates a single chunk of a chunked data key without reading or writing the rest of the data key
+
+        Requires:
+
+        - `data_name`:
+            - Type: str
+            - What: The chunked data key to mutate
+        - `data_path`:
+            - Type: list
+            - What: The path in the data key to mutate
+            - Note: This must be inside of a chunk (longer than the chunk path)
+        - `data_value`:
+            - Type: any
+            - What: The data to assign at the end of the `data_path`
+
+        Optional:
+
+        - `data_version`:
+            - Type: int | str | None
+            - What: The version of the data key the mutation was made against
+            - Default: None
+            - Note: If None, the mutation is applied to the current version
+
+        Returns:
+            - Type: dict | None
+            - What: `{"synch_error": True}` if `data_version` is not the current version, otherwise None
+
+        Note: The chunk, chunk versions and data key version are updated in one transaction that is retried if any other process changes the chunk versions or versions first
+        """
+        chunk_versions_id = f"session:{self.id}:chunk_versions"
+        versions_id = f"session:{self.id}:versions"
+        with cache.get_client().pipeline(transaction=True) as pipeline:
+            while True:
+                try:
+                    pipeline.watch(cache.make_key(chunk_versions_id), cache.make_key(versions_id))
+                    # Read the versions from the cache (not the session __dict__) so they match the watched versions
+                    base_version = get_hash_versions(cache, versions_id, keys=[data_name]).get(
+                        data_name
+                    )
+                    if data_version is not None and base_version != data_version:
+                        return {"synch_error": True}
+                    chunk_versions = self.get_chunk_versions()
+                    chunk_path = chunk_versions[data_name]["path"]
+                    chunks = chunk_versions[data_name]["chunks"]
+                    chunk_name = data_path[len(chunk_path)]
+                    chunk_data_id = self.__get_chunk_data_id__(
+                        data_name, chunk_name, chunk_versions
+                    )
+                    path_in_chunk = data_path[len(chunk_path) + 1 :]
+                    if len(path_in_chunk) == 0:
+                        chunk = data_value
+                    else:
+                        chunk = cache.get(chunk_data_id, {}) if chunk_name in chunks else {}
+                        chunk = pamda.assocPath(path=path_in_chunk, value=data_value, data=chunk)
+                    # Shared chunks are copied to this session on their first mutation
+                    released_blob = chunk_versions[data_name].get("refs", {}).pop(chunk_name, None)
+                    # The content hash is cleared (rather than recomputed) so the next full write rewrites this chunk
+                    chunk_versions[data_name].get("hashes", {}).pop(chunk_name, None)
+                    chunks[chunk_name] = chunks.get(chunk_name, 0) + 1
+                    pipeline.multi()
+                    for data_id, value in [
+                        (get_chunk_id(self.id, data_name, chunk_name), chunk),
+                        (chunk_versions_id, chunk_versions),
+                    ]:
+                        pipeline.set(
+                            cache.make_key(data_id), dumps_memory(value), ex=settings.CACHE_TIMEOUT
+                        )
+                    queue_hash_versions_update(pipeline, cache, versions_id, increment=[data_name])
+                    versions = decode_hash_versions(pipeline.execute()[-1])
+                    break
+                except WatchError:
+                    # Another process changed the chunk versions or versions so read them again
+                    continue
+        self.__versions_changed__(versions)
+        # Keep any data for this key stored locally in the session __dict__ in sync
+        if pamda.hasPath(path=["data", data_name], data=self.__dict__):
+            pamda.assocPath(
+                path=["data", data_name, *data_path], value=data_value, data=self.__dict__
+            )
+        if settings.BROADCAST_PATCHES:
+            self.__set_patches__(
+                patches={
+                    data_name: {
+                        "base": base_version,
+                        "ops": [{"op": "replace", "path": data_path, "value": data_value}],
+                    }
+                },
+                versions=versions,
+            )
+        if released_blob is not None:
+            release_blobs(cache, [released_blob])
+
+    def __create_patches__(self, data: dict, versions: dict, known_ops: dict) -> dict:
+        """
+        Creates the operations to patch each existing data key from its current value to a new value
+
+        Requires:
+
+        - `data`:
+            - Type: dict
+            - What: The data keys and their new values
+        - `versions`:
+            - Type: dict
+            - What: The current versions for this session (prior to the new values being stored)
+        - `known_ops`:
+            - Type: dict
+            - What: Data keys and their operations if they are already known (EG: from a mutation)
+
+        Returns:
+            - Type: dict
+            - What: The data keys and their base version and operations
+            - Note: Operations are None if the patch would be too large (see `settings.BROADCAST_PATCH_MAX_OPS` and `settings.BROADCAST_PATCH_MAX_SIZE`)
+        """
+        keys = [key for key in data.keys() if key in versions and key not in known_ops]
+        # Read the current values from the cache as data in the session __dict__ may have been modified in place
+        current_data = {}
+        for key in keys:
+            value = local_cache.get(f"session:{self.id}:data:{key}", versions.get(key))
+            if value != None:
+                current_data[key] = value
+        current_data.update(self.__read_data__([key for key in keys if key not in current_data]))
+        patches = {}
+        for key, value in data.items():
+            if key not in versions:
+                continue
+            ops = known_ops.get(key)
+            if ops is None and key in current_data:
+                ops = diff(
+                    current_data[key],
+                    value,
+                    max_ops=settings.BROADCAST_PATCH_MAX_OPS,
+                    max_size=settings.BROADCAST_PATCH_MAX_SIZE,
+                )
+            patches[key] = {"base": versions[key], "ops": ops}
+        return patches
+
+    def __set_patches__(self, patches: dict, versions: dict) -> None:
+        """
+        Stores the patches for data keys so they can be broadcast instead of the full data
+
+        Requires:
+
+        - `patches`:
+            - Type: dict
+            - What: The data keys and their base version and operations (see `__create_patches__`)
+        - `versions`:
+            - Type: dict
+            - What: The versions for this session after the patches were applied
+        """
+        cache.set_many(
+            {
+                f"session:{self.id}:patch:{key}": {
+                    "base": patch["base"],
+                    "version": versions[key],
+                    "ops": patch["ops"],
+                }
+                for key, patch in patches.items()
+                if patch["ops"] is not None
+            }
+        )
+        cache.delete_many(
+            [
+                f"session:{self.id}:patch:{key}"
+                for key, patch in patches.items()
+                if patch["ops"] is None
+            ],
+            memory=True,
+        )
+
+    def get_patches(self, previous_versions: dict, versions: dict, keys: list) -> dict:
+        """
+        Gets the stored patch operations for data keys that can be patched from a set of previous versions
+
+        Requires:
+
+        - `previous_versions`:
+            - Type: dict
+            - What: The versions to patch from
+        - `versions`:
+            - Type: dict
+            - What: The current versions for this session
+        - `keys`:
+            - Type: list of strings
+            - What: The data keys to get patches for
+
+        Returns:
+            - Type: dict
+            - What: The data keys and their patch operations
+            - Note: Only data keys with a stored patch from exactly the previous version to the current version are included
+        """
+        if len(keys) == 0:
+            return {}
+        patches = cache.get_many([f"session:{self.id}:patch:{key}" for key in keys])
+        output = {}
+        for key in keys:
+            patch = patches.get(f"session:{self.id}:patch:{key}")
+            if (
+                patch != None
+                and previous_versions.get(key) == patch["base"]
+                and versions.get(key) == patch["version"]
+            ):
+                output[key] = patch["ops"]
+        return output
 
     def get_data(self, keys: list[str] = None, client_only: bool = True, omit_keys=list(), create_missing_cache_keys=False) -> dict:
         """
@@ -1126,19 +1908,26 @@ class Sessions(models.Model):
                 keys_to_get_from_cache.append(key)
         # If there any keys to get from the cache, get them all at once and update the session __dict__
         if len(keys_to_get_from_cache) > 0:
-            new_data = cache.get_many(
-                [f"session:{self.id}:data:{key}" for key in keys_to_get_from_cache]
+            # Get any data available at the current versions from the in process local cache (if enabled)
+            versions = self.get_versions() if local_cache.enabled else {}
+            new_data = {}
+            for key in keys_to_get_from_cache:
+                value = local_cache.get(f"session:{self.id}:data:{key}", versions.get(key))
+                if value != None:
+                    new_data[key] = value
+            cache_data = self.__read_data__(
+                [key for key in keys_to_get_from_cache if key not in new_data]
             )
-            # Get the specific key names from the cache keys
-            new_data = {
-                key.split(":")[-1]: value for key, value in new_data.items() if value != None
-            }
+            for key, value in cache_data.items():
+                local_cache.set(f"session:{self.id}:data:{key}", versions.get(key), value)
+            new_data.update(cache_data)
             if create_missing_cache_keys:
                 # If creating missing cache keys, fill in any missing keys with empty dictionaries to prevent errors in the client
-                for key in keys_to_get_from_cache:
-                    if key not in new_data:
-                        new_data[key] = {}
-                        cache.set(f"session:{self.id}:data:{key}", new_data[key])
+                missing_data = {key: {} for key in keys_to_get_from_cache if key not in new_data}
+                cache.set_many(
+                    {f"session:{self.id}:data:{key}": value for key, value in missing_data.items()}
+                )
+                new_data.update(missing_data)
             # If the new data is not the same length as the keys to get from the cache, there was an error
             # Likely, some data was lost from the persistent cache
             if len(new_data.keys()) != len(keys_to_get_from_cache):
@@ -1158,7 +1947,11 @@ class Sessions(models.Model):
         return {key: pamda.path(["data", key], self.__dict__) for key in keys}
 
     def broadcast_changed_data(
-        self, previous_versions: dict, broadcast_loading: bool = True, force_overwrite: bool = False
+        self,
+        previous_versions: dict,
+        broadcast_loading: bool = True,
+        force_overwrite: bool = False,
+        target=None,
     ) -> None:
         """
         Broadcasts and returns all data that has changed given some set of previous versions
@@ -1173,13 +1966,19 @@ class Sessions(models.Model):
 
         - `broadcast_loading`:
             - Type: bool
-            - What: If True, the loading state will be broadcasted to all users before and after the data is broadcasted
+            - What: If True, the loading state (False) is sent with the broadcasted data
             - Default: True
+            - Note: If `target` is None, releasing the execution lease does not send the loading state again (see `set_loading`)
         - `force_overwrite`:
             - Type: bool
             - What: If True, the data will be broadcasted to the client to force an update (even with matching versions) and will trigger reloading client side
             - Default: False
             - Note: Used primarily for switching between sessions
+        - `target`:
+            - Type: CustomUser | None
+            - What: The object to broadcast the data to
+            - Default: None
+            - Note: If None, the data is broadcasted to all users in this session
 
         """
         # print('==BROADCAST CHANGED DATA==')
@@ -1194,24 +1993,48 @@ class Sessions(models.Model):
         updated_keys = [
             key for key, value in versions.items() if previous_versions.get(key) != value
         ]
-        data = self.get_data(client_only=True, keys=updated_keys)
-        # Broadcast the updated versions and data
-
-        if broadcast_loading:
-            self.broadcast_loading(True)
-        # Pass force overwrite as an extra kwarg to keep backwards compatibiiity
-        extra_kwargs = {"forceOverwrite": True} if force_overwrite else {}
-        CaveWSBroadcaster(self).broadcast(
-            event="overwrite",
-            versions=versions,
-            data=data,
-            **extra_kwargs,
+        # Send patches instead of the full data for keys that can be patched from the previous versions
+        patches = {}
+        if settings.BROADCAST_PATCHES and not force_overwrite:
+            patches = self.get_patches(
+                previous_versions=previous_versions,
+                versions=versions,
+                keys=pamda.intersection(updated_keys, api_keys),
+            )
+        data = self.get_data(
+            client_only=True, keys=[key for key in updated_keys if key not in patches]
         )
-        if broadcast_loading:
-            self.broadcast_loading(False)
+        # Broadcast the updated versions and data (in one pipeline)
+        with batch():
+            socket = CaveWSBroadcaster(self if target is None else target)
+            send_overwrite = len(data) > 0 or len(patches) == 0
+            # Send the loading state with the last message instead of as separate `updateLoading` events
+            loading_kwargs = socket.fold_loading(False) if broadcast_loading else {}
+            # Releasing the execution lease does not need to send `loading=False` again (see `set_loading`)
+            if broadcast_loading and target is None:
+                self.__dict__["loading_folded"] = True
+            if len(patches) > 0:
+                # Clients that are not at the base versions ignore the patch and request their data with get_session_data
+                socket.broadcast(
+                    event="patch",
+                    versions=versions,
+                    baseVersions={key: previous_versions.get(key) for key in patches.keys()},
+                    data=patches,
+                    **({} if send_overwrite else loading_kwargs),
+                )
+            if send_overwrite:
+                # Pass force overwrite as an extra kwarg to keep backwards compatibiiity
+                extra_kwargs = {"forceOverwrite": True} if force_overwrite else {}
+                socket.broadcast(
+                    event="overwrite",
+                    versions=versions,
+                    data=data,
+                    **extra_kwargs,
+                    **loading_kwargs,
+                )
         # print('==BROADCAST CHANGED DATA END==')
 
-    def replace_data(self, data, wipeExisting):
+    def replace_data(self, data, wipeExisting, patch_ops=None, keep_keys=None):
         """
         Replaces data in this session
 
@@ -1224,6 +2047,19 @@ class Sessions(models.Model):
             - Type: bool
             - What: Boolean to indicate if previously existing data should be wiped
 
+        Optional:
+
+        - `patch_ops`:
+            - Type: dict
+            - What: Data keys and the patch operations that turn their current values into the new values if already known
+            - Default: None
+            - Note: Only used if `settings.BROADCAST_PATCHES` is True. Other data keys are diffed against their current values.
+        - `keep_keys`:
+            - Type: list
+            - What: Data keys that are not wiped even though they are not in `data`
+            - Default: None
+            - Note: Only used if `wipeExisting` is True
+
         `data` Example:
         ```
         {
@@ -1239,24 +2075,53 @@ class Sessions(models.Model):
         """
         # print('==REPLACE DATA==')
         versions = self.get_versions()
+        chunk_versions = self.get_chunk_versions()
+        previous_chunk_versions = pamda.clone(chunk_versions)
+        refs = self.get_refs()
+        previous_refs = dict(refs)
+        released_blobs = []
+        keys_to_delete = []
         if wipeExisting:
-            data_keys = list(data.keys())
+            data_keys = list(data.keys()) + list(keep_keys or [])
             keys_to_delete = pamda.difference(list(versions.keys()), data_keys)
             cache.delete_many(
-                [f"session:{self.id}:data:{key}" for key in keys_to_delete],
+                [f"session:{self.id}:data:{key}" for key in keys_to_delete]
+                + [
+                    get_chunk_id(self.id, key, name)
+                    for key in keys_to_delete
+                    for name in chunk_versions.get(key, {}).get("chunks", {}).keys()
+                ],
                 memory=True,
                 persistent=True,
             )
+            cache.delete_many(
+                [f"session:{self.id}:patch:{key}" for key in keys_to_delete], memory=True
+            )
             for key in keys_to_delete:
-                versions.pop(key, None)
+                released_blobs += list(chunk_versions.pop(key, {}).get("refs", {}).values())
+                if key in refs:
+                    released_blobs.append(refs.pop(key))
+        if settings.BROADCAST_PATCHES:
+            patches = self.__create_patches__(
+                data=data, versions=versions, known_ops=patch_ops or {}
+            )
         # Update the cache with the new data
-        cache.set_many({f"session:{self.id}:data:{key}": value for key, value in data.items()})
+        written_blobs, increment, assign = self.__write_data__(
+            data=data, chunk_versions=chunk_versions, refs=refs
+        )
+        released_blobs += written_blobs
         # Store the new data locally in the session __dict__ to prevent multiple cache hits
         for key, value in data.items():
             pamda.assocPath(path=["data", key], value=value, data=self.__dict__)
-            versions[key] = versions.get(key, 0) + 1
-        # Update versions post replacement
-        self.set_versions(versions)
+        # Update versions post replacement (all changed data keys are bumped in a single transaction)
+        if chunk_versions != previous_chunk_versions:
+            self.set_chunk_versions(chunk_versions)
+        if refs != previous_refs:
+            self.set_refs(refs)
+        versions = self.update_versions(increment=increment, assign=assign, remove=keys_to_delete)
+        if settings.BROADCAST_PATCHES:
+            self.__set_patches__(patches=patches, versions=versions)
+        release_blobs(cache, released_blobs)
         # print('==REPLACE DATA END==')
 
     def execute_api_command(
@@ -1266,6 +2131,7 @@ class Sessions(models.Model):
         mutate_dict=dict(),
         previous_versions=dict(),
         broadcast_changes=True,
+        background=False,
     ):
         """
         Execute an API Command given the current data and replaces the entire current session state
@@ -1294,28 +2160,130 @@ class Sessions(models.Model):
             - Type: bool
             - What: A boolean to determine if the changes should be broadcasted to all users
             - Default: True
+        - `background`:
+            - Type: bool
+            - What: If True, the command runs in the API worker pool (see `settings.API_WORKER_MODE`) and this returns once it is dispatched
+            - Default: False
+            - Note: Exceptions raised by background commands are sent to the users in this session
         """
         # print('\n==EXECUTE API COMMAND==')
         self.set_loading(True)
+        session = self.get_detached(take_execution=True) if background else self
+
+        def run():
+            try:
+                session.__run_api_command__(
+                    command=command,
+                    command_keys=command_keys,
+                    mutate_dict=mutate_dict,
+                    previous_versions=previous_versions,
+                    broadcast_changes=broadcast_changes,
+                    # The loading state is released right after so it is sent with the changed data
+                    broadcast_loading=True,
+                )
+            finally:
+                # Update the execution state overriding any blocks (even if the command failed)
+                # Note: Only `session` can release the lease once it has been moved to a detached session
+                session.set_loading(False, override_block=True)
+
+        if background:
+            try:
+                dispatch(run, on_error=session.__api_command_error__)
+            except Exception:
+                # The command was not dispatched (EG: the worker pool is full) or failed inline
+                session.set_loading(False, override_block=True)
+                raise
+        else:
+            run()
+        # print('==EXECUTE API COMMAND END==\n')
+
+    def __api_command_error__(self, e):
+        """
+        Notifies the users in this session of an exception raised by a background API Command and stops the loading state
+        """
+        notify_exception(self, e)
+        self.set_loading(False, override_block=True)
+
+    def __run_api_command__(
+        self,
+        command,
+        command_keys,
+        mutate_dict,
+        previous_versions,
+        broadcast_changes,
+        broadcast_loading=False,
+    ):
+        """
+        Runs an API Command and replaces the session state with its output
+
+        Notes:
+            - The caller must hold the execution lease for this session (see `execute_api_command`)
+            - If the command is cancelled (see `cancel_api_command`), its remaining output is discarded
+            - If `execute_command` is a generator, each partial output (a dict of top level keys) is stored and broadcast as soon as it is yielded
+                - `extraKwargs` can be included in any partial output
+                - If `wipeExisting`, data keys that were not in any partial output are wiped once the generator finishes
+            - If `broadcast_loading`, the final changes are sent with a loading state of False (see `broadcast_changed_data`)
+            - Pending progress updates from the command are dropped once it ends (see `CaveWSBroadcaster.end_progress`)
+        """
         session_data = self.get_data(
             keys=command_keys, client_only=False, omit_keys=background_api_keys
         )
-        socket = CaveWSBroadcaster(self)
-        command_output = execute_command(
-            session_data=session_data, command=command, socket=socket, mutate_dict=mutate_dict
+        # Worker processes broadcast with a lightweight session (by id) instead of this session and its data
+        socket = CaveWSBroadcaster(
+            Sessions(id=self.id) if settings.API_WORKER_MODE == "process" else self
         )
-        # Ensure that no reserved api keys are returned
-        background_api_keys_used = pamda.intersection(
-            list(command_output.keys()), background_api_keys
-        )
-        if len(background_api_keys_used) > 0:
-            raise Exception(
-                f"Oops! The following reserved api keys were returned: {str(background_api_keys_used)}"
+        wipe_existing = settings.DEFAULT_WIPE_EXISTING
+        streamed_keys = []
+        try:
+            for output_type, command_output in stream_in_worker(
+                run_and_end_progress,
+                execute_command,
+                session_data=session_data,
+                command=command,
+                socket=socket,
+                mutate_dict=mutate_dict,
+                cancelled=self.is_cancelled,
+            ):
+                if self.is_cancelled():
+                    raise CommandCancelled()
+                # Ensure that no reserved api keys are returned
+                background_api_keys_used = pamda.intersection(
+                    list(command_output.keys()), background_api_keys
+                )
+                if len(background_api_keys_used) > 0:
+                    raise Exception(
+                        f"Oops! The following reserved api keys were returned: {str(background_api_keys_used)}"
+                    )
+                # Pop out kwargs for use but not for storage
+                extraKwargs = command_output.pop("extraKwargs", command_output.pop("kwargs", {}))
+                wipe_existing = extraKwargs.get("wipeExisting", wipe_existing)
+                if output_type == "output":
+                    # Update the session data with the command output
+                    self.replace_data(data=command_output, wipeExisting=wipe_existing)
+                    continue
+                # Store and broadcast each partial output (from a generator `execute_command`) as soon as it is ready
+                self.replace_data(data=command_output, wipeExisting=False)
+                streamed_keys += list(command_output.keys())
+                if broadcast_changes:
+                    self.broadcast_changed_data(
+                        previous_versions=previous_versions, broadcast_loading=False
+                    )
+                    previous_versions = self.get_versions()
+        except CommandCancelled:
+            CaveWSBroadcaster(self).notify(
+                message="The API command was cancelled.",
+                title="Cancelled:",
+                show=True,
+                theme="info",
+                duration=5,
             )
-        # Pop out kwargs for use but not for storage
-        extraKwargs = command_output.pop("extraKwargs", command_output.pop("kwargs", {}))
-        # Update the session data with the command output
-        self.replace_data(data=command_output, wipeExisting=extraKwargs.get("wipeExisting", settings.DEFAULT_WIPE_EXISTING))
+            return
+        finally:
+            # Drop any pending progress update so it is never sent after the final output (or error)
+            socket.end_progress()
+        # Wipe any data keys that were not in any of the partial outputs
+        if wipe_existing and len(streamed_keys) > 0:
+            self.replace_data(data={}, wipeExisting=True, keep_keys=streamed_keys)
 
         # Validate if in debug + live api validation mode
         if settings.DEBUG:
@@ -1335,11 +2303,132 @@ class Sessions(models.Model):
         # Broadcast the changed data if specified
         if broadcast_changes:
             self.broadcast_changed_data(
-                previous_versions=previous_versions, broadcast_loading=False
+                previous_versions=previous_versions, broadcast_loading=broadcast_loading
             )
-        # Update the execution state overriding any blocks
-        self.set_loading(False, override_block=True)
-        # print('==EXECUTE API COMMAND END==\n')
+
+    def coalesce_mutation(self, user_id: int, data: dict) -> bool:
+        """
+        Buffers a mutation request so only the latest mutation to each data path in the coalescing window is applied
+
+        Requires:
+
+        - `user_id`:
+            - Type: int
+            - What: The id of the user that sent the mutation request
+        - `data`:
+            - Type: dict
+            - What: The mutation request data (see `mutate_session`)
+
+        Returns:
+            - Type: bool
+            - What: True if this mutation opened a new coalescing window
+            - Note: If True, the caller should apply the buffered mutations (see `take_coalesced_mutations`) after `settings.SESSION_MUTATION_WINDOW` milliseconds
+        """
+        return coalesce(
+            cache,
+            f"session:{self.id}:mutations",
+            path=[data.get("data_name"), *(data.get("data_path") or [])],
+            value={"user_id": user_id, "data": data},
+            window=settings.SESSION_MUTATION_WINDOW,
+        )
+
+    def take_coalesced_mutations(self) -> list:
+        """
+        Removes and returns all buffered mutation requests for this session
+
+        Returns:
+            - Type: list
+            - What: The latest mutation request (as a dict with the `user_id` and `data`) for each data path in the order the first mutation to that path was sent
+        """
+        return take_coalesced(cache, f"session:{self.id}:mutations")
+
+    def queue_api_command(self, command, command_keys=None, mutate_dict=dict()):
+        """
+        Adds an API Command to this session's command queue and runs the queue unless another process is already running it
+
+        Requires:
+
+        - `command`:
+            - What: A string to pass to the api as the command parameter
+
+        Optional:
+
+        - `command_keys`:
+            - Type: list[str]
+            - What: List of strings to determine which top level keys should be passed with the command
+            - Default: None
+            - Note: If None, all keys are sent to the api
+        - `mutate_dict`:
+            - Type: dict
+            - What: A dictionary that provides information on what mutation fired this command
+            - Default: {}
+
+        Notes:
+            - Queued commands are coalesced by `settings.SESSION_COMMAND_COALESCING`
+            - Changes are broadcast relative to the versions at the time each command runs
+            - The queue is run in the API worker pool (see `settings.API_WORKER_MODE`)
+        """
+        enqueue_command(
+            cache,
+            self.id,
+            {"command": command, "command_keys": command_keys, "mutate_dict": mutate_dict},
+            coalescing=settings.SESSION_COMMAND_COALESCING,
+        )
+        session = self.get_detached()
+        dispatch(session.run_queued_api_commands, on_error=session.__api_command_error__)
+
+    def run_queued_api_commands(self):
+        """
+        Runs all API Commands in this session's command queue in order
+
+        Notes:
+            - Only the holder of the execution lease runs the queue so if another process is executing, it runs the queued commands when it finishes
+            - The queue is checked again after the execution lease is released so commands queued while releasing are not missed
+            - Each command reads the current session data so it sees any changes made (EG: by mutations in other processes) since the previous command
+            - If a command raises an exception, the users are notified and the remaining commands still run
+            - If the execution lease is lost (EG: this process stalled), the remaining commands are left to the process that holds it next
+            - If the process running the queue dies, the remaining commands are run once the lease expires and the queue is resumed (see `resume_queued_api_commands`)
+        """
+        # The queue is checked below after each release so releasing does not need to resume it (see `set_loading`)
+        self.__dict__["running_queue"] = True
+        while get_queue_length(cache, self.id) > 0:
+            if not self.acquire_execution():
+                return
+            lease = self.__dict__["execution_lease"]
+            try:
+                while (
+                    lease.renew()
+                    and not self.is_cancelled()
+                    and (queued := dequeue_command(cache, self.id)) is not None
+                ):
+                    self.__dict__.pop("data", None)
+                    self.__dict__.pop("versions", None)
+                    try:
+                        self.__run_api_command__(
+                            **queued, previous_versions=self.get_versions(), broadcast_changes=True
+                        )
+                    except Exception as e:
+                        notify_exception(self, e)
+            finally:
+                self.set_loading(False, override_block=True)
+
+    def resume_queued_api_commands(self) -> bool:
+        """
+        Runs this session's queued API Commands in the API worker pool if they are not being run by any process
+
+        Returns:
+            - Type: bool
+            - What: True if the queue was resumed
+
+        Notes:
+            - Used to pick up commands left in the queue by a process that died while running it
+            - Used to run commands queued while the session was executing a command that was not queued (EG: `init`)
+        """
+        if get_queue_length(cache, self.id) == 0 or self.get_execution_holder() is not None:
+            return False
+        session = self.get_detached()
+        dispatch(session.run_queued_api_commands, on_error=session.__api_command_error__)
+        return True
 
     def mutate(self, data_version, data_name, data_path, data_value=None, ignore_version=False, create_missing_cache_keys=False):
         """
@@ -1374,8 +2463,22 @@ class Sessions(models.Model):
             - Default: False
         """
         # print('==MUTATE==')
+        # Mutations inside of a chunk of a chunked data key only read and write that chunk
+        chunk_versions = self.get_chunk_versions()
+        chunk_path = chunk_versions.get(data_name, {}).get("path")
+        if (
+            chunk_path is not None
+            and len(data_path) > len(chunk_path)
+            and list(data_path[: len(chunk_path)]) == chunk_path
+        ):
+            return self.__mutate_chunk__(
+                data_name=data_name,
+                data_path=list(data_path),
+                data_value=data_value,
+                data_version=None if ignore_version else data_version,
+            )
         data = self.get_data(keys=[data_name], client_only=False, create_missing_cache_keys=create_missing_cache_keys).get(data_name)
-        versions = self.get_versions()
+        versions = self.get_versions(keys=[data_name])
         if data == None:
             raise Exception(
                 "Session Error: No session data found. This could be caused by an incorrect `data_name` or not being in a session."
@@ -1385,6 +2488,7 @@ class Sessions(models.Model):
         self.replace_data(
             data={data_name: pamda.assocPath(path=data_path, value=data_value, data=data)},
             wipeExisting=False,
+            patch_ops={data_name: [{"op": "replace", "path": data_path, "value": data_value}]},
         )
         # print('==MUTATE END==')
 
@@ -1424,35 +2528,387 @@ class Sessions(models.Model):
         Returns:
             - Type: Session object
             - What: The new session object that was created
+
+        Notes:
+            - The new session shares all of its data with this session (copy on write) instead of copying it
+            - Data stored only for this session is first moved into blobs (see `share_data`)
+            - Either session copies a data key (or chunk) only when it is first changed
         """
-        session_data = self.get_data(keys=list(self.get_versions().keys()), client_only=False)
+        versions = self.get_versions()
+        chunk_versions, refs = self.share_data(versions)
         new_session = self
         new_session.name = str(name)
         new_session.description = str(description)
         new_session.pk = None
         new_session.save()
-        cache.set_many(
-            {f"session:{new_session.id}:data:{key}": value for key, value in session_data.items()}
-        )
-        new_session.set_versions({key: 0 for key in session_data.keys()})
+        # Reference all of the shared blobs for the new session
+        acquire_blobs(cache, new_session.get_blobs(refs=refs, chunk_versions=chunk_versions))
+        if len(chunk_versions) > 0:
+            new_session.set_chunk_versions(chunk_versions)
+        if len(refs) > 0:
+            new_session.set_refs(refs)
+        new_session.set_versions(versions)
         return new_session
 
+    def share_data(self, versions: dict) -> tuple:
+        """
+        Moves all data stored only for this session into blobs so that it can be shared with other sessions
+
+        Requires:
+
+        - `versions`:
+            - Type: dict
+            - What: The current versions for this session
+
+        Returns:
+            - Type: tuple(dict, dict)
+            - What: The chunk versions and refs for this session after the data was moved into blobs
+
+        Notes:
+            - Data is moved (not copied) within the cache so this does not depend on the size of the data
+            - Versions are not changed as the data itself does not change
+        """
+        chunk_versions = self.get_chunk_versions()
+        refs = self.get_refs()
+        data_ids = {}
+        for key in versions.keys():
+            if key not in refs:
+                data_ids[f"session:{self.id}:data:{key}"] = (key, None)
+            for name in chunk_versions.get(key, {}).get("chunks", {}).keys():
+                if name not in chunk_versions[key].get("refs", {}):
+                    data_ids[get_chunk_id(self.id, key, name)] = (key, name)
+        if len(data_ids) == 0:
+            return chunk_versions, refs
+
+        def get_updates(promoted):
+            new_chunk_versions = pamda.clone(chunk_versions)
+            new_refs = dict(refs)
+            for data_id, blob in promoted.items():
+                key, name = data_ids[data_id]
+                if name is None:
+                    new_refs[key] = blob
+                else:
+                    new_chunk_versions[key].setdefault("refs", {})[name] = blob
+            return {
+                f"session:{self.id}:chunk_versions": new_chunk_versions,
+                f"session:{self.id}:refs": new_refs,
+            }
+
+        # The chunk versions and refs are set together with the move so they always point at the moved data
+        promoted = promote_to_blobs(cache, list(data_ids.keys()), get_updates)
+        updates = get_updates(promoted)
+        chunk_versions = updates[f"session:{self.id}:chunk_versions"]
+        refs = updates[f"session:{self.id}:refs"]
+        # Mark the moved data keys as changed so the blobs (and refs) are persisted
+        promoted_keys = {data_ids[data_id][0] for data_id in promoted.keys()}
+        persisted_versions = cache.get(f"session:{self.id}:persisted_versions", {})
+        persisted_chunk_versions = cache.get(f"session:{self.id}:persisted_chunk_versions", {})
+        for key in promoted_keys:
+            persisted_versions.pop(key, None)
+            persisted_chunk_versions.pop(key, None)
+        self.set_persisted_versions(persisted_versions, persisted_chunk_versions)
+        if settings.CACHE_BACKUP_INTERVAL is not None:
+            cache.add_to_set(get_dirty_set(self.id), [self.id])
+        return chunk_versions, refs
+
     def get_cache_keys(self):
         """
         Gets all cache keys for this session
         """
-        keys = [f"session:{self.id}:{key}" for key in ["versions", "executing", "user_ids"]]
+        keys = [
+            f"session:{self.id}:{key}"
+            for key in [
+                "versions",
+                "versions:counters",
+                "persisted_versions",
+                "chunk_versions",
+                "persisted_chunk_versions",
+                "refs",
+                "executing",
+                "executing:fence",
+                "hibernating",
+                "hibernating:fence",
+                "cancelled",
+                "commands",
+                "commands:data",
+                "mutations",
+                "mutations:window",
+                "mutations:paths",
+                "user_ids",
+            ]
+        ]
+        versions = get_hash_versions(cache, f"session:{self.id}:versions")
+        keys += [f"session:{self.id}:data:{key}" for key in versions.keys()]
+        keys += [f"session:{self.id}:patch:{key}" for key in versions.keys()]
         keys += [
-            f"session:{self.id}:data:{key}"
-            for key in list(cache.get(f"session:{self.id}:versions", {}).keys())
+            get_chunk_id(self.id, key, name)
+            for key, value in self.get_chunk_versions().items()
+            for name in value["chunks"].keys()
         ]
+        # Note: Blobs are not included as they can be shared with other sessions (see `get_blobs` and `release_blobs`)
         return keys
 
+    def get_persist_cache_data(self):
+        """
+        Gets the serialized session data that has changed since it was last persisted
+
+        Returns:
+            - Type: tuple(dict, dict, dict) | None
+            - What: The serialized data by cache key and the versions and chunk versions it represents
+            - Note: None if nothing has changed since the last time this session was persisted or if it is hibernated
+
+        Notes:
+            - Only data keys whose version changed since they were last persisted are included
+            - Only chunks whose chunk version changed since they were last persisted are included
+        """
+        # Hibernated sessions are already fully persisted (and reading them would load them back into the cache)
+        if self.is_hibernated():
+            return None
+        versions = get_hash_versions(cache, f"session:{self.id}:versions")
+        persisted_versions = cache.get(f"session:{self.id}:persisted_versions", {})
+        if versions == persisted_versions:
+            return None
+        chunk_versions = self.get_chunk_versions()
+        persisted_chunk_versions = cache.get(f"session:{self.id}:persisted_chunk_versions", {})
+        changed_keys = [
+            key for key, version in versions.items() if persisted_versions.get(key) != version
+        ]
+        refs = self.get_refs()
+        data_ids = [
+            f"session:{self.id}:chunk_versions",
+            f"session:{self.id}:refs",
+        ]
+        data_ids += [
+            self.__get_data_id__(key, refs)
+            for key in changed_keys
+            # Blobs never change so they only need to be persisted once (by any session)
+            if not (key in refs and cache.exists(get_blob_id(refs[key])))
+        ]
+        data_ids += [
+            data_id
+            for key in changed_keys
+            for name, version in chunk_versions.get(key, {}).get("chunks", {}).items()
+            if persisted_chunk_versions.get(key, {}).get("chunks", {}).get(name) != version
+            and not (
+                (data_id := self.__get_chunk_data_id__(key, name, chunk_versions)).startswith(
+                    "blob:"
+                )
+                and cache.exists(data_id)
+            )
+        ]
+        data = cache.dumps_many_persistent(data_ids)
+        # Versions are stored in a hash so they are serialized from the versions read above
+        data[f"session:{self.id}:versions"] = dumps_persistent(versions)
+        return data, versions, chunk_versions
+
+    def set_persisted_versions(self, versions: dict, chunk_versions: dict | None = None) -> None:
+        """
+        Records the versions of this session's data that were last persisted
+
+        Requires:
+
+        - `versions`:
+            - Type: dict
+            - What: The data keys and their versions that were persisted
+
+        Optional:
+
+        - `chunk_versions`:
+            - Type: dict
+            - What: The chunked data keys and their chunk versions that were persisted
+            - Default: None
+            - Note: If None, the persisted chunk versions are not updated
+        """
+        cache.set(f"session:{self.id}:persisted_versions", versions)
+        if chunk_versions is not None:
+            cache.set(f"session:{self.id}:persisted_chunk_versions", chunk_versions)
+
     def persist_cache_data(self):
         """
         Persists the current session data to the persistent cache
+
+        Notes:
+            - Only data keys whose version changed since they were last persisted are persisted
+            - The last persisted version of each key is stored in `session:{id}:persisted_versions`
+        """
+        persist_data = self.get_persist_cache_data()
+        if persist_data is None:
+            return
+        data, versions, chunk_versions = persist_data
+        for data_id, value in data.items():
+            cache.save_serialized(data_id, value)
+        self.set_persisted_versions(versions, chunk_versions)
+
+    def warm_cache_data(self) -> bool:
         """
-        cache.persist_many(self.get_cache_keys())
+        Loads this session's persisted data into the cache without overwriting any data already in the cache
+
+        Returns:
+            - Type: bool
+            - What: True if any persisted data was loaded into the cache
+
+        Notes:
+            - Used to rehydrate the cache (EG: after a cache restart) before users request the data
+            - If the versions are loaded, they are also recorded as persisted to avoid persisting the same data again
+        """
+        versions = cache.get_persistent(f"session:{self.id}:versions")
+        if versions is None:
+            return False
+        chunk_versions = cache.get_persistent(f"session:{self.id}:chunk_versions", {})
+        refs = cache.get_persistent(f"session:{self.id}:refs", {})
+        warmed = cache.warm(
+            [
+                f"session:{self.id}:chunk_versions",
+                f"session:{self.id}:refs",
+            ]
+            + [self.__get_data_id__(key, refs) for key in versions.keys()]
+            + [
+                self.__get_chunk_data_id__(key, name, chunk_versions)
+                for key, value in chunk_versions.items()
+                for name in value["chunks"].keys()
+            ]
+        )
+        # The versions are loaded last so they never point to data that is not in the cache yet
+        if add_hash_versions(cache, f"session:{self.id}:versions", versions):
+            cache.add(f"session:{self.id}:persisted_versions", versions)
+            cache.add(f"session:{self.id}:persisted_chunk_versions", chunk_versions)
+            return True
+        return len(warmed) > 0
+
+    def touch(self) -> None:
+        """
+        Records that this session is in use now and clears its hibernated status
+
+        Notes:
+            - Only applies if `settings.CACHE_BACKUP_INTERVAL` is set
+            - Sessions that are not touched for `settings.CACHE_HIBERNATE_AFTER` seconds are hibernated by the session persistence service
+            - The most recently touched sessions are loaded first when the cache is warmed (see `warm_cache`)
+        """
+        if settings.CACHE_BACKUP_INTERVAL is None:
+            return
+        pipeline = cache.get_client().pipeline(transaction=False)
+        pipeline.zadd(cache.make_key(get_activity_set(self.id)), {self.id: time.time()})
+        pipeline.srem(cache.make_key("sessions:hibernated"), self.id)
+        pipeline.execute()
+
+    def is_hibernated(self) -> bool:
+        """
+        Checks if this session is hibernated (its data was removed from the cache and only exists in the persistent cache)
+
+        Returns:
+            - Type: bool
+        """
+        if settings.CACHE_HIBERNATE_AFTER is None:
+            return False
+        return cache.is_in_set("sessions:hibernated", self.id)
+
+    def get_hibernation_lease(self) -> Lease:
+        """
+        Gets a new (unacquired) hibernation lease for this session owned by the current process
+
+        Returns:
+            - Type: Lease
+            - What: The lease stored at `session:{id}:hibernating`
+
+        Notes:
+            - Held by `hibernate` and `wake` so a session is never hibernated while it is being woken (and vice versa)
+        """
+        return Lease(
+            cache, f"session:{self.id}:hibernating", get_worker_id(), settings.CACHE_BACKUP_LEASE
+        )
+
+    def hibernate(self) -> bool:
+        """
+        Persists all of this session's data and removes it from the cache
+
+        Returns:
+            - Type: bool
+            - What: True if the session was hibernated
+
+        Notes:
+            - Runs under the hibernation lease for this session (see `get_hibernation_lease`)
+            - Sessions with users in them, that are executing or that were used within `settings.CACHE_HIBERNATE_AFTER` seconds are not hibernated
+            - Sessions that change while being persisted or removed are not hibernated
+            - The user ids (and version and lease fencing counters) are kept in the cache
+            - Hibernated sessions are loaded back into the cache by `wake` (or key by key as their data is requested)
+        """
+        lease = self.get_hibernation_lease()
+        if not lease.acquire():
+            return False
+        try:
+            if not self.__is_idle__():
+                return False
+            self.persist_cache_data()
+            kept_keys = [
+                f"session:{self.id}:{key}"
+                for key in [
+                    "user_ids",
+                    "versions:counters",
+                    "executing:fence",
+                    "hibernating",
+                    "hibernating:fence",
+                ]
+            ]
+            keys = [key for key in self.get_cache_keys() if key not in kept_keys]
+            with cache.get_client().pipeline() as pipeline:
+                # Abort if the session changes between the checks below and the removal
+                pipeline.watch(
+                    *[
+                        cache.make_key(f"session:{self.id}:{key}")
+                        for key in ["versions", "user_ids", "executing"]
+                    ]
+                )
+                versions = get_hash_versions(cache, f"session:{self.id}:versions")
+                if versions != cache.get(f"session:{self.id}:persisted_versions", {}):
+                    return False
+                if not self.__is_idle__() or not lease.renew():
+                    return False
+                pipeline.multi()
+                pipeline.sadd(cache.make_key("sessions:hibernated"), self.id)
+                pipeline.delete(*[cache.make_key(key) for key in keys])
+                pipeline.execute()
+        except WatchError:
+            return False
+        finally:
+            lease.release()
+        local_cache.publish_versions(self.id, {})
+        self.__dict__.pop("versions", None)
+        self.__dict__.pop("data", None)
+        return True
+
+    def __is_idle__(self) -> bool:
+        """
+        Checks if this session has no users, is not executing and has not been used within `settings.CACHE_HIBERNATE_AFTER` seconds
+
+        Returns:
+            - Type: bool
+        """
+        if len(self.get_user_ids()) > 0 or self.get_execution_holder() is not None:
+            return False
+        last_active = cache.get_client().zscore(cache.make_key(get_activity_set(self.id)), self.id)
+        return last_active is None or last_active <= time.time() - settings.CACHE_HIBERNATE_AFTER
+
+    def wake(self) -> None:
+        """
+        Loads all of this session's data back into the cache in bulk if it is hibernated and records that it is in use now
+
+        Notes:
+            - Waits (up to `settings.CACHE_BACKUP_LEASE` seconds) for the hibernation lease so a session is never woken while it is being hibernated
+            - The session is always touched (see `touch`) even if hibernation is disabled
+        """
+        if settings.CACHE_HIBERNATE_AFTER is None:
+            self.touch()
+            return
+        lease = self.get_hibernation_lease()
+        deadline = time.time() + settings.CACHE_BACKUP_LEASE
+        while not lease.acquire() and time.time() < deadline:
+            time.sleep(0.05)
+        try:
+            if cache.remove_from_set("sessions:hibernated", [self.id]) > 0:
+                self.warm_cache_data()
+            self.touch()
+        finally:
+            lease.release()
 
     def error_on_session_not_empty(self):
         """
@@ -1540,17 +2996,30 @@ def handle_session_on_delete(sender, instance, **kwargs):
     When a session object is deleted, update the sessions list for the associated session team
     """
     instance.team.update_sessions_list()
+    # Release any blobs referenced by the session (they are deleted if no other session references them)
+    release_blobs(cache, instance.get_blobs())
     # Clear the data from the cache and persistent cache if present
     cache.delete_many(instance.get_cache_keys(), memory=True, persistent=True)
+    local_cache.publish_versions(instance.id, {})
 
 
 @receiver(post_save, sender=TeamUsers, dispatch_uid="update_team_ids_on_save")
 @receiver(post_delete, sender=TeamUsers, dispatch_uid="update_team_ids_on_delete")
 def update_team_ids(sender, instance, **kwargs):
+    previous_team_ids = set(instance.user.team_ids)
     instance.user.team_ids = list(
         TeamUsers.objects.filter(user=instance.user).values_list("team", flat=True)
     )
     instance.user.save(update_fields=["team_ids"])
+    # Update the team channels that the sockets of this user are subscribed to
+    CaveWSBroadcaster(instance.user).update_channels(
+        subscribe=[
+            f"team:{team_id}" for team_id in set(instance.user.team_ids) - previous_team_ids
+        ],
+        unsubscribe=[
+            f"team:{team_id}" for team_id in previous_team_ids - set(instance.user.team_ids)
+        ],
+    )
 
 
 @receiver(post_save, sender=CustomUser, dispatch_uid="create_personal_team_on_creation")
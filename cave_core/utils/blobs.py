@@ -0,0 +1,191 @@
+from django.conf import settings
+from cave_core.utils.serialization import dumps_memory
+import hashlib, json, pickle, uuid
+
+# Lua script to decrement the reference count of a blob and remove it from the cache once it is no longer referenced
+# Note: A negative count means the reference counts were lost (EG: a cache restart) so the blob is kept (leaked) as
+#       other sessions may still reference it
+release_script = """
+local refs = redis.call('decr', KEYS[1])
+if refs <= 0 then
+    redis.call('del', KEYS[1])
+    if refs == 0 then
+        redis.call('del', KEYS[2])
+    end
+end
+return refs
+"""
+# Lua script to move data into blobs and point the data that references them at the blobs in a single step
+# KEYS: The data_ids to set, the reference counts of the new blobs and then (source, blob) pairs to rename
+# ARGV: The timeout in milliseconds (0 for none), the number of data_ids to set, the number of reference counts and
+#       then the serialized values of the data_ids to set
+# Note: Nothing is changed if any source is missing (its key is returned) so readers never see data missing
+promote_script = """
+local count = tonumber(ARGV[2])
+local refs_count = tonumber(ARGV[3])
+for i = count + refs_count + 1, #KEYS, 2 do
+    if redis.call('exists', KEYS[i]) == 0 then
+        return KEYS[i]
+    end
+end
+for i = count + refs_count + 1, #KEYS, 2 do
+    redis.call('rename', KEYS[i], KEYS[i + 1])
+end
+for i = count + 1, count + refs_count do
+    redis.call('set', KEYS[i], 1)
+end
+for i = 1, count do
+    if tonumber(ARGV[1]) > 0 then
+        redis.call('set', KEYS[i], ARGV[i + 3], 'px', ARGV[1])
+    else
+        redis.call('set', KEYS[i], ARGV[i + 3])
+    end
+end
+return 0
+"""
+
+
+def get_blob_hash(data) -> str:
+    """
+    Creates a content hash for a JSON serializable object
+
+    data: any
+        The object to hash
+
+    Returns: str
+        A 32 character hex digest of the object
+
+    Note: Objects that are not JSON serializable are hashed by their pickle
+    """
+    try:
+        serialized = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+    except TypeError:
+        serialized = pickle.dumps(data, protocol=5)
+    return hashlib.sha256(serialized).hexdigest()[:32]
+
+
+def create_blob_name() -> str:
+    """
+    Creates a unique (non content addressed) blob name
+
+    Returns: str
+    """
+    return uuid.uuid4().hex
+
+
+def get_blob_id(blob: str) -> str:
+    """
+    Gets the data_id used to store a blob
+
+    blob: str
+        The blob name (EG: a content hash)
+
+    Returns: str
+    """
+    return f"blob:{blob}"
+
+
+def acquire_blobs(cache, blobs: list) -> set:
+    """
+    Adds a reference to each blob in a list
+
+    cache: Cache
+        The Cache object used to store the reference counts
+    blobs: list
+        The blob names to reference
+        Note: A blob listed more than once is referenced more than once
+
+    Returns: set
+        The blob names that had no references before this call (and need to be stored)
+    """
+    if len(blobs) == 0:
+        return set()
+    pipeline = cache.get_client().pipeline(transaction=False)
+    for blob in blobs:
+        pipeline.incr(cache.make_key(f"{get_blob_id(blob)}:refs"))
+    counts = pipeline.execute()
+    return {blob for blob, count in zip(blobs, counts) if count == 1}
+
+
+def release_blobs(cache, blobs: list) -> None:
+    """
+    Removes a reference to each blob in a list and deletes blobs that are no longer referenced
+
+    cache: Cache
+        The Cache object used to store the reference counts
+    blobs: list
+        The blob names to stop referencing
+    """
+    if len(blobs) == 0:
+        return
+    pipeline = cache.get_client().pipeline(transaction=False)
+    for blob in blobs:
+        blob_id = get_blob_id(blob)
+        pipeline.eval(release_script, 2, cache.make_key(f"{blob_id}:refs"), cache.make_key(blob_id))
+    counts = pipeline.execute()
+    for blob, count in zip(blobs, counts):
+        if count == 0:
+            cache.delete(get_blob_id(blob), persistent=True)
+
+
+def promote_to_blobs(cache, data_ids: list, get_updates) -> dict:
+    """
+    Moves data stored in the cache under other data_ids into new (non content addressed) blobs with one reference each
+
+    cache: Cache
+        The Cache object used to store the blobs
+    data_ids: list
+        The data_ids of the data to move
+    get_updates: callable
+        A function that takes the data_ids that are moved and their new blob names and returns the data_ids and values
+        that point at the blobs (EG: the refs of a session)
+        Note: This may be called more than once so it should not modify its inputs
+
+    Returns: dict
+        The data_ids that were moved and their new blob names
+
+    Notes:
+        - Data is renamed within the cache so it is not copied
+        - The data is moved and the updates are set in a single step so readers never see the data missing
+        - Data missing from the cache (EG: expired or hibernated) is copied from the persistent storage instead
+        - Data missing from both is not moved
+    """
+    blobs = {data_id: create_blob_name() for data_id in data_ids}
+    client = cache.get_client()
+    timeout = int((settings.CACHE_TIMEOUT or 0) * 1000)
+    copied = {}
+    while True:
+        moved = dict(blobs)
+        pipeline = client.pipeline(transaction=False)
+        for data_id in moved.keys():
+            pipeline.exists(cache.make_key(data_id))
+        for (data_id, blob), exists in zip(list(moved.items()), pipeline.execute()):
+            if exists:
+                continue
+            moved.pop(data_id)
+            # The blob is not referenced (or visible to readers) until the updates are set
+            data = cache.get_persistent(data_id)
+            if data is not None:
+                cache.set(get_blob_id(blob), data)
+                copied[data_id] = blob
+            blobs.pop(data_id)
+        promoted = {**moved, **copied}
+        if len(promoted) == 0:
+            return promoted
+        updates = get_updates(promoted)
+        keys = [cache.make_key(data_id) for data_id in updates.keys()]
+        keys += [cache.make_key(f"{get_blob_id(blob)}:refs") for blob in promoted.values()]
+        for data_id, blob in moved.items():
+            keys += [cache.make_key(data_id), cache.make_key(get_blob_id(blob))]
+        missing = client.eval(
+            promote_script,
+            len(keys),
+            *keys,
+            timeout,
+            len(updates),
+            len(promoted),
+            *[dumps_memory(value) for value in updates.values()],
+        )
+        # Retry if any data expired since it was checked (it is copied from the persistent storage instead)
+        if missing == 0:
+            return promoted
@@ -1,15 +1,202 @@
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.base import ContentFile
-from cave_app.storage_backends import CacheStorage
+from django.utils.module_loading import import_string
+import redis
+from cave_core.utils.serialization import (
+    dumps_memory,
+    loads_memory,
+    dumps_persistent,
+    loads_persistent,
+)
 
-import json
+# Lua script to move all values of a set into a (processing) set and return all values in the processing set
+claim_set_script = """
+redis.call('sunionstore', KEYS[2], KEYS[2], KEYS[1])
+redis.call('del', KEYS[1])
+return redis.call('smembers', KEYS[2])
+"""
+# Error messages from cache backends that do not support a (bulk) command
+unsupported_errors = ["crossslot", "unknown command"]
 
 
-class Cache(CacheStorage):
+def is_unsupported_error(e: Exception) -> bool:
+    """
+    Checks if an exception raised by the cache backend shows that a command is not supported
+
+    e: Exception
+        The exception to check
+
+    Returns: bool
+    """
+    message = str(e).lower()
+    return any(error in message for error in unsupported_errors)
+
+
+class Cache(import_string(settings.CACHE_STORAGE_BACKEND)):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.cache = cache
+        self.client = None
+        # Assume that bulk commands (EG: MGET / MSET) are supported until the cache backend shows otherwise
+        self.supports_bulk = True
+
+    def __bulk__(self, bulk_fn, fallback_fn):
+        """
+        Runs a bulk cache operation in a single round trip if the cache backend supports it, otherwise runs a per key fallback
+
+        bulk_fn: callable
+            A function that runs the operation using a bulk cache command (EG: get_many, set_many, delete_many)
+        fallback_fn: callable
+            A function that runs the same operation using a loop over per key cache commands
+
+        Returns: any
+            The output of whichever function was successfully run
+
+        Notes:
+            - Bulk commands are not always supported by cache backends (esp Serverless Caches)
+            - If a bulk command fails because it is unsupported (EG: CROSSSLOT or an unknown command), all future
+              operations on this object use the per key fallback
+            - Any other failure (EG: a timeout) only uses the per key fallback for this operation
+        """
+        if self.supports_bulk:
+            try:
+                return bulk_fn()
+            except Exception as e:
+                if is_unsupported_error(e):
+                    self.supports_bulk = False
+        return fallback_fn()
+
+    def __get_many_memory__(self, data_ids: list):
+        """
+        Gets all of the data that exists in the cache for a list of data_ids
+
+        data_ids: list
+            The data_ids of the data to be retrieved
+
+        Returns: dict
+            A dict of data_ids and their data for each data_id found in the cache
+        """
+        client = self.get_client()
+        keys = [self.make_key(data_id) for data_id in data_ids]
+        values = self.__bulk__(
+            lambda: client.mget(keys),
+            lambda: [client.get(key) for key in keys],
+        )
+        return {
+            data_id: loads_memory(value)
+            for data_id, value in zip(data_ids, values)
+            if value is not None
+        }
+
+    def get_persistent(self, data_id: str, default=None):
+        """
+        Gets the data from the persistent storage if it exists
+
+        data_id: str
+            The data_id of the data to be retrieved
+        default: any
+            The default value to return if the data does not exist in the persistent storage
+            Default: None
+
+        Returns: dict
+        """
+        if settings.CACHE_BACKUP_INTERVAL is not None:
+            try:
+                with self.open(data_id, "rb") as f:
+                    return loads_persistent(f.read())
+            except:
+                pass
+        return default
+
+    def get_client(self):
+        """
+        Gets the raw (redis) client used by the cache backend for commands not supported by the django cache api
+
+        Returns: redis.Redis
+
+        Note: Keys used with this client should be created with `make_key` to share the cache key namespace
+        """
+        if self.client is None:
+            location = settings.CACHES["default"]["LOCATION"]
+            # Like the django redis cache, write to the first server if more than one is configured
+            if isinstance(location, str):
+                location = location.split(",")
+            self.client = redis.Redis.from_url(location[0])
+        return self.client
+
+    def make_key(self, data_id: str) -> str:
+        """
+        Creates the full cache key for a data_id as used by the cache backend
+
+        data_id: str
+            The data_id to create a key for
+
+        Returns: str
+        """
+        return self.cache.make_and_validate_key(data_id)
+
+    def add_to_set(self, data_id: str, values: list):
+        """
+        Adds values to a set in the cache
+
+        data_id: str
+            The data_id of the set
+        values: list
+            The values to add to the set
+        """
+        if len(values) > 0:
+            self.get_client().sadd(self.make_key(data_id), *values)
+
+    def claim_set(self, data_id: str, processing_data_id: str) -> list:
+        """
+        Moves all values in a set into a processing set in a single transaction and returns all values in the processing set
+
+        data_id: str
+            The data_id of the set
+        processing_data_id: str
+            The data_id of the processing set
+
+        Returns: list
+            The values in the processing set as strings
+
+        Notes:
+            - Values claimed by an earlier call that were never removed from the processing set (EG: the process died) are returned again
+            - Use `remove_from_set` on the processing set once each value has been processed
+        """
+        values = self.get_client().eval(
+            claim_set_script, 2, self.make_key(data_id), self.make_key(processing_data_id)
+        )
+        return [value.decode() for value in values]
+
+    def remove_from_set(self, data_id: str, values: list) -> int:
+        """
+        Removes values from a set in the cache
+
+        data_id: str
+            The data_id of the set
+        values: list
+            The values to remove from the set
+
+        Returns: int
+            The number of values that were removed
+        """
+        if len(values) == 0:
+            return 0
+        return self.get_client().srem(self.make_key(data_id), *values)
+
+    def is_in_set(self, data_id: str, value) -> bool:
+        """
+        Checks if a value is in a set in the cache
+
+        data_id: str
+            The data_id of the set
+        value: any
+            The value to check
+
+        Returns: bool
+        """
+        return bool(self.get_client().sismember(self.make_key(data_id), value))
 
     def get(self, data_id: str, default=None):
         """
@@ -26,17 +213,13 @@ class Cache(CacheStorage):
         Returns: dict
         """
         # print(f'Cache -> Getting: {data_id}')
-        data = self.cache.get(data_id, "__NONE__")
+        data = self.get_client().get(self.make_key(data_id))
+        if data is not None:
+            return loads_memory(data)
+        data = self.get_persistent(data_id, "__NONE__")
         if data != "__NONE__":
+            self.set(data_id, data)
             return data
-        if settings.CACHE_BACKUP_INTERVAL is not None:
-            try:
-                with self.open(data_id) as f:
-                    data = json.load(f)
-                self.set(data_id, data)
-                return data
-            except:
-                pass
         return default
 
     def get_many(self, data_ids: list, default=None):
@@ -54,7 +237,20 @@ class Cache(CacheStorage):
         Returns: dict
         """
         # print(f'Cache -> Getting: {data_ids}')
-        return {data_id: self.get(data_id, default) for data_id in data_ids}
+        if len(data_ids) == 0:
+            return {}
+        data = self.__get_many_memory__(data_ids)
+        # Fill in any data missing from the cache from the persistent storage and cache it
+        missing_data = {}
+        for data_id in data_ids:
+            if data_id not in data:
+                value = self.get_persistent(data_id, "__NONE__")
+                if value != "__NONE__":
+                    missing_data[data_id] = value
+        if len(missing_data) > 0:
+            self.set_many(missing_data)
+            data.update(missing_data)
+        return {data_id: data.get(data_id, default) for data_id in data_ids}
 
     def set(
         self,
@@ -71,7 +267,7 @@ class Cache(CacheStorage):
             The data_id of the data to be stored
         data: dict
             The data to be stored
-            Note: Must be JSON serializable
+            Note: Must be serializable by `settings.CACHE_SERIALIZER` and `settings.CACHE_PERSISTENT_SERIALIZER`
         memory: bool
             Whether to store the data in the cache
             Default: True
@@ -84,9 +280,30 @@ class Cache(CacheStorage):
             Note: If None, the cache will not expire
         """
         if memory:
-            self.cache.set(data_id, data, timeout=timeout)
+            # Write the serialized bytes directly so they are not serialized again by the django cache
+            self.get_client().set(self.make_key(data_id), dumps_memory(data), ex=timeout)
         if persistent:
-            self.save(data_id, ContentFile(json.dumps(data)))
+            self.save_serialized(data_id, dumps_persistent(data))
+
+    def add(self, data_id: str, data: dict, timeout: [int | None] = settings.CACHE_TIMEOUT) -> bool:
+        """
+        Sets the data in the cache only if the data_id does not already exist in the cache
+
+        data_id: str
+            The data_id of the data to be stored
+        data: dict
+            The data to be stored
+        timeout: int
+            The timeout to use for the cache
+            Default: settings.CACHE_TIMEOUT
+            Note: If None, the cache will not expire
+
+        Returns: bool
+            True if the data was stored
+        """
+        return bool(
+            self.get_client().set(self.make_key(data_id), dumps_memory(data), nx=True, ex=timeout)
+        )
 
     def set_many(
         self,
@@ -113,10 +330,17 @@ class Cache(CacheStorage):
             Note: If None, the cache will not expire
         """
         # print(f'Cache -> Setting: {data.keys()}')
-        # Note: This uses a loop instead of self.cache.set_many() because the latter
-        #       is not always supported by cache backends (esp Serverless Caches)
-        for data_id, data in data.items():
-            self.set(data_id, data, memory=memory, persistent=persistent, timeout=timeout)
+        if len(data) == 0:
+            return
+        if memory:
+            # Pipeline the (single key) sets so they are sent in one round trip
+            pipeline = self.get_client().pipeline(transaction=False)
+            for data_id, value in data.items():
+                pipeline.set(self.make_key(data_id), dumps_memory(value), ex=timeout)
+            pipeline.execute()
+        if persistent:
+            for data_id, value in data.items():
+                self.set(data_id, value, memory=False, persistent=True)
 
     def persist(self, data_id: str):
         """
@@ -125,9 +349,9 @@ class Cache(CacheStorage):
         data_id: str
             The data_id of the data to be persisted
         """
-        data = self.cache.get(data_id, "__NONE__")
-        if data != "__NONE__":
-            self.set(data_id, data, memory=False, persistent=True)
+        data = self.get_client().get(self.make_key(data_id))
+        if data is not None:
+            self.set(data_id, loads_memory(data), memory=False, persistent=True)
 
     def persist_many(self, data_ids: list):
         """
@@ -136,8 +360,58 @@ class Cache(CacheStorage):
         data_ids: list
             The data_ids of the data to be persisted
         """
+        for data_id, data in self.dumps_many_persistent(data_ids).items():
+            self.save_serialized(data_id, data)
+
+    def warm(self, data_ids: list, timeout: [int | None] = settings.CACHE_TIMEOUT) -> list:
+        """
+        Loads data from the persistent storage into the cache without overwriting any data already in the cache
+
+        data_ids: list
+            The data_ids of the data to be loaded
+        timeout: int
+            The timeout to use for the cache
+            Default: settings.CACHE_TIMEOUT
+            Note: If None, the cache will not expire
+
+        Returns: list
+            The data_ids that were loaded into the cache
+        """
+        warmed = []
         for data_id in data_ids:
-            self.persist(data_id)
+            data = self.get_persistent(data_id, "__NONE__")
+            # Use add so that data written to the cache since the persistent copy was taken is never clobbered
+            if data != "__NONE__" and self.add(data_id, data, timeout=timeout):
+                warmed.append(data_id)
+        return warmed
+
+    def dumps_many_persistent(self, data_ids: list) -> dict:
+        """
+        Gets data from the cache and serializes it for the persistent storage
+
+        data_ids: list
+            The data_ids of the data to be serialized
+
+        Returns: dict
+            A dict of data_ids and their serialized data for each data_id found in the cache
+        """
+        if len(data_ids) == 0:
+            return {}
+        return {
+            data_id: dumps_persistent(value)
+            for data_id, value in self.__get_many_memory__(data_ids).items()
+        }
+
+    def save_serialized(self, data_id: str, data: bytes):
+        """
+        Saves data already serialized by `dumps_persistent` to the persistent storage
+
+        data_id: str
+            The data_id of the data to be stored
+        data: bytes
+            The serialized data
+        """
+        self.save(data_id, ContentFile(data))
 
     def delete(self, data_id: str, memory: bool = False, persistent: bool = False):
         """
@@ -155,7 +429,7 @@ class Cache(CacheStorage):
         # print(f'Cache -> Deleting: {data_id}')
         assert memory or persistent, "Cache.delete(): `memory` or `persistent` must be True"
         if memory:
-            self.cache.delete(data_id)
+            self.get_client().delete(self.make_key(data_id))
         if persistent:
             try:
                 super().delete(data_id)
@@ -177,10 +451,18 @@ class Cache(CacheStorage):
         """
         # print(f'Cache -> Deleting: {data_ids}')
         assert memory or persistent, "Cache.delete_many(): `memory` or `persistent` must be True"
-        # Note: This uses a loop instead of self.cache.delete_many() because the latter
-        #       is not always supported by cache backends (esp Serverless Caches)
-        for data_id in data_ids:
-            self.delete(data_id, memory=memory, persistent=persistent)
+        if len(data_ids) == 0:
+            return
+        if memory:
+            client = self.get_client()
+            keys = [self.make_key(data_id) for data_id in data_ids]
+            self.__bulk__(
+                lambda: client.delete(*keys),
+                lambda: [client.delete(key) for key in keys],
+            )
+        if persistent:
+            for data_id in data_ids:
+                self.delete(data_id, persistent=True)
 
     def flush(self, memory: bool = False, persistent: bool = False):
         """
@@ -197,5 +479,4 @@ class Cache(CacheStorage):
         if memory:
             self.cache.clear()
         if persistent:
-            files = self.listdir("")[1]
-            self.delete_many(files, persistent=True)
+            self.clear()
@@ -0,0 +1,107 @@
+from django.conf import settings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import time
+
+
+def get_last_active(cache) -> dict:
+    """
+    Gets the time each session was last used as a timestamp by session id
+
+    cache: Cache
+        The Cache object used to get the activity times
+
+    Returns: dict
+
+    Notes:
+        - Uses the activity sorted sets (`sessions:active:{shard}`) in the cache
+        - If a shard's activity set is not in the cache (EG: after a cache restart), its last persisted copy is used instead
+    """
+    client = cache.get_client()
+    last_active = {}
+    for shard in range(settings.CACHE_BACKUP_SHARDS):
+        activity = {
+            int(session_id): score
+            for session_id, score in client.zrange(
+                cache.make_key(f"sessions:active:{shard}"), 0, -1, withscores=True
+            )
+        }
+        if len(activity) == 0:
+            activity = {
+                int(session_id): score
+                for session_id, score in cache.get_persistent(
+                    f"sessions:active:{shard}", {}
+                ).items()
+            }
+        last_active.update(activity)
+    return last_active
+
+
+def get_hibernated(cache) -> set:
+    """
+    Gets the ids of all hibernated sessions
+
+    cache: Cache
+        The Cache object used to get the hibernated sessions
+
+    Returns: set
+
+    Note: Always empty if hibernation is disabled (`settings.CACHE_HIBERNATE_AFTER` is not set)
+    """
+    if settings.CACHE_HIBERNATE_AFTER is None:
+        return set()
+    return {
+        int(session_id)
+        for session_id in cache.get_client().smembers(cache.make_key("sessions:hibernated"))
+    }
+
+
+def warm_cache(Sessions, cache, threads: int = 4, log=print) -> dict:
+    """
+    Loads all persisted session data into the cache, most recently used sessions first
+
+    Sessions: Sessions
+        The Sessions object to be used for the cache
+    cache: Cache
+        The Cache object used to load the data
+    threads: int
+        The number of sessions to load in parallel
+        Default: 4
+    log: callable
+        The function used to report progress
+        Default: print
+
+    Returns: dict
+        Stats for the warm up (warmed, skipped, failed, duration)
+
+    Notes:
+        - Data already in the cache is never overwritten so this is safe to run while serving traffic
+        - Sessions are ordered by when they were last used (see `get_last_active`)
+        - Hibernated sessions are skipped as they are loaded when they are next used (see `Sessions.wake`)
+    """
+    start = time.time()
+    hibernated = get_hibernated(cache)
+    all_sessions = list(Sessions.objects.all())
+    sessions = [obj for obj in all_sessions if obj.id not in hibernated]
+    last_active = get_last_active(cache)
+    sessions.sort(key=lambda obj: last_active.get(obj.id, 0), reverse=True)
+    stats = {"warmed": 0, "skipped": len(all_sessions) - len(sessions), "failed": 0}
+    if stats["skipped"] > 0:
+        log(f"Cache Warm Up: Skipping {stats['skipped']} hibernated sessions")
+    log(f"Cache Warm Up: Loading {len(sessions)} sessions with {threads} threads...")
+    # Report progress roughly every 10%
+    report_every = max(len(sessions) // 10, 1)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        futures = {executor.submit(obj.warm_cache_data): obj for obj in sessions}
+        for idx, future in enumerate(as_completed(futures), start=1):
+            try:
+                stats["warmed" if future.result() else "skipped"] += 1
+            except Exception as e:
+                log(f"Error: Unable to warm session {futures[future].id}: {e}")
+                stats["failed"] += 1
+            if idx % report_every == 0 or idx == len(sessions):
+                log(f"Cache Warm Up: {idx}/{len(sessions)} sessions processed")
+    stats["duration"] = round(time.time() - start, 3)
+    log(
+        f"Cache Warm Up: Warmed {stats['warmed']} sessions in {stats['duration']}s with {stats['skipped']} skipped and {stats['failed']} failed"
+    )
+    return stats
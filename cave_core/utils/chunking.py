@@ -0,0 +1,82 @@
+from django.conf import settings
+import hashlib
+
+
+def get_chunk_path(data_name: str) -> list | None:
+    """
+    Gets the path (inside of a top level key) at which the top level key is split into chunks
+
+    data_name: str
+        The top level key
+
+    Returns: list | None
+        The path or None if the top level key is not chunked
+
+    Note: Chunked paths are configured with `settings.CACHE_CHUNKED_PATHS`
+    """
+    return settings.CACHE_CHUNKED_PATHS.get(data_name)
+
+
+def get_chunk_id(session_id, data_name: str, chunk_name: str) -> str:
+    """
+    Gets the data_id used to store a chunk in the cache
+
+    session_id: int
+        The id of the session
+    data_name: str
+        The top level key that the chunk belongs to
+    chunk_name: str
+        The name of the chunk (the key at the chunked path)
+
+    Returns: str
+
+    Note: Chunk names are hashed as they are user data and may not be valid cache keys or file names
+    """
+    chunk_hash = hashlib.sha256(str(chunk_name).encode()).hexdigest()[:16]
+    return f"session:{session_id}:chunk:{data_name}:{chunk_hash}"
+
+
+def split(value, path: list):
+    """
+    Splits a value into a skeleton and the chunks at a path
+
+    value: any
+        The value to split
+    path: list
+        The path at which to split the value
+
+    Returns: tuple(any, dict) | None
+        The skeleton (the value with an empty dict at the path) and the chunks (the dict at the path)
+        None if there is no dict at the path
+
+    Note: The value passed in is not modified
+    """
+    if len(path) == 0:
+        return ({}, value) if isinstance(value, dict) else None
+    if not isinstance(value, dict) or path[0] not in value:
+        return None
+    output = split(value[path[0]], path[1:])
+    if output is None:
+        return None
+    return {**value, path[0]: output[0]}, output[1]
+
+
+def join(skeleton, path: list, chunks: dict):
+    """
+    Joins a skeleton and its chunks created by `split` back together
+
+    skeleton: any
+        The skeleton
+    path: list
+        The path at which the value was split
+    chunks: dict
+        The chunks to place at the path
+
+    Returns: any
+        The joined value
+
+    Note: The skeleton passed in is not modified
+    """
+    if len(path) == 0:
+        return chunks
+    return {**skeleton, path[0]: join(skeleton.get(path[0], {}), path[1:], chunks)}
@@ -0,0 +1,119 @@
+import json, threading
+
+# Lua script to store a value in a coalescing buffer and open a coalescing window if one is not already open
+# KEYS: The values (a hash by position), the window and the paths of the values (a list in arrival order)
+# ARGV: The path (a JSON list), the value and the window in milliseconds
+# Note: A value replaces the latest value at the same path unless a value at an overlapping path arrived after it
+coalesce_script = """
+local path = cjson.decode(ARGV[1])
+local paths = redis.call('lrange', KEYS[3], 0, -1)
+local position = nil
+for i = #paths, 1, -1 do
+    if paths[i] == ARGV[1] then
+        position = i
+        break
+    end
+    local other = cjson.decode(paths[i])
+    local overlaps = true
+    for j = 1, math.min(#path, #other) do
+        if path[j] ~= other[j] then
+            overlaps = false
+            break
+        end
+    end
+    if overlaps then
+        break
+    end
+end
+if position == nil then
+    position = redis.call('rpush', KEYS[3], ARGV[1])
+end
+redis.call('hset', KEYS[1], position, ARGV[2])
+if redis.call('set', KEYS[2], '1', 'NX', 'PX', ARGV[3]) then
+    return 1
+end
+return 0
+"""
+# Lua script to take all coalesced values (in arrival order) and close the coalescing window
+take_script = """
+local values = {}
+for i = 1, redis.call('llen', KEYS[3]) do
+    values[i] = redis.call('hget', KEYS[1], i)
+end
+redis.call('del', KEYS[1], KEYS[2], KEYS[3])
+return values
+"""
+
+
+def __get_ids__(cache, data_id: str) -> list:
+    """
+    Gets the cache keys of the values, window and paths of a coalescing buffer
+    """
+    return [
+        cache.make_key(data_id),
+        cache.make_key(f"{data_id}:window"),
+        cache.make_key(f"{data_id}:paths"),
+    ]
+
+
+def coalesce(cache, data_id: str, path: list, value: dict, window: int) -> bool:
+    """
+    Stores a value in a coalescing buffer replacing any value already stored for the same path
+
+    cache: Cache
+        The Cache object used to store the buffer
+    data_id: str
+        The data_id of the buffer
+    path: list
+        The JSON serializable path to coalesce values by (only the latest value for each path is kept)
+        Note: A value is stored separately if a value at an overlapping path (EG: a parent path) arrived after the value it would replace
+    value: dict
+        The JSON serializable value to store
+    window: int
+        The coalescing window in milliseconds
+
+    Returns: bool
+        True if this value opened a new window and the caller should `schedule` a call to `take_coalesced`
+        Note: If the process that opened a window dies, the next value stored after the window expires opens a new window
+    """
+    return bool(
+        cache.get_client().eval(
+            coalesce_script,
+            3,
+            *__get_ids__(cache, data_id),
+            json.dumps(path),
+            json.dumps(value),
+            window,
+        )
+    )
+
+
+def take_coalesced(cache, data_id: str) -> list:
+    """
+    Removes and returns all values in a coalescing buffer and closes its window
+
+    cache: Cache
+        The Cache object used to store the buffer
+    data_id: str
+        The data_id of the buffer
+
+    Returns: list
+        The latest value for each path in the order the first value for that path arrived
+        Note: Applying the values in this order has the same result as applying every value in the order they arrived
+    """
+    values = cache.get_client().eval(take_script, 3, *__get_ids__(cache, data_id))
+    return [json.loads(value) for value in values]
+
+
+def schedule(fn, delay: float) -> None:
+    """
+    Calls a function once after a delay in a background (daemon) thread
+
+    fn: callable
+        The function to call (with no arguments)
+    delay: float
+        The delay in seconds
+    """
+    timer = threading.Timer(delay, fn)
+    timer.daemon = True
+    timer.start()
@@ -0,0 +1,102 @@
+import json, uuid
+
+# Lua script to append a command to a queue (optionally replacing any queued command with the same name)
+# Note: A replaced command is moved to the end of the queue so it still runs after any commands queued before it
+enqueue_script = """
+if ARGV[3] == '1' then
+    redis.call('lrem', KEYS[1], 0, ARGV[1])
+end
+redis.call('rpush', KEYS[1], ARGV[1])
+redis.call('hset', KEYS[2], ARGV[1], ARGV[2])
+return redis.call('llen', KEYS[1])
+"""
+# Lua script to pop the next command from a queue
+dequeue_script = """
+local entry = redis.call('lpop', KEYS[1])
+if not entry then
+    return false
+end
+local command = redis.call('hget', KEYS[2], entry)
+redis.call('hdel', KEYS[2], entry)
+return command
+"""
+
+
+def get_queue_ids(session_id) -> tuple:
+    """
+    Gets the data_ids used to store the command queue of a session
+
+    session_id: int
+        The id of the session
+
+    Returns: tuple(str, str)
+        The data_id of the queue (a list of entries) and of the queued commands (a hash by entry)
+    """
+    return f"session:{session_id}:commands", f"session:{session_id}:commands:data"
+
+
+def enqueue_command(cache, session_id, command: dict, coalescing: str = "none") -> int:
+    """
+    Adds a command to the end of the command queue of a session
+
+    cache: Cache
+        The Cache object used to store the queue
+    session_id: int
+        The id of the session
+    command: dict
+        The JSON serializable command to queue
+        Note: Must include a `command` key with the command name
+    coalescing: str
+        The rule used to coalesce queued commands
+        Default: "none"
+        Options:
+            - "none": Every command is run in order
+            - "latest": Only the latest queued command with each command name is run
+
+    Returns: int
+        The number of commands in the queue
+    """
+    coalesce = coalescing == "latest"
+    entry = f"command:{command['command']}" if coalesce else uuid.uuid4().hex
+    return cache.get_client().eval(
+        enqueue_script,
+        2,
+        *[cache.make_key(data_id) for data_id in get_queue_ids(session_id)],
+        entry,
+        json.dumps(command),
+        "1" if coalesce else "0",
+    )
+
+
+def dequeue_command(cache, session_id) -> dict | None:
+    """
+    Removes and returns the next command in the command queue of a session
+
+    cache: Cache
+        The Cache object used to store the queue
+    session_id: int
+        The id of the session
+
+    Returns: dict | None
+        The next command or None if the queue is empty
+    """
+    command = cache.get_client().eval(
+        dequeue_script,
+        2,
+        *[cache.make_key(data_id) for data_id in get_queue_ids(session_id)],
+    )
+    return json.loads(command) if command else None
+
+
+def get_queue_length(cache, session_id) -> int:
+    """
+    Gets the number of commands in the command queue of a session
+
+    cache: Cache
+        The Cache object used to store the queue
+    session_id: int
+        The id of the session
+
+    Returns: int
+    """
+    return cache.get_client().llen(cache.make_key(get_queue_ids(session_id)[0]))
@@ -0,0 +1,63 @@
+from django.conf import settings
+import bz2, lzma, zlib
+
+# Available compression algorithms and the header byte used to identify data compressed by each
+compressors = {
+    "zlib": {
+        "header": b"\x01",
+        # Use the fastest compression level as large session data is compressed on every write
+        "compress": lambda data: zlib.compress(data, 1),
+        "decompress": zlib.decompress,
+    },
+    "bz2": {
+        "header": b"\x02",
+        "compress": bz2.compress,
+        "decompress": bz2.decompress,
+    },
+    "lzma": {
+        "header": b"\x03",
+        "compress": lzma.compress,
+        "decompress": lzma.decompress,
+    },
+}
+decompressors = {value["header"]: value["decompress"] for value in compressors.values()}
+# Header byte used to mark uncompressed data
+uncompressed_header = b"\x00"
+
+
+def compress(data: bytes) -> bytes:
+    """
+    Compresses serialized data with the `settings.CACHE_COMPRESSION` algorithm if it is at least `settings.CACHE_COMPRESSION_THRESHOLD` bytes long
+
+    data: bytes
+        The serialized data to compress
+        Note: The threshold is checked against these bytes so no extra serialization is needed to measure them
+
+    Returns: bytes
+        A header byte (naming the compression algorithm or `uncompressed_header`) followed by the (compressed) data
+    """
+    compressor = compressors.get(settings.CACHE_COMPRESSION)
+    if compressor is None or len(data) < settings.CACHE_COMPRESSION_THRESHOLD:
+        return uncompressed_header + data
+    return compressor["header"] + compressor["compress"](data)
+
+
+def decompress(data: bytes) -> bytes:
+    """
+    Decompresses data created by `compress`
+
+    data: bytes
+        The data to decompress
+
+    Returns: bytes
+        The original serialized data
+    """
+    header = data[:1]
+    if header == uncompressed_header:
+        return data[1:]
+    decompressor = decompressors.get(header)
+    if decompressor is None:
+        raise ValueError(
+            f"Unable to decompress data with an unknown compression header ({header})."
+        )
+    return decompressor(data[1:])
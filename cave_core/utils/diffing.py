@@ -0,0 +1,64 @@
+class TooManyOps(Exception):
+    pass
+
+
+class TooLarge(Exception):
+    pass
+
+
+def __diff__(old, new, path: list, ops: list, max_ops: int, budget: list) -> None:
+    """
+    Appends the operations needed to turn `old` into `new` at `path` to `ops`
+    """
+    budget[0] -= 1
+    if budget[0] < 0:
+        raise TooLarge()
+    if type(old) is dict and type(new) is dict:
+        for key in old.keys():
+            if key not in new:
+                ops.append({"op": "remove", "path": path + [key]})
+        for key, value in new.items():
+            if key not in old:
+                ops.append({"op": "add", "path": path + [key], "value": value})
+            else:
+                __diff__(old[key], value, path + [key], ops, max_ops, budget)
+    elif type(old) is list and type(new) is list and len(old) == len(new):
+        for idx, (old_value, new_value) in enumerate(zip(old, new)):
+            __diff__(old_value, new_value, path + [idx], ops, max_ops, budget)
+    elif type(old) is not type(new) or old != new:
+        ops.append({"op": "replace", "path": path, "value": new})
+    if len(ops) > max_ops:
+        raise TooManyOps()
+
+
+def diff(old, new, max_ops: int = 1000, max_size: int | None = None) -> list | None:
+    """
+    Creates a structural (JSON Patch like) diff between two JSON serializable objects
+
+    old: any
+        The previous object
+    new: any
+        The new object
+    max_ops: int
+        The maximum number of operations to create
+        Default: 1000
+    max_size: int | None
+        The maximum number of values (including nested dict and list values) to compare
+        Default: None
+        Note: If None, the size is not limited
+
+    Returns: list | None
+        A list of operations that turn `old` into `new` or None if more than `max_ops` operations are needed or more than `max_size` values would be compared
+
+    Notes:
+        - Each operation is a dict with an `op` (add, remove or replace), a `path` (list of keys / indexes) and a `value` (except for remove)
+        - Lists that change length are replaced in full
+        - An empty `path` replaces the entire object
+        - Comparing stops as soon as either limit is exceeded so the cost of diffing large objects is bounded
+    """
+    ops = []
+    try:
+        __diff__(old, new, [], ops, max_ops, [float("inf") if max_size is None else max_size])
+    except (TooManyOps, TooLarge):
+        return None
+    return ops
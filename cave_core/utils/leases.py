@@ -0,0 +1,152 @@
+import os, socket, threading, uuid
+
+# Lua scripts to only renew / release a lease if it is still held by the same owner
+renew_script = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+release_script = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def get_worker_id() -> str:
+    """
+    Creates a unique id for the current worker process
+
+    Returns: str
+        A worker id in the format `{hostname}:{pid}:{random}`
+    """
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease:
+    def __init__(self, cache, name: str, owner: str, ttl: float):
+        """
+        A distributed lease lock stored in the cache that expires automatically if it is not renewed
+
+        cache: Cache
+            The Cache object used to store the lease
+        name: str
+            The name (data_id) of the lease
+        owner: str
+            An id for the owner of this lease (used for diagnostics)
+        ttl: float
+            The time in seconds after which the lease expires if it is not renewed
+
+        Notes:
+            - Each acquisition is given a fencing token that is strictly greater than all previous tokens for this lease
+            - Renewals and releases only succeed while the lease is still held with the same token
+            - Work protected by the lease should call `renew` right before each write so writes by a stale holder are rejected
+            - The fencing counter is stored at `{name}:fence` and should be deleted with the data the lease protects
+        """
+        self.cache = cache
+        self.name = name
+        self.owner = owner
+        self.ttl = ttl
+        self.token = None
+        self.value = None
+        self.heartbeat = None
+
+    @property
+    def ttl_ms(self) -> int:
+        return int(self.ttl * 1000)
+
+    @property
+    def is_held(self) -> bool:
+        return self.value is not None
+
+    def acquire(self) -> bool:
+        """
+        Attempts to acquire the lease
+
+        Returns: bool
+            True if the lease was acquired by this object
+        """
+        client = self.cache.get_client()
+        token = client.incr(self.cache.make_key(f"{self.name}:fence"))
+        value = f"{self.owner}:{token}"
+        if client.set(self.cache.make_key(self.name), value, nx=True, px=self.ttl_ms):
+            self.token, self.value = token, value
+            return True
+        return False
+
+    def renew(self) -> bool:
+        """
+        Extends the lease by `ttl` seconds if it is still held by this object
+
+        Returns: bool
+            True if the lease is still held by this object
+
+        Note: This should be called before any work protected by the lease to fence out stale holders
+        """
+        if self.value is None:
+            return False
+        renewed = self.cache.get_client().eval(
+            renew_script, 1, self.cache.make_key(self.name), self.value, self.ttl_ms
+        )
+        if not renewed:
+            self.token, self.value = None, None
+        return bool(renewed)
+
+    def release(self) -> None:
+        """
+        Releases the lease if it is still held by this object
+        """
+        self.stop_heartbeat()
+        if self.value is None:
+            return
+        self.cache.get_client().eval(release_script, 1, self.cache.make_key(self.name), self.value)
+        self.token, self.value = None, None
+
+    def start_heartbeat(self, interval: float | None = None) -> None:
+        """
+        Starts a background (daemon) thread that renews the lease until it is stopped or lost
+
+        interval: float | None
+            The time in seconds between renewals
+            Default: None
+            Note: If None, the lease is renewed every third of its `ttl`
+
+        Note: The lease expires `ttl` seconds after the process holding it dies as the heartbeat stops with it
+        """
+        if self.heartbeat is not None or self.value is None:
+            return
+        interval = self.ttl / 3 if interval is None else interval
+        stopped = threading.Event()
+
+        def beat():
+            while not stopped.wait(interval):
+                try:
+                    if not self.renew():
+                        print(f"Lease Warning: The lease `{self.name}` was lost by `{self.owner}`")
+                        return
+                except Exception as e:
+                    # Keep beating through cache errors as the lease may still be held
+                    print(f"Lease Error: Unable to renew the lease `{self.name}`: {e}")
+
+        self.heartbeat = stopped
+        threading.Thread(target=beat, daemon=True).start()
+
+    def stop_heartbeat(self) -> None:
+        """
+        Stops the heartbeat thread (if running) without releasing the lease
+        """
+        if self.heartbeat is not None:
+            self.heartbeat.set()
+            self.heartbeat = None
+
+    def get_holder(self) -> str | None:
+        """
+        Gets the current holder of the lease (by any object)
+
+        Returns: str | None
+            The holder in the format `{owner}:{token}` or None if the lease is not held
+        """
+        value = self.cache.get_client().get(self.cache.make_key(self.name))
+        return value.decode() if value is not None else None
@@ -0,0 +1,175 @@
+from collections import OrderedDict
+import json, pickle, threading, time
+
+
+def __copy_data__(data):
+    """
+    Copies the containers (dicts and lists) of JSON like data so the copy is safe to mutate
+
+    Note: Other values are treated as immutable and are shared with the original
+    """
+    if isinstance(data, dict):
+        return {key: __copy_data__(value) for key, value in data.items()}
+    if isinstance(data, list):
+        return [__copy_data__(value) for value in data]
+    return data
+
+
+class LocalCache:
+    def __init__(self, cache, max_size: int = 0, channel: str = "cave:local_cache:versions"):
+        """
+        A bounded in process LRU cache for session data that sits in front of the cache
+
+        Entries are stored by cache key and version so that a stale entry is never served.
+        Version changes are published through Redis pub/sub so every process drops its stale entries.
+
+        cache: Cache
+            The cache whose raw client is used to publish and listen for version changes
+        max_size: int
+            The maximum total size (in bytes, measured as pickled data) of data stored in this process
+            Default: 0
+            Note: If 0, the local cache is disabled
+        channel: str
+            The pub/sub channel used to share version changes between processes
+            Default: "cave:local_cache:versions"
+
+        Note: Data is stored deserialized and copied on each read and write (see `__copy_data__`)
+        """
+        self.cache = cache
+        self.max_size = max_size
+        self.channel = channel
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.listener = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, data_id: str, version, default=None):
+        """
+        Gets data from the local cache if it exists at the given version
+
+        data_id: str
+            The cache key of the data to be retrieved
+        version: any
+            The current version of the data
+        default: any
+            The default value to return if the data does not exist at the given version
+            Default: None
+
+        Returns: any
+            A new copy of the stored data (safe to mutate) or the default
+        """
+        if not self.enabled or version is None:
+            return default
+        self.__ensure_listener__()
+        with self.lock:
+            entry = self.entries.get(data_id)
+            if entry is None or entry[0] != version:
+                return default
+            self.entries.move_to_end(data_id)
+        return __copy_data__(entry[1])
+
+    def set(self, data_id: str, version, data) -> None:
+        """
+        Stores data in the local cache at a given version evicting the least recently used data if needed
+
+        data_id: str
+            The cache key of the data to be stored
+        version: any
+            The current version of the data
+        data: any
+            The data to be stored
+        """
+        if not self.enabled or version is None:
+            return
+        self.__ensure_listener__()
+        size = len(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_size:
+            return
+        data = __copy_data__(data)
+        with self.lock:
+            self.__pop__(data_id)
+            self.entries[data_id] = (version, data, size)
+            self.size += size
+            while self.size > self.max_size:
+                self.__pop__(next(iter(self.entries)))
+
+    def invalidate(self, session_id, versions: dict) -> None:
+        """
+        Removes all data for a session from the local cache that does not match a set of versions
+
+        session_id: int
+            The id of the session
+        versions: dict
+            The current versions for the session
+            Note: Data for keys that are not in this dict are removed
+        """
+        prefix = f"session:{session_id}:data:"
+        with self.lock:
+            for data_id in [i for i in self.entries if i.startswith(prefix)]:
+                if versions.get(data_id[len(prefix) :]) != self.entries[data_id][0]:
+                    self.__pop__(data_id)
+
+    def publish_versions(self, session_id, versions: dict) -> None:
+        """
+        Invalidates stale session data in this process and publishes the new versions to all other processes
+
+        session_id: int
+            The id of the session
+        versions: dict
+            The current versions for the session
+        """
+        if not self.enabled:
+            return
+        self.invalidate(session_id, versions)
+        self.cache.get_client().publish(
+            self.channel, json.dumps({"session_id": session_id, "versions": versions})
+        )
+
+    def clear(self) -> None:
+        """
+        Removes all data from the local cache
+        """
+        with self.lock:
+            self.entries = OrderedDict()
+            self.size = 0
+
+    def __pop__(self, data_id: str) -> None:
+        """
+        Removes a single entry from the local cache
+
+        Note: This should only be called within the lock
+        """
+        entry = self.entries.pop(data_id, None)
+        if entry is not None:
+            self.size -= entry[2]
+
+    def __ensure_listener__(self) -> None:
+        if self.listener is None:
+            self.listener = threading.Thread(target=self.__listener_task__, daemon=True)
+            self.listener.start()
+
+    def __listener_task__(self) -> None:
+        """
+        Listens for version changes published by any process and invalidates stale data
+
+        Notes:
+            - This function is designed to be run in a separate thread
+            - Any invalidations missed while disconnected are unknown so the local cache is cleared on each (re)connect
+        """
+        while True:
+            try:
+                pubsub = self.cache.get_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.clear()
+                for message in pubsub.listen():
+                    data = json.loads(message["data"])
+                    self.invalidate(data["session_id"], data["versions"])
+            except Exception as e:
+                print("Error: The local cache listener failed with the following error:")
+                print(e)
+                self.clear()
+                time.sleep(1)
@@ -0,0 +1,204 @@
+from django.conf import settings
+from cave_core.utils.compression import compress, decompress
+import json, pickle
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Header used to identify versioned serialized data
+# Format: MAGIC (4 bytes) + FORMAT_VERSION (1 byte) + serializer id (1 byte) + compression header (1 byte) + payload
+# Note: MAGIC can not be the start of a JSON document or a pickle so legacy (unversioned) data is still readable
+MAGIC = b"CAVE"
+FORMAT_VERSION = 1
+HEADER_LENGTH = len(MAGIC) + 2
+
+
+def __msgpack_dumps__(data):
+    if msgpack is None:
+        raise ImportError(
+            "The `msgpack` serializer requires the `msgpack` package to be installed."
+        )
+    return msgpack.packb(data)
+
+
+def __msgpack_loads__(data):
+    if msgpack is None:
+        raise ImportError(
+            "The `msgpack` serializer requires the `msgpack` package to be installed."
+        )
+    return msgpack.unpackb(data, strict_map_key=False)
+
+
+# Available serializers and the id byte used to identify data serialized by each
+serializers = {
+    "json": {
+        "id": b"j",
+        "dumps": lambda data: json.dumps(data).encode(),
+        "loads": json.loads,
+    },
+    "pickle": {
+        "id": b"p",
+        "dumps": lambda data: pickle.dumps(data, protocol=5),
+        "loads": pickle.loads,
+    },
+    "msgpack": {
+        "id": b"m",
+        "dumps": __msgpack_dumps__,
+        "loads": __msgpack_loads__,
+    },
+}
+serializer_ids = {value["id"]: name for name, value in serializers.items()}
+
+
+def is_versioned(data) -> bool:
+    """
+    Checks if an object is data created by `dumps`
+
+    data: any
+        The object to check
+
+    Returns: bool
+    """
+    return isinstance(data, bytes) and data[: len(MAGIC)] == MAGIC
+
+
+def get_serializer_name(data: bytes) -> str | None:
+    """
+    Gets the name of the serializer used to create data created by `dumps`
+
+    data: bytes
+        The serialized data
+
+    Returns: str | None
+        The serializer name or None if the data is not versioned
+    """
+    if not is_versioned(data):
+        return None
+    return serializer_ids.get(data[len(MAGIC) + 1 : HEADER_LENGTH])
+
+
+def is_current_format(data, serializer: str) -> bool:
+    """
+    Checks if data was created by `dumps` with the current format version and a specific serializer
+
+    data: any
+        The object to check
+    serializer: str
+        The name of the serializer to check for
+
+    Returns: bool
+    """
+    return (
+        is_versioned(data)
+        and data[len(MAGIC)] == FORMAT_VERSION
+        and get_serializer_name(data) == serializer
+    )
+
+
+def dumps(data, serializer: str) -> bytes:
+    """
+    Serializes and (if large enough) compresses an object into the current versioned format
+
+    data: any
+        The object to serialize
+    serializer: str
+        The name of the serializer to use
+        Accepted Values: "json", "pickle", "msgpack"
+
+    Returns: bytes
+    """
+    serializer_obj = serializers.get(serializer)
+    if serializer_obj is None:
+        raise ValueError(
+            f"Invalid serializer ('{serializer}'). Allowed serializers include: {list(serializers)}"
+        )
+    header = MAGIC + bytes([FORMAT_VERSION]) + serializer_obj["id"]
+    return header + compress(serializer_obj["dumps"](data))
+
+
+def loads(data: bytes, legacy_loads=json.loads):
+    """
+    Deserializes data created by `dumps` or by any legacy (unversioned) format
+
+    data: bytes
+        The serialized data
+    legacy_loads: callable
+        The function used to deserialize legacy (unversioned) data
+        Default: json.loads
+
+    Returns: any
+    """
+    if not is_versioned(data):
+        return legacy_loads(data)
+    version = data[len(MAGIC)]
+    if version > FORMAT_VERSION:
+        raise ValueError(
+            f"Unable to read serialized data with format version {version}. The latest supported version is {FORMAT_VERSION}."
+        )
+    serializer = get_serializer_name(data)
+    if serializer is None:
+        raise ValueError("Unable to read serialized data with an unknown serializer.")
+    return serializers[serializer]["loads"](decompress(data[HEADER_LENGTH:]))
+
+
+def dumps_memory(data) -> bytes:
+    """
+    Serializes an object for storage in the cache using `settings.CACHE_SERIALIZER`
+
+    Note: The output is written to the cache as is (it is not serialized again by the django cache)
+
+    data: any
+        The object to serialize
+
+    Returns: bytes
+    """
+    return dumps(data, settings.CACHE_SERIALIZER)
+
+
+def loads_memory(data: bytes):
+    """
+    Deserializes an object stored in the cache by `dumps_memory` or by any legacy format
+
+    data: bytes
+        The raw value from the cache
+
+    Returns: any
+
+    Notes:
+        - Legacy cache values were written by the django redis cache (integers as strings and everything else pickled)
+    """
+    if is_versioned(data):
+        return loads(data)
+    try:
+        return int(data)
+    except ValueError:
+        return pickle.loads(data)
+
+
+def dumps_persistent(data) -> bytes:
+    """
+    Serializes an object for storage in the persistent storage using `settings.CACHE_PERSISTENT_SERIALIZER`
+
+    data: any
+        The object to serialize
+
+    Returns: bytes
+    """
+    return dumps(data, settings.CACHE_PERSISTENT_SERIALIZER)
+
+
+def loads_persistent(data: bytes):
+    """
+    Deserializes an object stored in the persistent storage by `dumps_persistent` or by any legacy format
+
+    data: bytes
+        The serialized data
+
+    Returns: any
+
+    Notes:
+        - Legacy persistent files are JSON documents
+    """
+    return loads(data)
@@ -1,8 +1,343 @@
 from django.conf import settings
-import os, time
+from django.db.models.functions import Mod
+from cave_core.utils.leases import Lease, get_worker_id
+from concurrent.futures import ThreadPoolExecutor
+import math, os, threading, time
 from pamda import pamda
 
 
+class ByteBudget:
+    def __init__(self, max_bytes: int):
+        """
+        Bounds the amount of bytes in flight across threads
+
+        max_bytes: int
+            The maximum amount of bytes that can be in flight at once
+            Note: A single item larger than this is allowed in flight alone
+        """
+        self.max_bytes = max_bytes
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, amount: int) -> None:
+        """
+        Waits until `amount` bytes can be put in flight and reserves them
+        """
+        with self.condition:
+            while self.in_flight > 0 and self.in_flight + amount > self.max_bytes:
+                self.condition.wait()
+            self.in_flight += amount
+
+    def release(self, amount: int) -> None:
+        """
+        Releases `amount` bytes that are no longer in flight
+        """
+        with self.condition:
+            self.in_flight -= amount
+            self.condition.notify_all()
+
+
+def get_dirty_set(session_id) -> str:
+    """
+    Gets the data_id of the dirty set for the persistence shard that a session belongs to
+
+    session_id: int
+        The id of the session
+
+    Returns: str
+    """
+    return f"sessions:dirty:{int(session_id) % settings.CACHE_BACKUP_SHARDS}"
+
+
+def get_activity_set(session_id) -> str:
+    """
+    Gets the data_id of the sorted set of last activity times for the persistence shard that a session belongs to
+
+    session_id: int
+        The id of the session
+
+    Returns: str
+    """
+    return f"sessions:active:{int(session_id) % settings.CACHE_BACKUP_SHARDS}"
+
+
+def __balance_shards__(cache, worker_id, leases):
+    """
+    Registers this worker as alive and acquires (or releases) shard leases so each live worker holds a fair share of shards
+
+    cache: Cache
+        The Cache object used to store the worker registry and leases
+    worker_id: str
+        The id of this worker
+    leases: dict
+        A dict of shard numbers and their Lease objects for this worker
+
+    Returns: list
+        The shards currently held by this worker
+
+    Notes:
+        - Workers that have not checked in within `settings.CACHE_BACKUP_LEASE` seconds are considered dead
+        - Leases held by dead workers expire and are picked up by live workers
+    """
+    now = time.time()
+    workers_key = cache.make_key("persistence:workers")
+    pipeline = cache.get_client().pipeline(transaction=True)
+    pipeline.zadd(workers_key, {worker_id: now})
+    pipeline.zremrangebyscore(workers_key, "-inf", now - settings.CACHE_BACKUP_LEASE)
+    pipeline.zcard(workers_key)
+    pipeline.zrank(workers_key, worker_id)
+    worker_count, worker_rank = pipeline.execute()[2:]
+    fair_share = math.ceil(len(leases) / max(worker_count, 1))
+    held = [shard for shard, lease in leases.items() if lease.renew()]
+    # Release shards over the fair share so that newly started workers can pick them up
+    for shard in held[fair_share:]:
+        leases[shard].release()
+    held = held[:fair_share]
+    # Start at an offset based on this worker's rank to avoid all workers contending for the same shards
+    for i in range(len(leases)):
+        if len(held) >= fair_share:
+            break
+        shard = ((worker_rank or 0) * fair_share + i) % len(leases)
+        if shard not in held and leases[shard].acquire():
+            held.append(shard)
+    return held
+
+
+def __start_worker_heartbeat__(cache, worker_id, leases, interval):
+    """
+    Starts a background (daemon) thread that keeps this worker registered and renews all of its held shard leases
+
+    cache: Cache
+        The Cache object used to store the worker registry and leases
+    worker_id: str
+        The id of this worker
+    leases: dict
+        A dict of shard numbers and their Lease objects for this worker
+    interval: float
+        The time in seconds between renewals
+
+    Returns: threading.Event
+        Set this event to stop the heartbeat
+
+    Note: Used while shards are persisted or hibernated so a long run on one shard does not let the other held shards expire
+    """
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(interval):
+            try:
+                cache.get_client().zadd(
+                    cache.make_key("persistence:workers"), {worker_id: time.time()}
+                )
+                for lease in leases.values():
+                    if lease.is_held:
+                        lease.renew()
+            except Exception as e:
+                # Keep beating through cache errors as the leases may still be held
+                print(f"Error: Unable to renew the shard leases of worker `{worker_id}`: {e}")
+
+    threading.Thread(target=beat, daemon=True).start()
+    return stopped
+
+
+def __write_session__(cache, session, data, versions, chunk_versions, budget, size, lease):
+    """
+    Writes serialized session data to the persistent storage and records the persisted versions
+
+    Notes:
+        - This function is designed to be run in a thread pool
+        - The bytes reserved in the budget for this data are always released
+        - Nothing is written unless `lease` is still held with the same fencing token (see `Lease.renew`)
+            - This rejects writes queued by a worker that lost its shard (EG: it stalled and the shard was reassigned)
+    """
+    try:
+        if not lease.renew():
+            raise Exception(
+                f"Oops! The lease `{lease.name}` was lost before this session was written."
+            )
+        for data_id, value in data.items():
+            cache.save_serialized(data_id, value)
+        if not lease.renew():
+            raise Exception(
+                f"Oops! The lease `{lease.name}` was lost while this session was written."
+            )
+        session.set_persisted_versions(versions, chunk_versions)
+    finally:
+        budget.release(size)
+
+
+def __persist_shard__(Sessions, cache, shard, lease, full_sweep):
+    """
+    Persists all dirty sessions in a persistence shard
+
+    Sessions: Sessions
+        The Sessions object to be used for the cache
+    cache: Cache
+        The Cache object used to persist the data
+    shard: int
+        The shard to persist
+    lease: Lease
+        The lease held by this worker for the shard
+    full_sweep: bool
+        Whether to persist all sessions in the shard instead of only the dirty sessions
+
+    Returns: bool
+        True if the shard was fully persisted while holding the lease
+
+    Notes:
+        - Session data is read and serialized in this thread and written by a pool of `settings.CACHE_BACKUP_THREADS` threads
+        - At most `settings.CACHE_BACKUP_MAX_IN_FLIGHT` serialized bytes are waiting to be written at once
+        - Run stats are printed and stored in the cache as `persistence:shard:{shard}:stats`
+    """
+    start = time.time()
+    if full_sweep:
+        session_ids = (
+            Sessions.objects.annotate(shard=Mod("id", settings.CACHE_BACKUP_SHARDS))
+            .filter(shard=shard)
+            .values_list("id", flat=True)
+        )
+    else:
+        # Dirty ids stay in the processing set until they are persisted so a crash during this run does not lose them
+        session_ids = cache.claim_set(
+            f"sessions:dirty:{shard}", f"sessions:dirty:{shard}:processing"
+        )
+    sessions = list(Sessions.objects.filter(id__in=session_ids))
+    stats = {"persisted": 0, "unchanged": 0, "failed": 0, "bytes": 0}
+    done_ids = []
+    failed_ids = []
+    budget = ByteBudget(settings.CACHE_BACKUP_MAX_IN_FLIGHT)
+    futures = {}
+    with ThreadPoolExecutor(max_workers=settings.CACHE_BACKUP_THREADS) as executor:
+        for idx, obj in enumerate(sessions):
+            # Fence out this worker if its lease was lost (EG: the worker stalled and the shard was reassigned)
+            if not lease.renew():
+                failed_ids += [i.id for i in sessions[idx:]]
+                # Cancel any writes that have not started yet
+                for future in futures:
+                    future.cancel()
+                break
+            try:
+                persist_data = obj.get_persist_cache_data()
+            except Exception as e:
+                print(f"Error: Unable to persist session {obj.id} with the following error:")
+                print(e)
+                failed_ids.append(obj.id)
+                continue
+            if persist_data is None:
+                stats["unchanged"] += 1
+                done_ids.append(obj.id)
+                continue
+            data, versions, chunk_versions = persist_data
+            size = sum(len(value) for value in data.values())
+            budget.acquire(size)
+            future = executor.submit(
+                __write_session__, cache, obj, data, versions, chunk_versions, budget, size, lease
+            )
+            futures[future] = (obj, size)
+        for future, (obj, size) in futures.items():
+            if future.cancelled():
+                failed_ids.append(obj.id)
+                continue
+            try:
+                future.result()
+                done_ids.append(obj.id)
+                stats["persisted"] += 1
+                stats["bytes"] += size
+            except Exception as e:
+                print(f"Error: Unable to persist session {obj.id} with the following error:")
+                print(e)
+                failed_ids.append(obj.id)
+    # Keep a persisted copy of the shard's activity so the cache can be warmed in order of use after a cache restart
+    activity = cache.get_client().zrange(
+        cache.make_key(f"sessions:active:{shard}"), 0, -1, withscores=True
+    )
+    if len(activity) > 0 and lease.renew():
+        cache.set(
+            f"sessions:active:{shard}",
+            {session_id.decode(): score for session_id, score in activity},
+            memory=False,
+            persistent=True,
+        )
+    # Unpersisted sessions stay in the processing set and are retried on the next run
+    if not full_sweep:
+        # Ids of sessions that no longer exist are done as well
+        existing_ids = set(obj.id for obj in sessions)
+        done_ids += [int(i) for i in session_ids if int(i) not in existing_ids]
+        cache.remove_from_set(f"sessions:dirty:{shard}:processing", done_ids)
+    else:
+        cache.add_to_set(f"sessions:dirty:{shard}", failed_ids)
+    stats["failed"] = len(failed_ids)
+    stats["duration"] = round(time.time() - start, 3)
+    cache.set(f"persistence:shard:{shard}:stats", stats, timeout=None)
+    print(
+        f"Cache Persistence (shard {shard}): Persisted {stats['persisted']} sessions ({stats['bytes']} bytes) in {stats['duration']}s with {stats['unchanged']} unchanged and {stats['failed']} failed"
+    )
+    return lease.is_held
+
+
+def __hibernate_shard__(Sessions, cache, shard, lease, register):
+    """
+    Hibernates all sessions in a persistence shard that have been idle for `settings.CACHE_HIBERNATE_AFTER` seconds
+
+    Sessions: Sessions
+        The Sessions object to be used for the cache
+    cache: Cache
+        The Cache object used to find idle sessions
+    shard: int
+        The shard to hibernate
+    lease: Lease
+        The lease held by this worker for the shard
+    register: bool
+        Whether to first register all sessions in the shard that have no recorded activity as active now
+        Note: This captures sessions that were last used before hibernation was enabled or whose activity was lost
+
+    Notes:
+        - See `Sessions.hibernate` for when a session can be hibernated
+        - Sessions that can not be hibernated (EG: users are in the session) are checked again after another idle period
+    """
+    now = time.time()
+    activity_key = cache.make_key(f"sessions:active:{shard}")
+    client = cache.get_client()
+    if register:
+        session_ids = (
+            Sessions.objects.annotate(shard=Mod("id", settings.CACHE_BACKUP_SHARDS))
+            .filter(shard=shard)
+            .values_list("id", flat=True)
+        )
+        if len(session_ids) > 0:
+            client.zadd(activity_key, {session_id: now for session_id in session_ids}, nx=True)
+    idle_ids = [
+        int(session_id)
+        for session_id in client.zrangebyscore(
+            activity_key, "-inf", now - settings.CACHE_HIBERNATE_AFTER
+        )
+    ]
+    if len(idle_ids) == 0:
+        return
+    sessions = {obj.id: obj for obj in Sessions.objects.filter(id__in=idle_ids)}
+    hibernated = 0
+    for session_id in idle_ids:
+        # Fence out this worker if its lease was lost (EG: the worker stalled and the shard was reassigned)
+        if not lease.renew():
+            return
+        obj = sessions.get(session_id)
+        try:
+            if obj is None:
+                # The session was deleted
+                client.zrem(activity_key, session_id)
+            elif obj.hibernate():
+                client.zrem(activity_key, session_id)
+                hibernated += 1
+            else:
+                client.zadd(activity_key, {session_id: time.time()})
+        except Exception as e:
+            print(f"Error: Unable to hibernate session {session_id} with the following error:")
+            print(e)
+    print(
+        f"Cache Hibernation (shard {shard}): Hibernated {hibernated} of {len(idle_ids)} idle sessions"
+    )
+
+
 @pamda.thunkify
 def __session_persistence_service_task__(Sessions, cache):
     """
@@ -13,27 +348,53 @@ def __session_persistence_service_task__(Sessions, cache):
 
     Notes:
         - This function is designed to be run in a separate thread
+        - Sessions are split into `settings.CACHE_BACKUP_SHARDS` shards by session id
+        - Each shard is persisted by at most one worker at a time (the holder of that shard's lease)
+        - Idle sessions in held shards are hibernated if `settings.CACHE_HIBERNATE_AFTER` is set
     """
     # Run the persistence background tasks
     # Checking if RUN_MAIN is true ensures that the background tasks are only run once on initial server start
     print("Starting the cache persistence background service...")
+    worker_id = get_worker_id()
+    leases = {
+        shard: Lease(cache, f"persistence:shard:{shard}", worker_id, settings.CACHE_BACKUP_LEASE)
+        for shard in range(settings.CACHE_BACKUP_SHARDS)
+    }
+    # Persist all sessions in a shard the first time this worker holds it to capture any changes that were not marked as dirty
+    # EG: Changes made prior to a server restart or dirty sessions lost by a dead worker
+    unswept_shards = set(leases.keys())
+    # Register sessions with no recorded activity the first time this worker holds a shard so they can be hibernated
+    unregistered_shards = set(leases.keys())
+    # Check often enough to renew shard leases before they expire and to run each task on time
+    poll_interval = min(
+        settings.CACHE_BACKUP_LEASE / 3,
+        settings.CACHE_BACKUP_INTERVAL,
+        settings.CACHE_HIBERNATE_AFTER or settings.CACHE_BACKUP_INTERVAL,
+    )
     while True:
         try:
-            # Interruptable sleep
-            for i in range(settings.CACHE_BACKUP_INTERVAL):
-                time.sleep(1)
-            # Load the meta data
-            # This is used to prevent multiple backups from happening at the same time
-            meta = cache.get("meta")
-            if meta is None:
-                meta = {"last_update": 0}
-            now = time.time()
-            # Assume multiple servers are running - only run this if the last update was long enough ago
-            if meta["last_update"] + settings.CACHE_BACKUP_INTERVAL < now:
-                meta["last_update"] = now
-                cache.set("meta", meta, timeout=None)
-                for obj in Sessions.objects.all():
-                    obj.persist_cache_data()
+            time.sleep(poll_interval)
+            held = __balance_shards__(cache, worker_id, leases)
+            # Keep all held shards (not just the one being processed) and this worker alive during long runs
+            heartbeat = __start_worker_heartbeat__(
+                cache, worker_id, leases, settings.CACHE_BACKUP_LEASE / 3
+            )
+            try:
+                for shard in held:
+                    last_run = cache.get(f"persistence:shard:{shard}:last_run", 0)
+                    if last_run + settings.CACHE_BACKUP_INTERVAL < time.time():
+                        full_sweep = shard in unswept_shards
+                        if __persist_shard__(Sessions, cache, shard, leases[shard], full_sweep):
+                            cache.set(
+                                f"persistence:shard:{shard}:last_run", time.time(), timeout=None
+                            )
+                            unswept_shards.discard(shard)
+                    if settings.CACHE_HIBERNATE_AFTER is not None:
+                        register = shard in unregistered_shards
+                        __hibernate_shard__(Sessions, cache, shard, leases[shard], register)
+                        unregistered_shards.discard(shard)
+            finally:
+                heartbeat.set()
         except Exception as e:
             print("Error: The persist_cache function failed with the following error:")
             print(e)
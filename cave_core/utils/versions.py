@@ -0,0 +1,303 @@
+from django.conf import settings
+
+try:
+    from redis.exceptions import ResponseError, WatchError
+except ImportError:
+    ResponseError, WatchError = Exception, Exception
+
+# Lua script to only create a versions hash if it does not already exist
+# ARGV: The timeout in seconds (0 for none) and then the data keys and their encoded versions
+add_script = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return 0
+end
+redis.call('hset', KEYS[1], unpack(ARGV, 2))
+if tonumber(ARGV[1]) > 0 then
+    redis.call('expire', KEYS[1], ARGV[1])
+end
+return 1
+"""
+# Lua script to remove, increment and assign versions in a versions hash (KEYS[1]) in a single step
+# Incremented versions continue from a per data key counter (KEYS[2]) that is never reset so versions never repeat
+# ARGV: The timeout in seconds (0 for none), the number of data keys to increment, the number of data keys to remove,
+#       the data keys to increment, the data keys to remove and then the data keys and encoded versions to assign
+update_script = """
+local increments = tonumber(ARGV[2])
+local removes = tonumber(ARGV[3])
+for i = 4 + increments, 3 + increments + removes do
+    redis.call('hdel', KEYS[1], ARGV[i])
+end
+for i = 4, 3 + increments do
+    local counter = tonumber(redis.call('hget', KEYS[2], ARGV[i])) or 0
+    local current = tonumber(redis.call('hget', KEYS[1], ARGV[i]))
+    if current ~= nil and current > counter then
+        counter = current
+    end
+    redis.call('hset', KEYS[2], ARGV[i], counter + 1)
+    redis.call('hset', KEYS[1], ARGV[i], counter + 1)
+end
+for i = 4 + increments + removes, #ARGV, 2 do
+    redis.call('hset', KEYS[1], ARGV[i], ARGV[i + 1])
+end
+if tonumber(ARGV[1]) > 0 then
+    redis.call('expire', KEYS[1], ARGV[1])
+    redis.call('expire', KEYS[2], ARGV[1])
+end
+return redis.call('hgetall', KEYS[1])
+"""
+
+
+def __encode__(version) -> str | int:
+    """
+    Encodes a version for storage in a hash
+
+    Note: String versions (EG: content hashes) are prefixed so they are never confused with integer versions
+    """
+    return version if isinstance(version, int) else f"s:{version}"
+
+
+def __decode__(version: bytes) -> str | int:
+    """
+    Decodes a version stored in a hash
+    """
+    version = version.decode()
+    return version[2:] if version.startswith("s:") else int(version)
+
+
+def __migrate__(cache, data_id: str) -> None:
+    """
+    Migrates versions stored as a single (legacy) cache value to a hash
+
+    cache: Cache
+        The Cache object where the versions are stored
+    data_id: str
+        The data_id of the versions
+    """
+    key = cache.make_key(data_id)
+    with cache.get_client().pipeline(transaction=True) as pipeline:
+        while True:
+            try:
+                pipeline.watch(key)
+                if pipeline.type(key) != b"string":
+                    return
+                versions = cache.get(data_id, {})
+                pipeline.multi()
+                pipeline.delete(key)
+                if len(versions) > 0:
+                    pipeline.hset(key, mapping={k: __encode__(v) for k, v in versions.items()})
+                pipeline.execute()
+                return
+            except WatchError:
+                # Another process changed (or migrated) the versions so check them again
+                continue
+
+
+def get_counters_id(data_id: str) -> str:
+    """
+    Gets the data_id of the per data key counters used to increment the versions in a hash
+
+    data_id: str
+        The data_id of the versions
+
+    Returns: str
+    """
+    return f"{data_id}:counters"
+
+
+def __run__(cache, data_id: str, fn):
+    """
+    Runs a function against a versions hash migrating legacy versions if needed
+    """
+    try:
+        return fn()
+    except ResponseError as e:
+        if "WRONGTYPE" not in str(e):
+            raise
+        __migrate__(cache, data_id)
+        return fn()
+
+
+def get_hash_versions(cache, data_id: str, keys: list | None = None) -> dict:
+    """
+    Gets versions stored in a hash
+
+    cache: Cache
+        The Cache object where the versions are stored
+    data_id: str
+        The data_id of the versions
+    keys: list | None
+        The data keys to get versions for
+        Default: None
+        Note: If None, all versions are returned
+
+    Returns: dict
+        The data keys and their versions
+        Note: Data keys without a version are not included
+
+    Note: If the versions do not exist in the cache, they are loaded from the persistent storage (if present)
+    """
+    client = cache.get_client()
+    key = cache.make_key(data_id)
+    if keys is None:
+        raw = __run__(cache, data_id, lambda: client.hgetall(key))
+        versions = {k.decode(): __decode__(v) for k, v in raw.items()}
+    else:
+        if len(keys) == 0:
+            return {}
+        raw = __run__(cache, data_id, lambda: client.hmget(key, keys))
+        versions = {k: __decode__(v) for k, v in zip(keys, raw) if v is not None}
+    if len(versions) == 0 and not client.exists(key):
+        persisted = cache.get_persistent(data_id)
+        if persisted:
+            add_hash_versions(cache, data_id, persisted)
+            return {k: v for k, v in persisted.items() if keys is None or k in keys}
+    return versions
+
+
+def add_hash_versions(cache, data_id: str, versions: dict) -> bool:
+    """
+    Stores versions in a hash only if no versions are stored yet
+
+    cache: Cache
+        The Cache object where the versions are stored
+    data_id: str
+        The data_id of the versions
+    versions: dict
+        The data keys and their versions
+
+    Returns: bool
+        True if the versions were stored
+    """
+    if len(versions) == 0:
+        return False
+    args = [item for k, v in versions.items() for item in (k, __encode__(v))]
+    return bool(
+        cache.get_client().eval(
+            add_script, 1, cache.make_key(data_id), settings.CACHE_TIMEOUT or 0, *args
+        )
+    )
+
+
+def set_hash_versions(cache, data_id: str, versions: dict) -> None:
+    """
+    Replaces all versions in a hash in a single transaction
+
+    cache: Cache
+        The Cache object where the versions are stored
+    data_id: str
+        The data_id of the versions
+    versions: dict
+        The data keys and their versions
+    """
+    pipeline = cache.get_client().pipeline(transaction=True)
+    pipeline.delete(cache.make_key(data_id))
+    if len(versions) > 0:
+        pipeline.hset(
+            cache.make_key(data_id), mapping={k: __encode__(v) for k, v in versions.items()}
+        )
+        if settings.CACHE_TIMEOUT is not None:
+            pipeline.expire(cache.make_key(data_id), settings.CACHE_TIMEOUT)
+    pipeline.execute()
+
+
+def update_hash_versions(
+    cache,
+    data_id: str,
+    increment: list = list(),
+    assign: dict = dict(),
+    remove: list = list(),
+) -> dict:
+    """
+    Atomically increments, assigns and removes versions in a hash in a single transaction
+
+    cache: Cache
+        The Cache object where the versions are stored
+    data_id: str
+        The data_id of the versions
+    increment: list
+        The data keys whose (integer) versions should be incremented
+        Default: []
+        Note: Data keys without an integer version continue from the last integer version they had (or start at 1)
+    assign: dict
+        The data keys and the (string) versions to assign to them (EG: content hashes)
+        Default: {}
+    remove: list
+        The data keys whose versions should be removed
+        Default: []
+
+    Returns: dict
+        All versions after the update
+
+    Notes:
+        - Incremented versions never repeat (EG: after a data key switches between integer and string versions or is removed and added again) so clients holding an old version always see the change
+        - The last integer version of each data key is kept at `get_counters_id(data_id)`
+        - Versions (and counters) written here expire after `settings.CACHE_TIMEOUT` seconds like the other cached data
+    """
+    # Reading the current versions also restores them from the persistent storage if they are not in the cache
+    get_hash_versions(cache, data_id, keys=list(increment) + list(assign.keys()) + list(remove))
+    args = __get_update_args__(cache, data_id, increment, assign, remove)
+    raw = __run__(cache, data_id, lambda: cache.get_client().eval(update_script, 2, *args))
+    return decode_hash_versions(raw)
+
+
+def __get_update_args__(cache, data_id: str, increment: list, assign: dict, remove: list) -> list:
+    """
+    Gets the keys and arguments to run `update_script` against a versions hash
+    """
+    return [
+        cache.make_key(data_id),
+        cache.make_key(get_counters_id(data_id)),
+        settings.CACHE_TIMEOUT or 0,
+        len(increment),
+        len(remove),
+        *increment,
+        *remove,
+        *[item for k, v in assign.items() for item in (k, __encode__(v))],
+    ]
+
+
+def queue_hash_versions_update(
+    pipeline,
+    cache,
+    data_id: str,
+    increment: list = list(),
+    assign: dict = dict(),
+    remove: list = list(),
+) -> None:
+    """
+    Queues an update of the versions in a hash (see `update_hash_versions`) in a transaction pipeline
+
+    pipeline: redis.client.Pipeline
+        The pipeline (from `cache.get_client().pipeline(transaction=True)`) to queue the update in
+    cache: Cache
+        The Cache object where the versions are stored
+    data_id: str
+        The data_id of the versions
+    increment: list
+        The data keys whose (integer) versions should be incremented
+        Default: []
+    assign: dict
+        The data keys and the (string) versions to assign to them (EG: content hashes)
+        Default: {}
+    remove: list
+        The data keys whose versions should be removed
+        Default: []
+
+    Notes:
+        - The versions must already be stored in a hash (EG: read with `get_hash_versions` first)
+        - The result of this command in `pipeline.execute()` is decoded with `decode_hash_versions`
+    """
+    pipeline.eval(update_script, 2, *__get_update_args__(cache, data_id, increment, assign, remove))
+
+
+def decode_hash_versions(raw: list) -> dict:
+    """
+    Decodes all versions returned by `update_script`
+
+    raw: list
+        The flat list of data keys and encoded versions
+
+    Returns: dict
+        The data keys and their versions
+    """
+    return {raw[i].decode(): __decode__(raw[i + 1]) for i in range(0, len(raw), 2)}
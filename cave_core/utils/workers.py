@@ -0,0 +1,295 @@
+from django.conf import settings
+from django.db import close_old_connections
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import inspect, multiprocessing, os, queue, signal, threading, time
+
+pools = {}
+pools_lock = threading.Lock()
+
+
+class CommandCancelled(Exception):
+    pass
+
+
+def __init_process__():
+    """
+    Sets up Django in a new worker process so API commands can use the cache and broadcast to users
+    """
+    import django
+
+    django.setup()
+
+
+def __get_pools__() -> dict:
+    """
+    Gets (and creates on first use) the worker pools for this process
+
+    Returns: dict
+        The `threads` pool and the `slots` semaphore
+        Note: If `settings.API_WORKER_MODE` is "process", also the `processes` pool and the `manager` used to create output queues
+    """
+    with pools_lock:
+        if len(pools) == 0:
+            pools["threads"] = ThreadPoolExecutor(
+                max_workers=settings.API_WORKERS, thread_name_prefix="api_worker"
+            )
+            # Bound the commands that are running or waiting to run
+            pools["slots"] = threading.BoundedSemaphore(
+                settings.API_WORKERS + settings.API_WORKER_QUEUE_SIZE
+            )
+            if settings.API_WORKER_MODE == "process":
+                # One process pool (and one manager for output queues) is shared by all worker threads in this process
+                pools["manager"] = multiprocessing.get_context("spawn").Manager()
+                pools["processes"] = __create_process_pool__()
+                # The number of runs using each process pool and the stuck worker processes of retired pools
+                pools["active"] = {}
+                pools["retired"] = {}
+        return pools
+
+
+def __create_process_pool__() -> ProcessPoolExecutor:
+    """
+    Creates a pool of `settings.API_WORKERS` (spawned) worker processes
+    """
+    return ProcessPoolExecutor(
+        max_workers=settings.API_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=__init_process__,
+    )
+
+
+def __replace_process_pool__(broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+    """
+    Replaces the process pool if it is broken (EG: a worker process died) and gets the current process pool
+
+    broken: ProcessPoolExecutor
+        The process pool that is broken
+        Note: If another thread already replaced it, the current process pool is returned
+    """
+    with pools_lock:
+        if pools["processes"] is broken:
+            broken.shutdown(wait=False, cancel_futures=True)
+            pools["processes"] = __create_process_pool__()
+        return pools["processes"]
+
+
+def __retire_process_pool__(processes: ProcessPoolExecutor, pid: int | None) -> None:
+    """
+    Replaces a process pool that has a stuck worker process (EG: a cancelled command that did not stop) so new runs do not wait for it
+
+    processes: ProcessPoolExecutor
+        The process pool with the stuck worker process
+    pid: int | None
+        The process id of the stuck worker process
+        Note: If None (the run never started), only the pool is replaced
+
+    Note: The stuck worker process is terminated once no other run is using the retired pool (see `__end_run__`)
+    """
+    with pools_lock:
+        if pools["processes"] is processes:
+            pools["processes"] = __create_process_pool__()
+        retired = pools["retired"].setdefault(processes, [])
+        if pid is not None:
+            retired.append(pid)
+
+
+def __start_run__(processes: ProcessPoolExecutor) -> None:
+    """
+    Records that a run is using a process pool
+    """
+    with pools_lock:
+        pools["active"][processes] = pools["active"].get(processes, 0) + 1
+
+
+def __end_run__(processes: ProcessPoolExecutor) -> None:
+    """
+    Records that a run stopped using a process pool and shuts down the pool once it is retired and no longer used
+
+    Note: Stuck worker processes are terminated as a retired pool never gets new runs
+    """
+    with pools_lock:
+        active = pools["active"].get(processes, 1) - 1
+        if active > 0:
+            pools["active"][processes] = active
+            return
+        pools["active"].pop(processes, None)
+        if processes not in pools["retired"]:
+            return
+        pids = pools["retired"].pop(processes)
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            # The worker process already stopped
+            pass
+    processes.shutdown(wait=False, cancel_futures=True)
+
+
+def dispatch(fn, on_error) -> None:
+    """
+    Runs a function in the API worker pool so that it does not block the current (websocket consumer) thread
+
+    fn: callable
+        The function to run (with no arguments)
+    on_error: callable
+        The function to call with any exception raised by `fn`
+        Note: Only called if `fn` runs in the worker pool (otherwise the exception is raised)
+
+    Notes:
+        - If `settings.API_WORKER_MODE` is "inline", `fn` runs in the current thread
+        - Raises an exception if `settings.API_WORKER_QUEUE_SIZE` functions are already waiting to run
+    """
+    if settings.API_WORKER_MODE == "inline":
+        fn()
+        return
+    pools = __get_pools__()
+    if not pools["slots"].acquire(blocking=False):
+        raise Exception(
+            "Oops! The server is busy running other commands. Please try again in a moment."
+        )
+
+    def run():
+        # Worker threads are not managed by django so stale or unused database connections are closed for them
+        close_old_connections()
+        try:
+            fn()
+        except Exception as e:
+            on_error(e)
+        finally:
+            close_old_connections()
+            pools["slots"].release()
+
+    pools["threads"].submit(run)
+
+
+def __stream__(fn, args, kwargs, put, cancelled=None) -> None:
+    """
+    Runs a function and passes each of its outputs to `put` as a tuple of the output type and the output
+
+    Output types:
+        - "output": The return value of a function that is not a generator
+        - "partial": A value yielded by a generator function
+        - "done": Sent once the function has finished
+        - "error": An exception raised by the function
+
+    Note: Generator functions are stopped (closed) before their next partial output once `cancelled` returns True
+    """
+    try:
+        output = fn(*args, **kwargs)
+        if inspect.isgenerator(output):
+            for partial in output:
+                if cancelled is not None and cancelled():
+                    output.close()
+                    break
+                put(("partial", partial))
+        else:
+            put(("output", output))
+        put(("done", None))
+    except Exception as e:
+        try:
+            put(("error", e))
+        except Exception:
+            # The exception could not be sent to the parent process (EG: it is not picklable)
+            put(("error", Exception(str(e))))
+
+
+def __stream_in_process__(fn, args, kwargs, output_queue, cancel_event) -> None:
+    """
+    Runs `__stream__` in a worker process sending each output through a (manager) queue
+    """
+    close_old_connections()
+    try:
+        # Let the parent process stop this worker process if the run is cancelled and does not stop (see `stream_in_worker`)
+        output_queue.put(("started", os.getpid()))
+        __stream__(fn, args, kwargs, output_queue.put, cancelled=cancel_event.is_set)
+    finally:
+        close_old_connections()
+
+
+def stream_in_worker(fn, *args, cancelled=None, **kwargs):
+    """
+    Runs a function (optionally a generator function) in a worker process and yields its outputs as they are ready
+
+    fn: callable
+        The function to run
+        Note: If run in a worker process, the function, args, kwargs and outputs must be picklable
+    *args, **kwargs:
+        The arguments to pass to `fn`
+    cancelled: callable | None
+        A function (with no arguments) that returns True once the run has been cancelled
+        Default: None
+
+    Yields: tuple(str, any)
+        - ("output", value) with the return value if `fn` is not a generator function
+        - ("partial", value) for each value yielded if `fn` is a generator function
+
+    Notes:
+        - If `settings.API_WORKER_MODE` is not "process", `fn` runs in the current thread
+        - Exceptions raised by `fn` are raised here
+        - Cancellation is cooperative: generator functions are stopped before their next partial output and other functions can check `socket.is_cancelled()`
+        - If `fn` is still running `settings.API_CANCEL_GRACE_PERIOD` seconds after it was cancelled, it is forcibly stopped and `CommandCancelled` is raised
+            - The shared process pool is replaced right away so new runs do not wait for the stuck worker process
+            - The stuck worker process is terminated once the other runs in the replaced pool finish (see `__retire_process_pool__`)
+    """
+    if settings.API_WORKER_MODE != "process":
+        output = fn(*args, **kwargs)
+        if inspect.isgenerator(output):
+            for partial in output:
+                yield "partial", partial
+        else:
+            yield "output", output
+        return
+    pools = __get_pools__()
+    # Each run has its own output queue so outputs of an abandoned run never reach another run
+    output_queue = pools["manager"].Queue()
+    cancel_event = pools["manager"].Event()
+    processes = pools["processes"]
+    try:
+        future = processes.submit(
+            __stream_in_process__, fn, args, kwargs, output_queue, cancel_event
+        )
+    except BrokenProcessPool:
+        processes = __replace_process_pool__(processes)
+        future = processes.submit(
+            __stream_in_process__, fn, args, kwargs, output_queue, cancel_event
+        )
+    __start_run__(processes)
+    cancelled_at = None
+    pid = None
+    try:
+        while True:
+            # Check for a cancel before every output (not only while waiting) so streaming functions are also stopped
+            if cancelled_at is None:
+                if cancelled is not None and cancelled():
+                    cancelled_at = time.time()
+                    cancel_event.set()
+            elif cancelled_at + settings.API_CANCEL_GRACE_PERIOD < time.time():
+                # The function did not stop so its worker process is stopped instead
+                __retire_process_pool__(processes, pid)
+                raise CommandCancelled()
+            try:
+                kind, value = output_queue.get(timeout=1)
+            except queue.Empty:
+                # Errors that prevent the function from running (EG: it is not picklable or the process died)
+                if future.done() and future.exception() is not None:
+                    if isinstance(future.exception(), BrokenProcessPool):
+                        __replace_process_pool__(processes)
+                    raise future.exception()
+                continue
+            if kind == "started":
+                pid = value
+                continue
+            if kind == "done":
+                # A cancelled generator function stops early so its remaining outputs are missing
+                if cancelled_at is not None:
+                    raise CommandCancelled()
+                return
+            if kind == "error":
+                raise value
+            yield kind, value
+    finally:
+        # Stop the function (if it is still running) at its next check as its outputs are no longer consumed
+        cancel_event.set()
+        future.cancel()
+        __end_run__(processes)
@@ -24,6 +24,32 @@ def format_exception(e):
         return "".join(traceback.format_exception(e))
 
 
+def notify_exception(session, e):
+    """
+    Notifies all users in a session of an exception with its stack trace
+
+    Requires:
+
+    - `session`:
+        - Type: Sessions object
+        - What: The session to notify
+    - `e`:
+        - Type: Exception
+        - What: The exception to notify the users about
+    """
+    traceback_str = format_exception(e)
+    if settings.DEBUG:
+        print(traceback_str)
+    CaveWSBroadcaster(session).notify(
+        message=str(e),
+        title="Error:",
+        show=True,
+        theme="error",
+        duration=10,
+        traceback=traceback_str,
+    )
+
+
 def redirect_logged_in_user(fn):
     """
     View wrapper to redirect logged in users to the app page if they try to access the login page
@@ -93,18 +119,8 @@ def ws_api_app(fn):
         try:
             fn(request)
         except Exception as e:
-            traceback_str = format_exception(e)
-            if settings.DEBUG:
-                print(traceback_str)
             # Notify the user of the exception
-            CaveWSBroadcaster(session).notify(
-                message=str(e),
-                title="Error:",
-                show=True,
-                theme="error",
-                duration=10,
-                traceback=traceback_str,
-            )
+            notify_exception(session, e)
             # Set the executing / loading status to false
             session.set_loading(False)
 
@@ -1,5 +1,14 @@
+# Framework Imports
+from django.conf import settings
+from django.db import close_old_connections
+
+# External Imports
+from types import SimpleNamespace
+
 # Internal Imports
+from cave_core.models import CustomUser, Sessions
 from cave_core.websockets.cave_ws_broadcaster import CaveWSBroadcaster
+from cave_core.utils.coalescing import schedule
 from cave_core.utils.constants import api_keys_set
 from cave_core.utils.wrapping import cache_data_version, ws_api_app
 
@@ -36,6 +45,11 @@ def get_session_data(request):
     else:
         # Update the user about their session info
         request.user.broadcast_current_session_info()
+    # Load the session data back into the cache if the session is hibernated
+    session.wake()
+    # Run any queued api commands left by a process that died while running them
+    if settings.SESSION_COMMAND_QUEUE:
+        session.resume_queued_api_commands()
     # Broadcast any changed session data
     session.broadcast_changed_data(previous_versions=data_versions)
 
@@ -84,6 +98,11 @@ def mutate_session(request):
     ----- Type: bool
     ----- Default: false
     ----- Note: Only sessions associated to the same team (or individual) will get this sync
+    - `api_command_idempotent`:
+    ----- What: Boolean value to indicate if running only the latest `api_command` gives the same result as running each one
+    ----- Type: bool
+    ----- Default: false
+    ----- Note: If true, this mutation can be coalesced with later mutations to the same `data_path` (see `settings.SESSION_MUTATION_WINDOW`)
 
 
     Example input (WS Send):
@@ -99,6 +118,101 @@ def mutate_session(request):
     -----------------------------------
     """
     api_command = request.data.get("api_command")
+    # Coalesce rapid mutations to the same data path into a single write and broadcast
+    # Note: Mutations with an api command are only coalesced if the api command is idempotent
+    if (
+        settings.SESSION_MUTATION_WINDOW is not None
+        and request.data.get("data_name") is not None
+        and (api_command is None or request.data.get("api_command_idempotent", False))
+    ):
+        session_id = request.user.session.id
+        if request.user.session.coalesce_mutation(user_id=request.user.id, data=request.data):
+            schedule(
+                lambda: __apply_coalesced_mutations__(session_id),
+                settings.SESSION_MUTATION_WINDOW / 1000,
+            )
+        return
+    if settings.SESSION_MUTATION_WINDOW is not None:
+        # Apply any coalesced mutations first so mutations are always applied in order
+        base_versions = __apply_coalesced_mutations__(request.user.session.id)
+        if base_versions is not None:
+            # This mutation was sent before the coalesced mutations were applied
+            request = SimpleNamespace(
+                user=request.user,
+                data=__rebase_versions__(
+                    request.data, base_versions, request.user.session.get_versions()
+                ),
+            )
+    __mutate_session__(request)
+
+
+def __apply_coalesced_mutations__(session_id):
+    """
+    Applies the coalesced mutations for a session (see `mutate_session`)
+
+    Requires:
+    - `session_id`:
+    ----- What: The id of the session to apply the coalesced mutations to
+    ----- Type: int
+
+    Returns:
+    ----- What: The versions of the session before the coalesced mutations were applied
+    ----- Type: dict | None
+    ----- Note: None if there were no coalesced mutations
+
+    Note: All coalesced mutations are validated against the versions before any of them were applied
+    """
+    session = Sessions.objects.filter(id=session_id).first()
+    if session is None:
+        return None
+    mutations = session.take_coalesced_mutations()
+    if len(mutations) == 0:
+        return None
+    base_versions = session.get_versions()
+    for mutation in mutations:
+        user = CustomUser.objects.filter(id=mutation["user_id"]).first()
+        # Skip mutations from users that have since left the session
+        if user is None or user.session_id != session_id:
+            continue
+        data = __rebase_versions__(mutation["data"], base_versions, session.get_versions())
+        ws_api_app(__mutate_session__)(SimpleNamespace(user=user, data=data))
+    close_old_connections()
+    return base_versions
+
+
+def __rebase_versions__(data, base_versions, versions):
+    """
+    Updates the data version of a mutation request that was sent at the base versions to the current versions
+
+    Requires:
+    - `data`:
+    ----- What: The mutation request data (see `mutate_session`)
+    ----- Type: dict
+    - `base_versions`:
+    ----- What: The session versions before earlier mutations in the same batch were applied
+    ----- Type: dict
+    - `versions`:
+    ----- What: The current session versions
+    ----- Type: dict
+
+    Returns:
+    ----- What: The mutation request data (a copy if its data version was updated)
+    ----- Type: dict
+
+    Note: Used so mutations sent at the same versions do not fail the version check after the first one is applied
+    """
+    data_name = data.get("data_name")
+    data_versions = data.get("data_versions") or {}
+    if data_name is None or data_versions.get(data_name) != base_versions.get(data_name):
+        return data
+    return {**data, "data_versions": {**data_versions, data_name: versions.get(data_name)}}
+
+
+def __mutate_session__(request):
+    """
+    Applies a mutation request (see `mutate_session`)
+    """
+    api_command = request.data.get("api_command")
     api_command_keys = request.data.get("api_command_keys")
     team_sync = request.data.get("team_sync", False)
 
@@ -129,7 +243,7 @@ def mutate_session(request):
                 # Ignore version validation if this is not the current session
                 ignore_version=session_i.id != session.id,
                 data_version=data_versions.get(data_name),
-                # Allow missing cache keys to be created in the cache if they are are top level keys not in the cache yet 
+                # Allow missing cache keys to be created in the cache if they are are top level keys not in the cache yet
                 # (prevents mutation errors when syncing new data structures from local state)
                 create_missing_cache_keys=data_name in api_keys_set,
                 **mutate_dict,
@@ -148,14 +262,29 @@ def mutate_session(request):
                     # Broadcast any changed session data
                     session_i.broadcast_changed_data(previous_versions=data_versions)
                     break
+        # Queue an api command if provided (it runs once the session is not executing another command)
+        if api_command is not None and settings.SESSION_COMMAND_QUEUE:
+            # Push the mutation now as the queued command only broadcasts the changes that it makes
+            if data_name is not None:
+                CaveWSBroadcaster(session_i).broadcast(
+                    event="mutation",
+                    versions=session_i.get_versions(),
+                    data=mutate_dict,
+                )
+            session_i.queue_api_command(
+                command=api_command,
+                command_keys=api_command_keys,
+                mutate_dict=mutate_dict,
+            )
         # Apply an api command if provided and push updated output
-        if api_command is not None:
+        elif api_command is not None:
             session_i.execute_api_command(
                 command=api_command,
                 command_keys=api_command_keys,
                 mutate_dict=mutate_dict,
                 previous_versions=session_i_pre_versions,
                 broadcast_changes=True,
+                background=True,
             )
         # If no api command is provided, apply the mutation
         else:
@@ -166,6 +295,28 @@ def mutate_session(request):
             )
 
 
+@ws_api_app
+def cancel_api_command(request):
+    """
+    API endpoint to cancel the api command running in the current session (and any queued api commands)
+
+    Example input (WS Send):
+
+    -----------------------------------
+    {}
+    -----------------------------------
+    """
+    session = request.user.session
+    if not session.cancel_api_command():
+        CaveWSBroadcaster(request.user).notify(
+            message="There is no api command running to cancel.",
+            title="Info:",
+            show=True,
+            theme="info",
+            duration=5,
+        )
+
+
 @ws_api_app
 def get_associated_session_data(request):
     """
@@ -1,21 +1,158 @@
 from django.conf import settings
-import type_enforced
+from contextlib import contextmanager
+import asyncio, inspect, threading, time, type_enforced
 from django_sockets.broadcaster import Broadcaster
 
-broadcaster = Broadcaster(hosts=settings.DJANGO_SOCKET_HOSTS)
+# The event loop that broadcasts are published on (started in a background thread by the broadcaster)
+loop = asyncio.new_event_loop()
+broadcaster = Broadcaster(loop=loop, hosts=settings.DJANGO_SOCKET_HOSTS)
+# Messages collected by `batch` for the current thread
+batch_state = threading.local()
+# Progress throttling state (last broadcast time, pending payload and scheduled timer) by object in this process
+progress_state = {}
+progress_lock = threading.Lock()
+# Loading coalescing state (loading state sent during the window, pending loading state and scheduled timer) by object in this process
+# Note: Entries only exist while a coalescing window is open
+loading_state = {}
+loading_lock = threading.Lock()
 
 # Constants
 acceptable_events = set(
     [
         "mutation",
         "overwrite",
+        "patch",
         "message",
+        "progress",
         "updateSessions",
         "updateLoading",
         "export",
     ]
 )
 theme_list = set(["primary", "secondary", "error", "warning", "info", "success"])
+# Internal event used to update the channels that the sockets of a user are subscribed to (never sent to clients)
+channels_event = "__channels__"
+
+
+async def __async_broadcast_channel__(channel: str, payloads: list) -> None:
+    """
+    Publishes payloads to a single channel in order (see `__async_broadcast_many__`)
+    """
+    for data in payloads:
+        await broadcaster.async_broadcast(channel, data)
+
+
+async def __async_broadcast_many__(messages: list) -> None:
+    """
+    Publishes messages to all of their channels at once (see `broadcast_many`)
+
+    Note: Messages to the same channel are published in order
+    """
+    channels = {}
+    for channel, data in messages:
+        channels.setdefault(str(channel), []).append(data)
+    results = await asyncio.gather(
+        *[__async_broadcast_channel__(channel, payloads) for channel, payloads in channels.items()],
+        return_exceptions=True,
+    )
+    errors = [result for result in results if isinstance(result, Exception)]
+    if len(errors) > 0:
+        raise errors[0]
+
+
+def __log_broadcast_error__(future) -> None:
+    """
+    Logs any error raised while publishing messages (see `broadcast_many`)
+    """
+    if future.cancelled():
+        return
+    exception = future.exception()
+    if exception is not None:
+        print(f"Broadcast Error: Unable to publish messages: {exception}")
+
+
+def broadcast_many(messages: list):
+    """
+    Broadcasts messages to many channels with one scheduled task on the broadcast event loop
+
+    messages: list of tuple(str, dict)
+        The channel and the (JSON serializable) payload of each message
+        Note: Messages to the same channel are published in order while different channels are published concurrently
+
+    Returns: concurrent.futures.Future | None
+        The future of the scheduled publish (None if there are no messages)
+        Note: Errors raised while publishing are logged
+    """
+    if len(messages) == 0:
+        return None
+    future = asyncio.run_coroutine_threadsafe(__async_broadcast_many__(messages), loop)
+    future.add_done_callback(__log_broadcast_error__)
+    return future
+
+
+def run_and_end_progress(fn, socket, **kwargs):
+    """
+    Runs a function (optionally a generator function) with a socket and ends the progress updates of the socket once it finishes
+
+    fn: callable
+        The function to run (EG: `execute_command`)
+    socket: CaveWSBroadcaster
+        The socket to pass to `fn`
+    **kwargs:
+        Any other arguments to pass to `fn`
+
+    Returns: any
+        The output of `fn` (a generator if `fn` is a generator function)
+
+    Note: Runs in the process that `fn` runs in so pending progress updates of that process are dropped (see `CaveWSBroadcaster.end_progress`)
+    """
+    try:
+        output = fn(socket=socket, **kwargs)
+    except Exception:
+        socket.end_progress()
+        raise
+    if inspect.isgenerator(output):
+        return __end_progress_after__(output, socket)
+    socket.end_progress()
+    return output
+
+
+def __end_progress_after__(output, socket):
+    """
+    Yields the outputs of a generator and ends the progress updates of a socket once it finishes (see `run_and_end_progress`)
+    """
+    try:
+        yield from output
+    finally:
+        socket.end_progress()
+
+
+@contextmanager
+def batch():
+    """
+    Collects all broadcasts made by CaveWSBroadcaster in the current thread and publishes them together with `broadcast_many` on exit
+
+    Notes:
+        - Nested batches are published when the outermost batch exits
+        - Collected broadcasts are published even if an exception is raised
+
+    Example:
+
+    ```
+    with batch():
+        for team in teams:
+            team.update_sessions_list()
+    ```
+    """
+    if getattr(batch_state, "messages", None) is not None:
+        yield
+        return
+    batch_state.messages = []
+    try:
+        yield
+    finally:
+        messages, batch_state.messages = batch_state.messages, None
+        broadcast_many(messages)
 
 
 class CaveWSBroadcaster:
@@ -31,7 +168,7 @@ class CaveWSBroadcaster:
         - `event`:
             - Type: str
             - What: The event to broadcast
-            - Allowed Values: "mutation", "overwrite", "message", "updateSessions", "updateLoading"
+            - Allowed Values: "mutation", "overwrite", "patch", "message", "progress", "updateSessions", "updateLoading"
         - `data`:
             - Type: dict (json serializable)
             - What: The data to broadcast
@@ -53,20 +190,60 @@ class CaveWSBroadcaster:
         """
         Broadcasts a message to all users related to an object by object.get_user_ids()
 
+        If the object has a channel (object.get_channel()), the message is serialized and published once to that channel
+        Otherwise the message is published to the channel of each user (in one scheduled task)
+        Note: Inside a `batch`, the message is published when the batch exits
+
         Requires:
 
         - `event`:
             - Type: str
             - What: The event to broadcast
-            - Allowed Values: "mutation", "overwrite", "message", "updateSessions", "updateLoading"
+            - Allowed Values: "mutation", "overwrite", "patch", "message", "progress", "updateSessions", "updateLoading"
         - `data`:
             - Type: dict
             - What: The data to broadcast
         """
-        for user_id in self.model_object.get_user_ids():
-            broadcaster.broadcast(
-                str(user_id), self.format_broadcast_payload(event=event, data=data, **kwargs)
-            )
+        payload = self.format_broadcast_payload(event=event, data=data, **kwargs)
+        get_channel = getattr(self.model_object, "get_channel", None)
+        if get_channel is not None:
+            messages = [(get_channel(), payload)]
+        else:
+            messages = [(str(user_id), payload) for user_id in self.model_object.get_user_ids()]
+        if getattr(batch_state, "messages", None) is not None:
+            batch_state.messages += messages
+        else:
+            broadcast_many(messages)
+
+    def update_channels(self, subscribe: list = [], unsubscribe: list = []):
+        """
+        Updates the group channels (EG: session and team channels) that the sockets of a user are subscribed to
+
+        Optional:
+
+        - `subscribe`:
+            - Type: list of str
+            - What: The channels to subscribe to
+            - Default: []
+        - `unsubscribe`:
+            - Type: list of str
+            - What: The channels to unsubscribe from
+            - Default: []
+
+        Notes:
+            - Only valid for user objects
+            - Handled by the sockets of the user and never sent to the client
+        """
+        if len(subscribe) == 0 and len(unsubscribe) == 0:
+            return
+        broadcast_many(
+            [
+                (
+                    self.model_object.get_channel(),
+                    {"event": channels_event, "subscribe": subscribe, "unsubscribe": unsubscribe},
+                )
+            ]
+        )
 
     @type_enforced.Enforcer
     def notify(
@@ -137,6 +314,188 @@ class CaveWSBroadcaster:
             loading=False,
         )
 
+    def progress(self, fraction: float, message: str = "", **kwargs):
+        """
+        Notify end users of the progress of a long running task
+
+        Requires:
+
+        - `fraction`:
+            - Type: float
+            - What: The fraction of the task that is complete (between 0 and 1)
+
+        Optional:
+
+        - `message`:
+            - Type: str
+            - What: A message describing the current step of the task
+            - Default: ""
+        - `**kwargs`:
+            - Type: dict (json serializable)
+            - What: Any additional data to serialize and pass to the user
+
+        Notes:
+            - Updates are throttled to `settings.BROADCAST_PROGRESS_RATE` per second for each object
+            - Intermediate updates within the throttle interval are coalesced so only the latest is broadcast
+            - The latest update is broadcast at the end of the throttle interval and completed updates (`fraction >= 1`) are broadcast immediately
+            - Pending updates are dropped once the API command ends (see `end_progress`)
+
+        Example:
+
+        ```
+        for idx, step in enumerate(steps):
+            socket.progress(fraction=idx / len(steps), message=f"Running step {idx + 1}")
+            run(step)
+        socket.progress(fraction=1, message="Done")
+        ```
+        """
+        payload = {"fraction": max(0, min(1, fraction)), "message": message, **kwargs}
+        key = (type(self.model_object).__name__, self.model_object.id)
+        interval = 1 / settings.BROADCAST_PROGRESS_RATE
+        with progress_lock:
+            state = progress_state.setdefault(key, {"last": 0, "pending": None, "timer": None})
+            wait = state["last"] + interval - time.time()
+            if wait > 0 and fraction < 1:
+                state["pending"] = payload
+                if state["timer"] is None:
+                    state["timer"] = threading.Timer(wait, self.__flush_progress__, args=(key,))
+                    state["timer"].daemon = True
+                    state["timer"].start()
+                return
+            # Any pending update is older than this one so it is dropped
+            state["pending"] = None
+            state["last"] = time.time()
+            if fraction >= 1:
+                if state["timer"] is not None:
+                    state["timer"].cancel()
+                progress_state.pop(key, None)
+        self.broadcast(event="progress", data=payload)
+
+    def __flush_progress__(self, key):
+        """
+        Broadcasts the latest pending progress update for an object (see `progress`)
+        """
+        with progress_lock:
+            state = progress_state.get(key)
+            if state is None:
+                return
+            payload, state["pending"], state["timer"] = state["pending"], None, None
+            if payload is None:
+                return
+            state["last"] = time.time()
+        self.broadcast(event="progress", data=payload)
+
+    def end_progress(self):
+        """
+        Drops any pending progress update for the related object and resets its throttle (see `progress`)
+
+        Note: Called when an API command ends (however it ends) so a pending update is never sent after its final output
+        """
+        key = (type(self.model_object).__name__, self.model_object.id)
+        with progress_lock:
+            state = progress_state.pop(key, None)
+        if state is not None and state["timer"] is not None:
+            state["timer"].cancel()
+
+    def loading(self, loading: bool):
+        """
+        Notify end users of the loading state of the related object
+
+        Requires:
+
+        - `loading`:
+            - Type: bool
+            - What: The loading state to broadcast
+
+        Notes:
+            - Changes are coalesced for `settings.BROADCAST_LOADING_WINDOW` milliseconds and only the latest one is broadcast
+            - A loading state sent with another broadcast (see `fold_loading`) during the window replaces the pending change
+            - Changes are only compared to loading states sent during the same window (other processes may have sent a loading state since)
+        """
+        if settings.BROADCAST_LOADING_WINDOW == 0:
+            self.__broadcast_loading__(loading)
+            return
+        key = (type(self.model_object).__name__, self.model_object.id)
+        with loading_lock:
+            state = loading_state.setdefault(key, {"sent": None, "pending": None, "timer": None})
+            state["pending"] = loading
+            if state["timer"] is None:
+                state["timer"] = threading.Timer(
+                    settings.BROADCAST_LOADING_WINDOW / 1000, self.__flush_loading__, args=(key,)
+                )
+                state["timer"].daemon = True
+                state["timer"].start()
+
+    def fold_loading(self, loading: bool) -> dict:
+        """
+        Gets the kwargs to send a loading state with another broadcast (instead of a separate `updateLoading` event)
+
+        Requires:
+
+        - `loading`:
+            - Type: bool
+            - What: The loading state to send
+
+        Returns:
+            - Type: dict
+            - What: The `loading` kwarg to pass to `broadcast`
+
+        Example:
+
+        ```
+        socket.broadcast(event="overwrite", data=data, versions=versions, **socket.fold_loading(False))
+        ```
+        """
+        key = (type(self.model_object).__name__, self.model_object.id)
+        with loading_lock:
+            state = loading_state.get(key)
+            # Only a coalescing window (see `loading`) needs to know what was sent
+            if state is not None:
+                state["sent"], state["pending"] = loading, None
+        return {"loading": loading}
+
+    def __flush_loading__(self, key):
+        """
+        Broadcasts the pending loading state for an object unless the same state was already sent during the window (see `loading`)
+        """
+        with loading_lock:
+            state = loading_state.pop(key, None)
+        if state is None or state["pending"] is None or state["pending"] == state["sent"]:
+            return
+        self.__broadcast_loading__(state["pending"])
+
+    def __broadcast_loading__(self, loading: bool):
+        """
+        Broadcasts an `updateLoading` event for the related object
+        """
+        self.broadcast(
+            event="updateLoading",
+            data={
+                "data_path": ["session_loading"],
+                "data": loading,
+            },
+        )
+
+    def is_cancelled(self) -> bool:
+        """
+        Checks if the API command currently running for the related object has been cancelled by a user
+
+        Returns:
+            - Type: bool
+            - What: True if the API command should stop (its output is discarded either way)
+
+        Example:
+
+        ```
+        for step in steps:
+            if socket.is_cancelled():
+                return {}
+            run(step)
+        ```
+        """
+        is_cancelled = getattr(self.model_object, "is_cancelled", None)
+        return is_cancelled() if is_cancelled is not None else False
+
     def export(
         self,
         data,
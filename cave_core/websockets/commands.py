@@ -2,6 +2,7 @@
 
 # Internal Imports
 from .api_endpoints import (
+    cancel_api_command,
     get_associated_session_data,
     get_session_data,
     mutate_session,
@@ -9,6 +10,7 @@ from .api_endpoints import (
 )
 
 commands = {
+    "cancel_api_command": cancel_api_command,
     "get_associated_session_data": get_associated_session_data,
     "get_session_data": get_session_data,
     "mutate_session": mutate_session,
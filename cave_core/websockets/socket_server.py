@@ -1,5 +1,6 @@
 from django.conf import settings
 
+from .cave_ws_broadcaster import channels_event
 from .commands import get_command
 from django_sockets.sockets import BaseSocketServer
 
@@ -26,5 +27,32 @@ class SocketServer(BaseSocketServer):
         command(request)
 
     def connect(self):
-        self.channel_id = str(self.scope.get("user").id)
+        user = self.scope.get("user")
+        self.channel_id = user.get_channel()
         self.subscribe(self.channel_id)
+        # Subscribe to the session and team channels so group broadcasts are published once for all users
+        self.group_channels = set(user.get_group_channels())
+        for channel in self.group_channels:
+            self.subscribe(channel)
+
+    async def async_unsubscribe(self, channel):
+        """
+        Unsubscribe from a channel to stop receiving data from its broadcasts (the counterpart of `async_subscribe`)
+        """
+        await self.pubsub_layer.unsubscribe(str(channel))
+
+    async def async_handle_received_broadcast(self, channel, data):
+        if channel == self.channel_id:
+            # Update the group channels when the user switches sessions or changes teams
+            if isinstance(data, dict) and data.get("event") == channels_event:
+                for channel_i in data.get("unsubscribe", []):
+                    self.group_channels.discard(channel_i)
+                    await self.async_unsubscribe(channel_i)
+                for channel_i in data.get("subscribe", []):
+                    self.group_channels.add(channel_i)
+                    await self.async_subscribe(channel_i)
+                return
+        elif channel not in self.group_channels:
+            # Drop broadcasts that were in flight from a group channel this user has left (EG: their previous session)
+            return
+        await self.async_send(data)
@@ -12,5 +12,7 @@ if [ "$(python ./manage.py check --deployment_type development | grep "System ch
   exit 1
 fi
 source ./utils/helpers/ensure_db_setup.sh
+# Load the cache backups into the cache before serving any traffic (only if CACHE_WARM_ON_START is set)
+python "$APP_DIR/manage.py" warm_cache --on-start 2>&1 | pipe_log "INFO"
 
 python "$APP_DIR/manage.py" runserver 0.0.0.0:8000 2>&1 | pipe_log "INFO"